@@ -0,0 +1,47 @@
+# gunicorn -c gunicorn.conf.py
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 600))
+# Only the threaded sync workers use a thread pool; other worker classes ignore the setting.
+if worker_class in ("sync", "gthread"):
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Uvicorn workers serve the ASGI app with async views; sync workers serve the WSGI app with the sync views.
+if "uvicorn" in worker_class.lower():
+    wsgi_app = "pdf_table_augmenter_api.asgi:application"
+else:
+    wsgi_app = "pdf_table_augmenter_api.wsgi:application"
+
+# Load the application and run the warm-up (heavy imports and docling
+# converters) once in the master. Forked workers share those pages
+# copy-on-write instead of each paying the load time and memory.
+preload_app = True
+
+
+def run_warm_up():
+    from pdf_table_augmenter.startup import warm_up
+
+    warm_up()
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        run_warm_up()
+        # Objects that exist before the fork are moved out of the collector's reach
+        # so worker GC passes do not touch (and copy) the shared pages.
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        run_warm_up()
+
+    # Each worker re-queues the extraction jobs that a previous deploy or a recycled worker left behind.
+    from pdf_table_augmenter.management.commands.job_runner import start_job_recovery
+
+    start_job_recovery()
@@ -0,0 +1,24 @@
+from django.contrib import admin
+
+from pdf_table_augmenter.models import DocumentSession, ExtractionJob, SessionMessage
+
+
+@admin.register(ExtractionJob)
+class ExtractionJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "file_name", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("created_at", "started_at", "finished_at")
+
+
+class SessionMessageInline(admin.TabularInline):
+    model = SessionMessage
+    extra = 0
+    readonly_fields = ("role", "content", "created_at")
+
+
+@admin.register(DocumentSession)
+class DocumentSessionAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "file_name", "created_at", "updated_at")
+    list_filter = ("kind",)
+    readonly_fields = ("created_at", "updated_at")
+    inlines = [SessionMessageInline]
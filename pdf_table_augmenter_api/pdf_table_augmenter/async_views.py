@@ -0,0 +1,175 @@
+# pdf_table_augmenter/async_views.py
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from pdf_table_augmenter.management.commands.chatbot import answer_question_async
+from pdf_table_augmenter.management.commands.combined_pdf_augmenter import stream_all_descriptions_from_file_async
+from pdf_table_augmenter.management.commands.document_sessions import ask_session_async, create_session, \
+    is_error_result
+from pdf_table_augmenter.management.commands.first_case_pdf_table_augmenter import \
+    stream_table_data_only_descriptions_from_file_async
+from pdf_table_augmenter.management.commands.llm_cache import bypass_llm_cache
+from pdf_table_augmenter.management.commands.page_prescan import TABLES, PICTURES, FORMULAS
+from pdf_table_augmenter.management.commands.pdf_formula_augmenter import stream_formula_descriptions_from_file_async
+from pdf_table_augmenter.management.commands.pdf_image_augmenter import stream_image_descriptions_from_file_async
+from pdf_table_augmenter.management.commands.pdf_table_augmenter import stream_table_descriptions_from_file_async
+from pdf_table_augmenter.management.commands.second_case_pdf_table_augmenter import \
+    stream_table_with_context_descriptions_from_file_async
+from pdf_table_augmenter.metrics import timed
+from pdf_table_augmenter.models import DocumentSession
+from pdf_table_augmenter.streaming import requested_stream_format, streaming_response
+from pdf_table_augmenter.views import AllDescriptionsOptions, DescriptionOptions, ImageDescriptionOptions, \
+    collect_stream_events, llm_cache_bypass_requested, query_flag, question_error_payload, request_too_large, \
+    session_envelope
+
+
+def upload_too_large_response():
+    return JsonResponse({"error": f"File exceeds the {settings.PDF_UPLOAD_MAX_BYTES} byte upload limit."}, status=413)
+
+
+def request_payload(request):
+    if request.content_type == "application/json":
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+        return payload if isinstance(payload, dict) else {}
+    return request.POST
+
+
+def results_response(data):
+    with timed("serialize"):
+        return JsonResponse(data, safe=False)
+
+
+async def collect_stream_events_async(events):
+    return collect_stream_events([event async for event in events])
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncDescriptionExtractionView(DescriptionOptions, View):
+    # Same contract as DescriptionExtractionAPIView, but the request never
+    # holds a thread while it waits: conversion runs on the dedicated docling
+    # executor and the LLM calls are awaited on the event loop.
+    kind = None
+    stream = None
+
+    async def post(self, request):
+        options_error = self.options_error(request)
+        if options_error:
+            return JsonResponse({"error": options_error}, status=400)
+        if request_too_large(request):
+            return upload_too_large_response()
+        pdf_file = await sync_to_async(request.FILES.get, thread_sensitive=False)("pdf")
+        if not pdf_file:
+            return JsonResponse({"error": "No file provided."}, status=400)
+        if pdf_file.size > settings.PDF_UPLOAD_MAX_BYTES:
+            return upload_too_large_response()
+
+        bypass_cache = llm_cache_bypass_requested(request)
+        options = self.conversion_options(request)
+        stream_format = requested_stream_format(request)
+        if stream_format:
+            return streaming_response(self.stream(pdf_file, **options), stream_format, bypass_cache)
+
+        with bypass_llm_cache(bypass_cache):
+            collected = await collect_stream_events_async(self.stream(pdf_file, **options))
+        if is_error_result(collected):
+            descriptions = self.error_result(collected[0]["error"])
+        elif query_flag(request, "include_metadata"):
+            descriptions = collected
+        else:
+            descriptions = collected["results"]
+
+        if query_flag(request, "create_session"):
+            envelope = session_envelope(descriptions)
+            if not is_error_result(envelope["results"]):
+                session = await sync_to_async(create_session)(self.kind, envelope["results"], pdf_file.name)
+                return results_response({"session_id": str(session.id), **envelope})
+        return results_response(descriptions)
+
+    def error_result(self, message):
+        return [{"error": message}]
+
+
+class AsyncExtractDescriptionView(AsyncDescriptionExtractionView):
+    kind = "tables"
+    stream = staticmethod(stream_table_descriptions_from_file_async)
+    prescan_kind = TABLES
+
+
+class AsyncExtractDescriptionForImagesView(ImageDescriptionOptions, AsyncDescriptionExtractionView):
+    kind = "images"
+    stream = staticmethod(stream_image_descriptions_from_file_async)
+    prescan_kind = PICTURES
+
+
+class AsyncExtractDescriptionForFormulasView(AsyncDescriptionExtractionView):
+    kind = "formulas"
+    stream = staticmethod(stream_formula_descriptions_from_file_async)
+    prescan_kind = FORMULAS
+
+
+class AsyncExtractTableDataOnlyDescriptionForTablesView(AsyncDescriptionExtractionView):
+    kind = "first-case-tables"
+    stream = staticmethod(stream_table_data_only_descriptions_from_file_async)
+    prescan_kind = TABLES
+
+
+class AsyncExtractContextDescriptionForTablesView(AsyncDescriptionExtractionView):
+    kind = "second-case-tables"
+    stream = staticmethod(stream_table_with_context_descriptions_from_file_async)
+    prescan_kind = TABLES
+
+
+class AsyncExtractAllDescriptionsView(AllDescriptionsOptions, AsyncDescriptionExtractionView):
+    kind = "all"
+    stream = staticmethod(stream_all_descriptions_from_file_async)
+
+    def error_result(self, message):
+        return {"error": message}
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAskQuestionView(View):
+
+    async def post(self, request):
+        payload = request_payload(request)
+        question = payload.get("question")
+        session_id = payload.get("session_id") or request.GET.get("session_id")
+        if question and session_id:
+            return await self.answer_in_session(request, session_id, question)
+
+        table_description = payload.get("table_description")
+
+        if not question or not table_description:
+            return JsonResponse({"error": "Missing question or table_data."}, status=400)
+
+        try:
+            with bypass_llm_cache(llm_cache_bypass_requested(request)):
+                answer = await answer_question_async(question, table_description)
+            return JsonResponse({"answer": answer}, status=200)
+        except Exception as e:
+            payload, status = question_error_payload(e)
+            return JsonResponse(payload, status=status)
+
+    async def answer_in_session(self, request, session_id, question):
+        try:
+            session = await DocumentSession.objects.aget(id=uuid.UUID(str(session_id)))
+        except (ValueError, DocumentSession.DoesNotExist):
+            return JsonResponse({"error": "Unknown session_id."}, status=404)
+
+        try:
+            with bypass_llm_cache(llm_cache_bypass_requested(request)):
+                answer, citations = await ask_session_async(session, question)
+            return JsonResponse({"answer": answer, "session_id": str(session.id), "citations": citations}, status=200)
+        except Exception as e:
+            payload, status = question_error_payload(e)
+            return JsonResponse(payload, status=status)
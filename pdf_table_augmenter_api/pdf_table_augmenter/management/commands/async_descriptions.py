@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.llm_batching import BATCH_PROMPT_BUILDERS, batch_descriptions, \
+    batch_request, batching_enabled, plan_batches, run_generator
+from pdf_table_augmenter.management.commands.llm_cache import async_cached_chat_completion
+from pdf_table_augmenter.management.commands.llm_executor import call_safely
+from pdf_table_augmenter.management.commands.llm_gateway import LLMError
+
+logger = logging.getLogger(__name__)
+
+# Same model and parameters as the synchronous generators, so both paths
+# share LLM cache entries.
+DESCRIPTION_COMPLETION = {"model": "gpt-4o", "temperature": 0.2, "max_tokens": 1000}
+
+_conversion_executor = None
+_conversion_lock = threading.Lock()
+
+
+def conversion_executor():
+    # Docling conversion is CPU-bound; it gets its own small pool so it never
+    # competes with the event loop's default executor.
+    global _conversion_executor
+    with _conversion_lock:
+        if _conversion_executor is None:
+            _conversion_executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_CONVERSION_WORKERS, thread_name_prefix="docling"
+            )
+        return _conversion_executor
+
+
+async def run_conversion(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(conversion_executor(), call)
+
+
+async def describe_async(func, kwargs):
+    generator = func
+    if func is run_generator:
+        generator, kwargs = kwargs["generator"], kwargs["kwargs"]
+    builder = BATCH_PROMPT_BUILDERS.get(generator)
+    prompt = builder(**kwargs) if builder else None
+    if prompt is None:
+        # Placeholder answers and map-reduce tables keep their synchronous path.
+        return await asyncio.to_thread(call_safely, generator, **kwargs)
+
+    try:
+        return await async_cached_chat_completion(
+            generator.__name__,
+            messages=[{"role": "user", "content": prompt}],
+            **DESCRIPTION_COMPLETION
+        )
+    except LLMError as e:
+        return e
+    except Exception as e:
+        logger.exception("Description call failed: %s", e)
+        return LLMError("internal_error", str(e), status=500)
+
+
+async def describe_batch_async(generator_name, batch):
+    positions, request = batch_request(generator_name, batch)
+    try:
+        content = await async_cached_chat_completion(**request)
+    except Exception as e:
+        logger.warning("Batched %s call failed, falling back to single calls: %s", generator_name, e)
+        return {}
+    return batch_descriptions(generator_name, positions, content)
+
+
+async def describe_as_completed_async(func, calls, max_concurrency=None):
+    if not calls:
+        return
+
+    if batching_enabled(func):
+        individual, batches = plan_batches(func, calls)
+    else:
+        individual, batches = range(len(calls)), []
+
+    semaphore = asyncio.Semaphore(max_concurrency or settings.LLM_MAX_CONCURRENCY)
+
+    async def limited(target, *args):
+        async with semaphore:
+            return await target(*args)
+
+    pending = {}
+    for position in individual:
+        pending[asyncio.ensure_future(limited(describe_async, func, calls[position]))] = position
+    for batch in batches:
+        pending[asyncio.ensure_future(limited(describe_batch_async, func.__name__, batch))] = batch
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                owner = pending.pop(task)
+                if isinstance(owner, int):
+                    yield owner, task.result()
+                    continue
+
+                descriptions = task.result()
+                for position, _ in owner:
+                    if position in descriptions:
+                        yield position, descriptions[position]
+                    else:
+                        pending[asyncio.ensure_future(limited(describe_async, func, calls[position]))] = position
+    finally:
+        # A closed stream (e.g. the client went away) cancels the calls still in flight.
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,290 @@
+import importlib.util
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_table_augmenter.management.commands.combined_pdf_augmenter import SECTIONS, combined_profile
+from pdf_table_augmenter.management.commands.converter_registry import IMAGES_WITH_OCR, TABLES_NO_OCR
+from pdf_table_augmenter.management.commands.corpus_worker import augment_file, failed_record, init_corpus_worker
+from pdf_table_augmenter.management.commands.job_runner import EXTRACTORS
+
+# Converter profiles each kind converts with, warmed once per worker process.
+KIND_PROFILES = {
+    "tables": [TABLES_NO_OCR],
+    "images": [IMAGES_WITH_OCR],
+    "formulas": [TABLES_NO_OCR],
+    "first-case-tables": [TABLES_NO_OCR],
+    "second-case-tables": [TABLES_NO_OCR],
+    "all": [combined_profile(SECTIONS)],
+}
+
+OUTPUT_FORMATS = ("jsonl", "parquet")
+
+
+def file_key(path):
+    # A file is done once this key is checkpointed; a file that changed since gets processed again.
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def read_manifest(path):
+    # One PDF path per line, or JSON lines with a "path" (and optional "id").
+    base = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"path": line}
+            entry["path"] = os.path.join(base, entry["path"])
+            entries.append(entry)
+    return entries
+
+
+def walk_corpus(directory):
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                entries.append({"path": path, "id": os.path.relpath(path, directory)})
+    return entries
+
+
+def read_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write leaves at most one torn last line.
+                    continue
+                done[entry["key"]] = entry["status"]
+    return done
+
+
+def drop_records(records_path, keys):
+    # Files about to be processed again (retried failures, or files whose record
+    # was written just before a run was killed) lose their old record, so the
+    # output keeps one record per file.
+    if not keys or not os.path.exists(records_path):
+        return 0
+    kept = []
+    dropped = 0
+    with open(records_path) as fh:
+        for line in fh:
+            try:
+                key = json.loads(line)["key"]
+            except (ValueError, KeyError, TypeError):
+                # A torn last line from a killed run.
+                dropped += 1
+                continue
+            if key in keys:
+                dropped += 1
+            else:
+                kept.append(line)
+    if dropped:
+        with open(records_path + ".tmp", "w") as fh:
+            fh.writelines(kept)
+        os.replace(records_path + ".tmp", records_path)
+    return dropped
+
+
+def write_parquet(records_path, output_path):
+    import pandas as pd
+
+    records = {}
+    with open(records_path) as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record["key"]] = record
+    frame = pd.DataFrame(list(records.values()), columns=[
+        "key", "path", "id", "kind", "status", "error", "items", "seconds", "result"
+    ])
+    frame["result"] = frame["result"].map(lambda result: json.dumps(result) if result is not None else None)
+    frame.to_parquet(output_path, index=False)
+    return len(frame)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Command(BaseCommand):
+    help = ("Run an extractor over a directory (or manifest) of PDFs in a pool of worker processes, writing one "
+            "record per file to JSONL or Parquet. Completed files are checkpointed, so re-running the same command "
+            "resumes an interrupted run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Directory searched for *.pdf, or a manifest file.")
+        parser.add_argument("output", help="Output file (.jsonl or .parquet).")
+        parser.add_argument("--kind", choices=sorted(EXTRACTORS), default="tables")
+        parser.add_argument("--format", choices=OUTPUT_FORMATS,
+                            help="Output format (default: from the output file extension).")
+        parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+        parser.add_argument("--max-files-per-worker", type=int, default=None,
+                            help="Recycle a worker process after this many files to bound its memory.")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint).")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Process files again that failed in an earlier run.")
+        parser.add_argument("--shard-pages", action="store_true",
+                            help="Also shard long PDFs by pages inside each worker (off: workers split files).")
+        parser.add_argument("--limit", type=int, default=None, help="Process at most this many files.")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        output_format = options["format"] or ("parquet" if output.lower().endswith(".parquet") else "jsonl")
+        if output_format == "parquet" and not (importlib.util.find_spec("pyarrow")
+                                               or importlib.util.find_spec("fastparquet")):
+            raise CommandError("Parquet output needs pyarrow (pip install pyarrow); use a .jsonl output instead.")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        if os.path.isdir(options["input"]):
+            entries = walk_corpus(options["input"])
+        elif os.path.isfile(options["input"]):
+            entries = read_manifest(options["input"])
+        else:
+            raise CommandError(f"No such file or directory: {options['input']}")
+        missing = [entry["path"] for entry in entries if not os.path.isfile(entry["path"])]
+        if missing:
+            raise CommandError(f"{len(missing)} listed files do not exist, e.g. {missing[0]}")
+
+        # Parquet cannot be appended to, so its records are collected as JSON
+        # lines next to the output and converted once every file is done.
+        records_path = output if output_format == "jsonl" else output + ".records.jsonl"
+        checkpoint_path = options["checkpoint"] or output + ".checkpoint"
+        done = read_checkpoint(checkpoint_path)
+
+        pending = []
+        for entry in entries:
+            key = file_key(entry["path"])
+            status = done.get(key)
+            if status == "succeeded" or (status == "failed" and not options["retry_failed"]):
+                continue
+            pending.append((entry, key))
+        if options["limit"] is not None:
+            pending = pending[:options["limit"]]
+        drop_records(records_path, {key for _, key in pending})
+
+        self.stdout.write(f"{len(entries)} PDFs, {len(entries) - len(pending)} already done, "
+                          f"{len(pending)} to process with {options['workers']} workers ({options['kind']})")
+        if pending:
+            self.process(pending, options, records_path, checkpoint_path)
+
+        if output_format == "parquet":
+            written = write_parquet(records_path, output)
+            self.stdout.write(f"Wrote {written} records to {output}")
+
+    def process(self, pending, options, records_path, checkpoint_path):
+        total_bytes = sum(os.path.getsize(entry["path"]) for entry, _ in pending)
+        stats = {"succeeded": 0, "failed": 0, "bytes": 0, "items": 0}
+        sizes = {key: os.path.getsize(entry["path"]) for entry, key in pending}
+        extractor = EXTRACTORS[options["kind"]]
+        started = time.perf_counter()
+
+        def save(record):
+            # The record is on disk before the file counts as done.
+            records.write(json.dumps(record, default=str) + "\n")
+            records.flush()
+            os.fsync(records.fileno())
+            checkpoint.write(json.dumps({"key": record["key"], "status": record["status"]}) + "\n")
+            checkpoint.flush()
+
+            stats[record["status"]] += 1
+            stats["bytes"] += sizes[record["key"]]
+            stats["items"] += record["items"]
+            if record["status"] == "failed":
+                self.stderr.write(f"Failed: {record['path']}: {record['error']}")
+            self.report(stats, len(pending), total_bytes, started)
+
+        executor = self.start_pool(options)
+        pool_completed = 0
+        queue = iter(pending)
+        in_flight = {}
+        try:
+            with open(records_path, "a") as records, open(checkpoint_path, "a") as checkpoint:
+                while True:
+                    # A bounded window keeps huge corpora from being queued up front.
+                    while len(in_flight) < options["workers"] * 2:
+                        item = next(queue, None)
+                        if item is None:
+                            break
+                        in_flight[executor.submit(augment_file, extractor, options["kind"], *item)] = item
+                    if not in_flight:
+                        break
+
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    crashed = []
+                    while finished:
+                        for future in finished:
+                            entry, key = in_flight.pop(future)
+                            try:
+                                record = future.result()
+                            except BrokenProcessPool as e:
+                                crashed.append(failed_record(options["kind"], entry, key,
+                                                             f"Worker process crashed: {e}"))
+                                continue
+                            pool_completed += 1
+                            save(record)
+                        # Once the pool is broken, every other future in it fails as well.
+                        finished = wait(in_flight)[0] if crashed else set()
+
+                    if crashed:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        if not pool_completed:
+                            # Nothing is checkpointed, so a plain re-run tries these files again.
+                            raise CommandError("Worker processes crashed before finishing any file; "
+                                               "check that the extractor runs with --workers 1.")
+                        # The crash cannot be pinned on one file, so every file in
+                        # flight is failed; --retry-failed reruns them.
+                        for record in crashed:
+                            save(record)
+                        self.stderr.write("A worker process crashed; starting a new pool.")
+                        executor = self.start_pool(options)
+                        pool_completed = 0
+        except KeyboardInterrupt:
+            self.stderr.write("Interrupted; run the same command again to resume.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Finished in {format_duration(elapsed)}: {stats['succeeded']} succeeded, {stats['failed']} failed, "
+            f"{stats['items']} items, {(stats['succeeded'] + stats['failed']) / elapsed * 60:.1f} files/min"
+        )
+
+    def start_pool(self, options):
+        return ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_corpus_worker,
+            initargs=(KIND_PROFILES[options["kind"]], options["shard_pages"]),
+            max_tasks_per_child=options["max_files_per_worker"],
+        )
+
+    def report(self, stats, total, total_bytes, started):
+        completed = stats["succeeded"] + stats["failed"]
+        elapsed = time.perf_counter() - started
+        # The ETA follows bytes rather than files, since PDFs vary a lot in size.
+        byte_rate = stats["bytes"] / elapsed if elapsed else 0
+        eta = (total_bytes - stats["bytes"]) / byte_rate if byte_rate else 0
+        self.stdout.write(
+            f"[{completed}/{total}] {completed / elapsed * 60:.1f} files/min, {byte_rate / 1e6:.2f} MB/s, "
+            f"{stats['items']} items, {stats['failed']} failed, elapsed {format_duration(elapsed)}, "
+            f"ETA {format_duration(eta)}"
+        )
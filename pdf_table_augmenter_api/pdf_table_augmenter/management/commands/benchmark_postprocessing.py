@@ -0,0 +1,458 @@
+import json
+import math
+import random
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_table_augmenter.management.commands.document_index import DocumentIndex, FORMULA_CAPTION_PATTERN
+from pdf_table_augmenter.management.commands.first_case_pdf_table_augmenter import \
+    prepare_table_data_only_descriptions
+from pdf_table_augmenter.management.commands.pdf_formula_augmenter import prepare_formula_descriptions
+from pdf_table_augmenter.management.commands.pdf_image_augmenter import prepare_image_descriptions
+from pdf_table_augmenter.management.commands.pdf_table_augmenter import prepare_table_descriptions
+from pdf_table_augmenter.management.commands.reference_scanner import ReferenceIndex, TABLE
+from pdf_table_augmenter.management.commands.reusable_functions_for_formula import sanitize_latex
+from pdf_table_augmenter.management.commands.reusable_functions_for_table import get_cell_text
+from pdf_table_augmenter.management.commands.second_case_pdf_table_augmenter import \
+    prepare_table_with_context_descriptions
+
+DEFAULT_BODY_CHILDREN = "10,100,1000,10000"
+DEFAULT_ITEMS = "1,10,100,1000"
+
+SENTENCE_WORDS = ("the", "results", "show", "a", "clear", "increase", "in", "measured", "values", "across", "all",
+                  "groups", "compared", "with", "baseline", "method", "and", "we", "observe", "that")
+FORMULAS = ("E = mc\u00b2 \u00b1 \u03b1", "x\u02c62 + y\u02c62 = r\u00b2", "a \u00d7 b \u00f7 c \u2212 \u03b2",
+            "\\frac{\u03b3}{2} = \\sum_i x_i", "f(x) = \\int_0^1 g(t) dt")
+
+
+# The per-item caption searches that DocumentIndex.caption replaced; the baselines of its benchmark cases.
+def extract_caption(table, body_children, table_index_in_body, texts):
+    if table_index_in_body is None:
+        return None
+
+    caption = None
+    captions = table.get("captions", [])
+
+    if captions:
+        if isinstance(captions, list) and captions:
+            caption_item = captions[0]
+            caption = caption_item.get("text", "").strip()
+            if not caption and caption_item.get("$ref", "").startswith("#/texts/"):
+                try:
+                    text_idx = int(caption_item["$ref"].split("/")[-1])
+                    if text_idx < len(texts):
+                        caption = texts[text_idx]["text"].strip()
+                except (ValueError, IndexError):
+                    caption = None
+        elif isinstance(captions, dict):
+            caption = captions.get("text", "").strip()
+            if not caption and captions.get("$ref", "").startswith("#/texts/"):
+                try:
+                    text_idx = int(captions["$ref"].split("/")[-1])
+                    if text_idx < len(texts):
+                        caption = texts[text_idx]["text"].strip()
+                except (ValueError, IndexError):
+                    caption = None
+
+    if not caption:
+        caption = table.get("caption", "").strip() or table.get("metadata", {}).get("caption", "").strip()
+
+    if not caption and table_index_in_body is not None:
+        search_range = 3
+        for i in range(max(0, table_index_in_body - search_range),
+                       min(len(body_children), table_index_in_body + search_range + 1)):
+            if i == table_index_in_body:
+                continue
+            child = body_children[i]
+            if child.get("$ref", "").startswith("#/texts/"):
+                try:
+                    text_idx = int(child["$ref"].split("/")[-1])
+                    if text_idx < len(texts):
+                        text_content = texts[text_idx]["text"].strip()
+                        if re.match(r'^(TABLE|Table)\s*(\d+|I|II|III|IV|V|VI|VII|VIII|IX|X)', text_content,
+                                    re.IGNORECASE):
+                            caption = text_content
+                            break
+                except (ValueError, IndexError):
+                    continue
+
+    return caption
+
+
+def extract_formula_caption(formula, body_children, formula_index_in_body, texts):
+    if formula_index_in_body is None:
+        return None
+
+    caption = None
+    captions = formula.get("captions", [])
+
+    if captions:
+        if isinstance(captions, list) and captions:
+            caption_item = captions[0]
+            caption = caption_item.get("text", "").strip()
+            if not caption and caption_item.get("$ref", "").startswith("#/texts/"):
+                try:
+                    text_idx = int(caption_item["$ref"].split("/")[-1])
+                    if text_idx < len(texts):
+                        caption = texts[text_idx]["text"].strip()
+                except (ValueError, IndexError):
+                    caption = None
+        elif isinstance(captions, dict):
+            caption = captions.get("text", "").strip()
+            if not caption and captions.get("$ref", "").startswith("#/texts/"):
+                try:
+                    text_idx = int(captions["$ref"].split("/")[-1])
+                    if text_idx < len(texts):
+                        caption = texts[text_idx]["text"].strip()
+                except (ValueError, IndexError):
+                    caption = None
+
+    if not caption:
+        caption = formula.get("caption", "").strip() or formula.get("metadata", {}).get("caption", "").strip()
+
+    if not caption and formula_index_in_body is not None:
+        search_range = 3
+        for i in range(max(0, formula_index_in_body - search_range),
+                       min(len(body_children), formula_index_in_body + search_range + 1)):
+            if i == formula_index_in_body:
+                continue
+            child = body_children[i]
+            if child.get("$ref", "").startswith("#/texts/"):
+                try:
+                    text_idx = int(child["$ref"].split("/")[-1])
+                    if text_idx < len(texts):
+                        text_content = texts[text_idx]["text"].strip()
+                        if re.match(
+                                r'^(EQUATION|Equation|Eq\.?|FORMULA|Formula)\s*(\d+|I|II|III|IV|V|VI|VII|VIII|IX|X|\(\d+\))',
+                                text_content,
+                                re.IGNORECASE):
+                            caption = text_content
+                            break
+                except (ValueError, IndexError):
+                    continue
+
+    return caption
+
+
+def synthetic_document(body_children, items, table_rows=8, table_columns=5, seed=0):
+    # An export_to_dict()-shaped document with `items` tables, pictures and
+    # formulas. Half of the items carry a caption reference, the other half a
+    # caption paragraph next to them in the body; the remaining body children
+    # are paragraphs that cite items by number.
+    rng = random.Random(seed)
+    texts, tables, pictures = [], [], []
+
+    def add_text(text, label="text", **extra):
+        texts.append({"self_ref": f"#/texts/{len(texts)}", "label": label, "text": text, "orig": text, **extra})
+        return {"$ref": texts[-1]["self_ref"]}
+
+    def captioned(kind, number, item):
+        caption = f"{kind} {number}: synthetic {kind.lower()} caption"
+        if number % 2:
+            item["captions"] = [add_text(caption, "caption")]
+            return []
+        item["captions"] = []
+        return [add_text(caption, "caption")]
+
+    blocks = []
+    for number in range(1, items + 1):
+        grid = [[{"text": f"r{row}c{column}" if row else f"Header {column}"} for column in range(table_columns)]
+                for row in range(table_rows)]
+        table = {"self_ref": f"#/tables/{len(tables)}", "label": "table", "data": {"grid": grid}}
+        blocks.append(captioned("Table", number, table) + [{"$ref": table["self_ref"]}])
+        tables.append(table)
+
+        picture = {"self_ref": f"#/pictures/{len(pictures)}", "label": "picture",
+                   "metadata": {"width": 640, "height": 480}, "image": {"uri": "data:image/png;base64,AAAA"}}
+        blocks.append(captioned("Figure", number, picture) + [{"$ref": picture["self_ref"]}])
+        pictures.append(picture)
+
+        formula = add_text(FORMULAS[number % len(FORMULAS)], "formula")
+        blocks.append([formula])
+
+    used = sum(len(block) for block in blocks)
+    for _ in range(max(body_children - used, 0)):
+        words = " ".join(rng.choice(SENTENCE_WORDS) for _ in range(rng.randint(12, 40)))
+        number = rng.randint(1, max(items, 1))
+        reference = rng.choice((f"Table {number}", f"Figure {number}", f"Eq. ({number})", f"table {number}"))
+        blocks.append([add_text(f"As shown in {reference}, {words}.")])
+
+    rng.shuffle(blocks)
+    body = [child for block in blocks for child in block]
+    for position, child in enumerate(body):
+        collection, index = child["$ref"].split("/")[1:]
+        item = {"texts": texts, "tables": tables, "pictures": pictures}[collection][int(index)]
+        item["prov"] = [{"page_no": position // 25 + 1}]
+    for item in texts:
+        item.setdefault("prov", [{"page_no": 1}])
+
+    pages = {str(page): {"page_no": page} for page in range(1, len(body) // 25 + 2)}
+    return {"texts": texts, "tables": tables, "pictures": pictures, "body": {"children": body}, "pages": pages}
+
+
+def table_positions(doc, index):
+    return [(table, index.body_position(table["self_ref"])) for table in doc["tables"]]
+
+
+def formula_positions(doc, index):
+    return [(text, index.body_position(text["self_ref"])) for text in doc["texts"] if text["label"] == "formula"]
+
+
+# Each case prepares its input outside the timed region and returns the
+# callable that is timed.
+def case_index_build(doc):
+    return lambda: DocumentIndex(doc)
+
+
+def case_body_lookup(doc):
+    index = DocumentIndex(doc)
+    refs = [item["self_ref"] for collection in ("tables", "pictures", "texts") for item in doc[collection]]
+    return lambda: [index.body_position(ref) for ref in refs]
+
+
+def case_reference_scan(doc):
+    text_blocks = DocumentIndex(doc).text_blocks
+    return lambda: ReferenceIndex(text_blocks)
+
+
+def case_referencing_context(doc):
+    index = DocumentIndex(doc)
+    index.references
+    tables = table_positions(doc, index)
+    return lambda: [index.referencing_context(TABLE, number, None, position)
+                    for number, (_, position) in enumerate(tables, start=1)]
+
+
+def case_index_caption(doc):
+    index = DocumentIndex(doc)
+    tables = table_positions(doc, index)
+
+    def run():
+        # Captions are memoized per index; start every call cold.
+        index._captions.clear()
+        return [index.caption(table, position) for table, position in tables]
+    return run
+
+
+def case_extract_caption(doc):
+    index = DocumentIndex(doc)
+    tables = table_positions(doc, index)
+    body_children, texts = doc["body"]["children"], doc["texts"]
+    return lambda: [extract_caption(table, body_children, position, texts) for table, position in tables]
+
+
+def case_extract_formula_caption(doc):
+    index = DocumentIndex(doc)
+    formulas = formula_positions(doc, index)
+    body_children, texts = doc["body"]["children"], doc["texts"]
+    return lambda: [extract_formula_caption(formula, body_children, position, texts)
+                    for formula, position in formulas]
+
+
+def case_index_formula_caption(doc):
+    index = DocumentIndex(doc)
+    formulas = formula_positions(doc, index)
+
+    def run():
+        index._captions.clear()
+        return [index.caption(formula, position, FORMULA_CAPTION_PATTERN) for formula, position in formulas]
+    return run
+
+
+def case_get_cell_text(doc):
+    grids = [table["data"]["grid"] for table in doc["tables"]]
+    return lambda: [[[get_cell_text(cell) for cell in row] for row in grid] for grid in grids]
+
+
+def case_sanitize_latex(doc):
+    formulas = [text["orig"] for text in doc["texts"] if text["label"] == "formula"]
+    return lambda: [sanitize_latex(formula) for formula in formulas]
+
+
+def prepare_case(prepare):
+    return lambda doc: lambda: prepare(doc)
+
+
+CASES = {
+    "index_build": case_index_build,
+    "body_lookup": case_body_lookup,
+    "reference_scan": case_reference_scan,
+    "referencing_context": case_referencing_context,
+    "index_caption": case_index_caption,
+    "extract_caption": case_extract_caption,
+    "index_formula_caption": case_index_formula_caption,
+    "extract_formula_caption": case_extract_formula_caption,
+    "get_cell_text": case_get_cell_text,
+    "sanitize_latex": case_sanitize_latex,
+    "prepare_tables": prepare_case(prepare_table_descriptions),
+    "prepare_first_case_tables": prepare_case(prepare_table_data_only_descriptions),
+    "prepare_second_case_tables": prepare_case(prepare_table_with_context_descriptions),
+    "prepare_images": prepare_case(prepare_image_descriptions),
+    "prepare_formulas": prepare_case(prepare_formula_descriptions),
+}
+
+
+def time_case(func, repeat, min_seconds):
+    # Like timeit: calls are looped until one sample takes at least
+    # min_seconds, then the per-call median of `repeat` samples is kept.
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds or loops >= 1 << 20:
+            break
+        loops *= 10 if elapsed < min_seconds / 10 else 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / loops)
+    return statistics.median(samples)
+
+
+def scaling_exponent(points):
+    # Least-squares slope of log(seconds) over log(size): ~1 is linear, ~2 quadratic.
+    points = [(math.log(size), math.log(seconds)) for size, seconds in points if size > 0 and seconds > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def parse_sizes(value, name):
+    try:
+        sizes = sorted({int(size) for size in value.split(",") if size.strip()})
+    except ValueError:
+        raise CommandError(f"--{name} must be a comma-separated list of integers.")
+    if not sizes or sizes[0] < 1:
+        raise CommandError(f"--{name} needs positive sizes.")
+    return sizes
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the document post-processing between docling and the LLM (index, reference scan, captions, "
+            "cell flattening, LaTeX cleanup and the prepare loops) on synthetic documents of growing size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--body-children", default=DEFAULT_BODY_CHILDREN,
+                            help=f"Body sizes to generate (default {DEFAULT_BODY_CHILDREN}).")
+        parser.add_argument("--items", default=DEFAULT_ITEMS,
+                            help=f"Tables, pictures and formulas per document (default {DEFAULT_ITEMS}).")
+        parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated subset of the cases.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--min-seconds", type=float, default=0.05,
+                            help="Minimum duration of one timing sample.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare against.")
+        parser.add_argument("--max-regression", type=float, default=1.25,
+                            help="Fail when a case is this many times slower than the baseline.")
+
+    def handle(self, *args, **options):
+        body_sizes = parse_sizes(options["body_children"], "body-children")
+        item_sizes = parse_sizes(options["items"], "items")
+        cases = [name.strip() for name in options["cases"].split(",") if name.strip()]
+        unknown = [name for name in cases if name not in CASES]
+        if unknown:
+            raise CommandError(f"Unknown cases: {', '.join(unknown)}. Choose from {', '.join(CASES)}.")
+
+        results = []
+        for body_children in body_sizes:
+            for items in item_sizes:
+                # Every item takes one or two body children of its own.
+                if 5 * items > body_children:
+                    continue
+                doc = synthetic_document(body_children, items, seed=options["seed"])
+                for case in cases:
+                    seconds = time_case(CASES[case](doc), options["repeat"], options["min_seconds"])
+                    results.append({"case": case, "body_children": body_children, "items": items,
+                                    "seconds": seconds})
+                self.stdout.write(f"body_children={body_children} items={items}: done")
+        if not results:
+            raise CommandError("No (body children, items) pair fits: documents need at least 5 body children "
+                               "per item.")
+
+        self.write_timings(results, cases)
+        scaling = self.write_scaling(results, cases)
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump({"results": results, "scaling": scaling}, fh, indent=2)
+        if options["baseline"]:
+            self.compare(results, options["baseline"], options["max_regression"])
+
+    def write_timings(self, results, cases):
+        sizes = sorted({(result["body_children"], result["items"]) for result in results})
+        timings = {(result["case"], result["body_children"], result["items"]): result["seconds"]
+                   for result in results}
+        self.stdout.write("")
+        self.stdout.write("Milliseconds per call")
+        self.stdout.write(f"{'case':<28}" + "".join(f"{f'{body}/{items}':>12}" for body, items in sizes))
+        for case in cases:
+            self.stdout.write(f"{case:<28}" + "".join(
+                f"{timings[(case, body, items)] * 1000:>12.3f}" for body, items in sizes))
+        self.stdout.write("(columns are body children / items)")
+
+    def write_scaling(self, results, cases):
+        # Body scaling is fitted at the item count measured at the most body sizes,
+        # item scaling at the largest body size.
+        item_counts = {}
+        for result in results:
+            item_counts.setdefault(result["items"], set()).add(result["body_children"])
+        held_items = max(item_counts, key=lambda items: (len(item_counts[items]), items))
+        held_body = max(result["body_children"] for result in results)
+
+        scaling = {}
+        self.stdout.write("")
+        self.stdout.write(f"Scaling exponent k (time ~ size^k), body children at {held_items} items, "
+                          f"items at {held_body} body children")
+        self.stdout.write(f"{'case':<28} {'body children':>14} {'items':>8}")
+        for case in cases:
+            rows = [result for result in results if result["case"] == case]
+            scaling[case] = {
+                "body_children": scaling_exponent(
+                    [(row["body_children"], row["seconds"]) for row in rows if row["items"] == held_items]),
+                "items": scaling_exponent(
+                    [(row["items"], row["seconds"]) for row in rows if row["body_children"] == held_body]),
+            }
+            self.stdout.write(f"{case:<28} {self.exponent(scaling[case]['body_children']):>14} "
+                              f"{self.exponent(scaling[case]['items']):>8}")
+        return scaling
+
+    def exponent(self, value):
+        return f"{value:.2f}" if value is not None else "-"
+
+    def compare(self, results, baseline_path, max_regression):
+        with open(baseline_path) as fh:
+            baseline = {(result["case"], result["body_children"], result["items"]): result["seconds"]
+                        for result in json.load(fh)["results"]}
+
+        regressions = []
+        self.stdout.write("")
+        self.stdout.write(f"Compared with {baseline_path} (ratio > 1 is slower)")
+        for result in results:
+            key = (result["case"], result["body_children"], result["items"])
+            if key not in baseline or not baseline[key]:
+                continue
+            ratio = result["seconds"] / baseline[key]
+            if ratio > max_regression:
+                regressions.append(f"{key[0]} at {key[1]}/{key[2]}: {ratio:.2f}x")
+        ratios = [result["seconds"] / baseline[(result["case"], result["body_children"], result["items"])]
+                  for result in results
+                  if baseline.get((result["case"], result["body_children"], result["items"]))]
+        if ratios:
+            self.stdout.write(f"Geometric mean ratio {math.exp(sum(map(math.log, ratios)) / len(ratios)):.3f} "
+                              f"over {len(ratios)} measurements")
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions above {max_regression}x:\n" + "\n".join(regressions))
@@ -1,11 +1,29 @@
-from openai import OpenAI
-import os
+import asyncio
+import hashlib
+import re
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from django.conf import settings
 
+from pdf_table_augmenter.management.commands.llm_batching import estimate_tokens
+from pdf_table_augmenter.management.commands.llm_cache import async_cached_chat_completion, cached_chat_completion
+from pdf_table_augmenter.management.commands.retrieval_index import cached_index, select_within_budget
 
-def answer_question(question, table_description):
-    prompt = f"""
+
+def relevant_passages(question, table_description):
+    if estimate_tokens(table_description) <= settings.RETRIEVAL_TOKEN_BUDGET:
+        return table_description
+
+    passages = [passage.strip() for passage in re.split(r"\n\s*\n", table_description) if passage.strip()]
+    key = "text-" + hashlib.sha256(table_description.encode("utf-8")).hexdigest()
+    index = cached_index(key, lambda: [{"text": passage, "prompt": passage} for passage in passages])
+    selected = select_within_budget(index, question, settings.RETRIEVAL_TOKEN_BUDGET, settings.RETRIEVAL_TOP_K)
+    if not selected:
+        return table_description
+    return "\n\n".join(document["prompt"] for document, _ in selected)
+
+
+def build_question_prompt(question, table_description):
+    return f"""
             Based on the following table description:
             
             {table_description}
@@ -13,13 +31,64 @@ def answer_question(question, table_description):
             Answer the question: {question}
             Provide a clear, concise response focused on insights from the table. If no relevant data, say so.
     """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4,
-            max_tokens=1500
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Error answering question: {str(e)}"
+
+
+def answer_question(question, table_description):
+    table_description = relevant_passages(question, table_description)
+    return cached_chat_completion(
+        "answer_question",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": build_question_prompt(question, table_description)}],
+        temperature=0.4,
+        max_tokens=1500
+    )
+
+
+async def answer_question_async(question, table_description):
+    table_description = await asyncio.to_thread(relevant_passages, question, table_description)
+    return await async_cached_chat_completion(
+        "answer_question",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": build_question_prompt(question, table_description)}],
+        temperature=0.4,
+        max_tokens=1500
+    )
+
+
+SESSION_SYSTEM_PROMPT = """You answer questions about a PDF document. The tables, images and formulas extracted
+from it are described below, each with the page it appears on. Base every answer on these descriptions, cite
+the items you use (for example "Table 2, page 5"), and say so when they do not contain the answer.
+Provide clear, concise responses focused on insights from the document."""
+
+
+def build_session_messages(context, history, question, excerpts=None):
+    # The system message is byte-identical on every turn of a session, so the
+    # provider's prompt caching can reuse the whole document prefix. Retrieved
+    # excerpts change per question and therefore ride on the last message.
+    if excerpts is None:
+        system = f"{SESSION_SYSTEM_PROMPT}\n\n{context}"
+        user = question
+    else:
+        system = f"{SESSION_SYSTEM_PROMPT}\n\nOnly the items most relevant to each question are included with it."
+        user = f"Relevant document items:\n\n{excerpts or 'None found.'}\n\nQuestion: {question}"
+    return [{"role": "system", "content": system}] + history + [{"role": "user", "content": user}]
+
+
+def answer_session_question(context, history, question, excerpts=None):
+    return cached_chat_completion(
+        "answer_session_question",
+        model="gpt-4o",
+        messages=build_session_messages(context, history, question, excerpts),
+        temperature=0.4,
+        max_tokens=1500
+    )
+
+
+async def answer_session_question_async(context, history, question, excerpts=None):
+    return await async_cached_chat_completion(
+        "answer_session_question",
+        model="gpt-4o",
+        messages=build_session_messages(context, history, question, excerpts),
+        temperature=0.4,
+        max_tokens=1500
+    )
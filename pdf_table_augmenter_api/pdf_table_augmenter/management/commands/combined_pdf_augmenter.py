@@ -0,0 +1,138 @@
+import logging
+
+from pdf_table_augmenter.management.commands.converter_registry import IMAGES_WITH_OCR, TABLES_IMAGES_WITH_OCR, \
+    TABLES_NO_OCR
+from pdf_table_augmenter.management.commands.description_stream import stream_descriptions, stream_descriptions_async
+from pdf_table_augmenter.management.commands.document_index import DocumentIndex
+from pdf_table_augmenter.management.commands.first_case_pdf_table_augmenter import \
+    prepare_table_data_only_descriptions
+from pdf_table_augmenter.management.commands.llm_batching import run_generator
+from pdf_table_augmenter.management.commands.llm_executor import apply_description, describe_concurrently
+from pdf_table_augmenter.management.commands.page_prescan import FORMULAS, PICTURES, TABLES
+from pdf_table_augmenter.management.commands.pdf_formula_augmenter import prepare_formula_descriptions
+from pdf_table_augmenter.management.commands.pdf_image_augmenter import prepare_image_descriptions
+from pdf_table_augmenter.management.commands.pdf_table_augmenter import prepare_table_descriptions
+from pdf_table_augmenter.management.commands.reusable_functions_for_document import parse_pdf_document
+from pdf_table_augmenter.management.commands.reusable_functions_for_formula import generate_formula_llm_description
+from pdf_table_augmenter.management.commands.reusable_functions_for_image import generate_image_llm_description
+from pdf_table_augmenter.management.commands.reusable_functions_for_table import generate_table_llm_description, \
+    generate_table_only_description, generate_table_with_context_description
+from pdf_table_augmenter.management.commands.second_case_pdf_table_augmenter import \
+    prepare_table_with_context_descriptions
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("tables", "images", "formulas")
+
+TABLE_MODES = {
+    "full": (prepare_table_descriptions, generate_table_llm_description),
+    "first-case": (prepare_table_data_only_descriptions, generate_table_only_description),
+    "second-case": (prepare_table_with_context_descriptions, generate_table_with_context_description),
+}
+
+SECTION_PRESCAN_KINDS = {
+    "tables": TABLES,
+    "images": PICTURES,
+    "formulas": FORMULAS,
+}
+
+
+def combined_profile(sections):
+    if "images" in sections:
+        return TABLES_IMAGES_WITH_OCR if "tables" in sections else IMAGES_WITH_OCR
+    return TABLES_NO_OCR
+
+
+def combined_prescan_kind(sections):
+    return "+".join(SECTION_PRESCAN_KINDS[section] for section in sections)
+
+
+def section_handlers(sections, table_mode):
+    handlers = {
+        "tables": TABLE_MODES[table_mode],
+        "images": (prepare_image_descriptions, generate_image_llm_description),
+        "formulas": (prepare_formula_descriptions, generate_formula_llm_description),
+    }
+    return [(section, handlers[section]) for section in SECTIONS if section in sections]
+
+
+def prepare_all_descriptions(doc, sections, table_mode):
+    index = DocumentIndex(doc)
+
+    outputs = []
+    output_sections = []
+    description_calls = []
+    for section, (prepare, generator) in section_handlers(sections, table_mode):
+        section_outputs, section_calls = prepare(doc, index)
+        outputs.extend(section_outputs)
+        output_sections.extend(section for _ in section_outputs)
+        description_calls.extend({"generator": generator, "kwargs": kwargs} for kwargs in section_calls)
+
+    return outputs, output_sections, description_calls
+
+
+def extract_all_descriptions_from_file(file_obj, sections=SECTIONS, table_mode="full", prescan=False,
+                                       adaptive_ocr=False):
+    try:
+        doc = parse_pdf_document(
+            file_obj, combined_profile(sections), combined_prescan_kind(sections) if prescan else None, adaptive_ocr
+        )
+        outputs, output_sections, description_calls = prepare_all_descriptions(doc, sections, table_mode)
+
+        descriptions = describe_concurrently(run_generator, description_calls)
+
+        result = {section: [] for section in SECTIONS if section in sections}
+        for output, section, description in zip(outputs, output_sections, descriptions):
+            apply_description(output, description)
+            result[section].append(output)
+
+        logger.info("Returning %s descriptions across %s", len(outputs), ", ".join(result))
+        return result
+
+    except Exception as e:
+        logger.exception("Error processing PDF: %s", e)
+        return {"error": f"Failed to process PDF: {str(e)}"}
+
+
+def stream_all_descriptions_from_file(file_obj, sections=SECTIONS, table_mode="full", prescan=False,
+                                      adaptive_ocr=False):
+    output_sections = []
+
+    def prepare(doc):
+        outputs, sections_of_outputs, description_calls = prepare_all_descriptions(doc, sections, table_mode)
+        output_sections.extend(sections_of_outputs)
+        return outputs, description_calls
+
+    events = stream_descriptions(
+        lambda: parse_pdf_document(
+            file_obj, combined_profile(sections), combined_prescan_kind(sections) if prescan else None, adaptive_ocr
+        ),
+        prepare,
+        run_generator
+    )
+    for event in events:
+        if event["type"] == "item":
+            event["section"] = output_sections[event["position"]]
+        yield event
+
+
+async def stream_all_descriptions_from_file_async(file_obj, sections=SECTIONS, table_mode="full", prescan=False,
+                                                  adaptive_ocr=False):
+    output_sections = []
+
+    def prepare(doc):
+        outputs, sections_of_outputs, description_calls = prepare_all_descriptions(doc, sections, table_mode)
+        output_sections.extend(sections_of_outputs)
+        return outputs, description_calls
+
+    events = stream_descriptions_async(
+        lambda: parse_pdf_document(
+            file_obj, combined_profile(sections), combined_prescan_kind(sections) if prescan else None, adaptive_ocr
+        ),
+        prepare,
+        run_generator
+    )
+    async for event in events:
+        if event["type"] == "item":
+            event["section"] = output_sections[event["position"]]
+        yield event
@@ -0,0 +1,120 @@
+import logging
+import sys
+import threading
+import time
+
+from pdf_table_augmenter.metrics import CONVERTER_CONVERSIONS, CONVERTER_HITS, CONVERTER_LOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TABLES_NO_OCR = "tables_no_ocr"
+IMAGES_WITH_OCR = "images_with_ocr"
+IMAGES_NO_OCR = "images_no_ocr"
+TABLES_IMAGES_WITH_OCR = "tables_images_with_ocr"
+TABLES_IMAGES_NO_OCR = "tables_images_no_ocr"
+
+PIPELINE_PROFILES = {
+    TABLES_NO_OCR: {
+        "do_ocr": False,
+        "do_table_structure": True,
+        "generate_picture_images": False,
+        "do_picture_description": False,
+    },
+    IMAGES_WITH_OCR: {
+        "do_ocr": True,
+        "do_table_structure": False,
+        "generate_picture_images": True,
+    },
+    IMAGES_NO_OCR: {
+        "do_ocr": False,
+        "do_table_structure": False,
+        "generate_picture_images": True,
+    },
+    TABLES_IMAGES_WITH_OCR: {
+        "do_ocr": True,
+        "do_table_structure": True,
+        "generate_picture_images": True,
+    },
+    TABLES_IMAGES_NO_OCR: {
+        "do_ocr": False,
+        "do_table_structure": True,
+        "generate_picture_images": True,
+    },
+}
+
+# Profiles whose OCR can be skipped on pages that already carry a text layer.
+OCR_FALLBACK_PROFILES = {
+    IMAGES_WITH_OCR: IMAGES_NO_OCR,
+    TABLES_IMAGES_WITH_OCR: TABLES_IMAGES_NO_OCR,
+}
+
+_registry_lock = threading.Lock()
+_converters = {}
+
+
+def document_stream(name, stream):
+    from docling.datamodel.base_models import DocumentStream
+
+    return DocumentStream(name=name, stream=stream)
+
+
+def is_document_stream(source):
+    # Only a source built by document_stream can be one, so docling is never
+    # imported just to answer this.
+    module = sys.modules.get("docling.datamodel.base_models")
+    return module is not None and isinstance(source, module.DocumentStream)
+
+
+def _build_converter(profile):
+    # docling pulls in torch and its models, so it is imported with the first
+    # converter rather than with this module.
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    pipeline_options = PdfPipelineOptions(**PIPELINE_PROFILES[profile])
+    converter = DocumentConverter(format_options={
+        InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+    })
+    converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+
+def get_converter(profile):
+    if profile not in PIPELINE_PROFILES:
+        raise ValueError(f"Unknown pipeline profile: {profile}")
+
+    with _registry_lock:
+        entry = _converters.get(profile)
+        if entry is not None:
+            CONVERTER_HITS.inc(profile=profile)
+            return entry
+
+        started = time.perf_counter()
+        converter = _build_converter(profile)
+        load_seconds = time.perf_counter() - started
+
+        # Docling's PDF backends are not thread-safe, so each shared converter
+        # is paired with a lock that serializes conversions through it.
+        entry = (converter, threading.Lock())
+        _converters[profile] = entry
+        CONVERTER_LOAD_SECONDS.set(load_seconds, profile=profile)
+        logger.info("Converter '%s' loaded in %.2fs", profile, load_seconds)
+        return entry
+
+
+def convert_document(profile, source, page_range=None):
+    converter, lock = get_converter(profile)
+    with lock:
+        if page_range is None:
+            result = converter.convert(source)
+        else:
+            result = converter.convert(source, page_range=page_range)
+    CONVERTER_CONVERSIONS.inc(profile=profile)
+    return result
+
+
+def warm_up_converters(profiles=None):
+    for profile in profiles or PIPELINE_PROFILES:
+        get_converter(profile)
+
@@ -0,0 +1,50 @@
+import time
+
+# Entry points of augment_corpus's worker processes. A spawned worker imports
+# this module before django.setup() has run, so nothing that loads models may
+# be imported at the top; the extractors arrive pickled with each task.
+
+
+def init_corpus_worker(profiles, sharding):
+    import django
+
+    django.setup()
+    from django.conf import settings
+
+    from pdf_table_augmenter.management.commands.converter_registry import warm_up_converters
+
+    # Files are already spread over the worker processes; sharding pages
+    # of one file as well would oversubscribe the CPUs.
+    settings.DOCUMENT_SHARDING_ENABLED = sharding
+    if settings.DOCLING_WARMUP:
+        warm_up_converters(profiles)
+
+
+def count_items(result):
+    if isinstance(result, dict):
+        return sum(len(items) for items in result.values() if isinstance(items, list))
+    return len(result) if isinstance(result, list) else 0
+
+
+def failed_record(kind, entry, key, error, seconds=None):
+    return {"key": key, "path": entry["path"], "id": entry.get("id") or entry["path"], "kind": kind,
+            "status": "failed", "error": error, "items": 0, "result": None, "seconds": seconds}
+
+
+def augment_file(extractor, kind, entry, key):
+    from pdf_table_augmenter.management.commands.document_sessions import is_error_result
+
+    started = time.perf_counter()
+    try:
+        with open(entry["path"], "rb") as fh:
+            result = extractor(fh)
+        if is_error_result(result):
+            error = result["error"] if isinstance(result, dict) else result[0]["error"]
+            record = failed_record(kind, entry, key, error)
+        else:
+            record = dict(failed_record(kind, entry, key, None), status="succeeded", items=count_items(result),
+                          result=result)
+    except Exception as e:
+        record = failed_record(kind, entry, key, f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
@@ -0,0 +1,70 @@
+import logging
+import time
+
+from pdf_table_augmenter.management.commands.async_descriptions import describe_as_completed_async, run_conversion
+from pdf_table_augmenter.management.commands.llm_executor import apply_description, describe_as_completed
+
+logger = logging.getLogger(__name__)
+
+
+def metadata_event(doc, outputs, started):
+    metadata = {
+        "type": "metadata",
+        "pages": len(doc.get("pages", {})),
+        "texts": len(doc.get("texts", [])),
+        "items": len(outputs),
+        "parse_seconds": round(time.perf_counter() - started, 3),
+    }
+    if "augmenter_metadata" in doc:
+        metadata["page_plan"] = doc["augmenter_metadata"]
+    return metadata
+
+
+def summary_event(outputs, started):
+    return {
+        "type": "summary",
+        "items": len(outputs),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def stream_descriptions(load_document, prepare, generator):
+    started = time.perf_counter()
+    try:
+        doc = load_document()
+        outputs, description_calls = prepare(doc)
+    except Exception as e:
+        logger.exception("Error processing PDF: %s", e)
+        yield {"type": "error", "error": f"Failed to process PDF: {str(e)}"}
+        return
+
+    yield metadata_event(doc, outputs, started)
+
+    for position, description in describe_as_completed(generator, description_calls):
+        apply_description(outputs[position], description)
+        yield {"type": "item", "position": position, "item": outputs[position]}
+
+    yield summary_event(outputs, started)
+
+
+async def stream_descriptions_async(load_document, prepare, generator):
+    started = time.perf_counter()
+
+    def load_and_prepare():
+        doc = load_document()
+        return doc, prepare(doc)
+
+    try:
+        doc, (outputs, description_calls) = await run_conversion(load_and_prepare)
+    except Exception as e:
+        logger.exception("Error processing PDF: %s", e)
+        yield {"type": "error", "error": f"Failed to process PDF: {str(e)}"}
+        return
+
+    yield metadata_event(doc, outputs, started)
+
+    async for position, description in describe_as_completed_async(generator, description_calls):
+        apply_description(outputs[position], description)
+        yield {"type": "item", "position": position, "item": outputs[position]}
+
+    yield summary_event(outputs, started)
@@ -0,0 +1,139 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from pdf_table_augmenter.metrics import CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+def document_cache_key(digest, profile):
+    return f"{digest}-{profile}"
+
+
+class DocumentCache:
+    def __init__(self, memory_max_bytes, disk_dir, disk_max_bytes):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+
+    def get(self, key):
+        # Entries are kept as serialized JSON so every caller gets its own copy
+        # of the document and may annotate it freely.
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                CACHE_EVENTS.inc(cache="document", outcome="memory_hits")
+                return json.loads(payload)
+
+        payload = self._read_disk(key)
+        with self._lock:
+            if payload is None:
+                self._stats["misses"] += 1
+                CACHE_EVENTS.inc(cache="document", outcome="misses")
+                return None
+            self._stats["disk_hits"] += 1
+            CACHE_EVENTS.inc(cache="document", outcome="disk_hits")
+            self._remember(key, payload)
+        return json.loads(payload)
+
+    def put(self, key, doc):
+        payload = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._remember(key, payload)
+        self._write_disk(key, payload)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory), memory_bytes=self._memory_bytes)
+
+    def _remember(self, key, payload):
+        if len(payload) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = payload
+        self._memory_bytes += len(payload)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats["memory_evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json.gz")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with gzip.open(path, "rb") as fh:
+                payload = fh.read()
+            os.utime(path)
+            return payload
+        except (OSError, EOFError):
+            return None
+
+    def _write_disk(self, key, payload):
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as fh:
+                fh.write(payload)
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+        except OSError as e:
+            logger.warning("Could not write document cache entry %s: %s", key, e)
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json.gz"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self._stats["disk_evictions"] += 1
+            except OSError:
+                continue
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DocumentCache(
+                memory_max_bytes=settings.DOCUMENT_CACHE_MEMORY_BYTES,
+                disk_dir=settings.DOCUMENT_CACHE_DIR,
+                disk_max_bytes=settings.DOCUMENT_CACHE_DISK_BYTES,
+            )
+        return _cache
@@ -0,0 +1,144 @@
+import re
+from functools import cached_property
+
+from pdf_table_augmenter.management.commands.reference_scanner import ReferenceIndex, parse_reference
+from pdf_table_augmenter.metrics import timed
+
+TABLE_CAPTION_PATTERN = re.compile(r'^(TABLE|Table)\s*(\d+|I|II|III|IV|V|VI|VII|VIII|IX|X)', re.IGNORECASE)
+FORMULA_CAPTION_PATTERN = re.compile(
+    r'^(EQUATION|Equation|Eq\.?|FORMULA|Formula)\s*(\d+|I|II|III|IV|V|VI|VII|VIII|IX|X|\(\d+\))', re.IGNORECASE)
+
+CAPTION_SEARCH_RANGE = 3
+
+
+def text_index_from_ref(ref):
+    if not ref.startswith("#/texts/"):
+        return None
+    try:
+        return int(ref.split("/")[-1])
+    except ValueError:
+        return None
+
+
+def format_page_display(item):
+    prov = item.get("prov", [])
+    page_numbers = sorted(set(p.get("page_no", 1) for p in prov)) if prov else [1]
+    if len(page_numbers) > 1:
+        return f"Pages {min(page_numbers)}-{max(page_numbers)}"
+    return f"Page {page_numbers[0]}" if page_numbers else "Page 1"
+
+
+class DocumentIndex:
+    def __init__(self, doc):
+        with timed("index"):
+            self.texts = doc.get("texts", [])
+            self.body_children = doc.get("body", {}).get("children", [])
+
+            self._pages = {}
+            for collection in ("texts", "tables", "pictures"):
+                for item in doc.get(collection, []):
+                    self_ref = item.get("self_ref")
+                    if self_ref:
+                        self._pages[self_ref] = format_page_display(item)
+
+            self._body_positions = {}
+            self._body_texts = {}
+            self.text_blocks = []
+            for position, child in enumerate(self.body_children):
+                ref = child.get("$ref", "")
+                self._body_positions.setdefault(ref, position)
+                text = self.text_for_ref(ref)
+                if text is not None:
+                    self._body_texts[position] = text
+                    self.text_blocks.append((position, text))
+
+        self._captions = {}
+
+    def text_for_ref(self, ref):
+        text_idx = text_index_from_ref(ref)
+        if text_idx is None or text_idx >= len(self.texts):
+            return None
+        return self.texts[text_idx].get("text", "").strip()
+
+    def body_position(self, ref):
+        return self._body_positions.get(ref)
+
+    def page_display(self, item):
+        page_display = self._pages.get(item.get("self_ref"))
+        return page_display if page_display is not None else format_page_display(item)
+
+    def caption(self, item, position, fallback_pattern=TABLE_CAPTION_PATTERN):
+        if position is None:
+            return None
+
+        key = (item.get("self_ref") or id(item), fallback_pattern.pattern)
+        if key not in self._captions:
+            self._captions[key] = self._resolve_caption(item, position, fallback_pattern)
+        return self._captions[key]
+
+    def _resolve_caption(self, item, position, fallback_pattern):
+        caption = None
+        captions = item.get("captions", [])
+        caption_item = captions[0] if isinstance(captions, list) and captions else captions
+
+        if isinstance(caption_item, dict) and caption_item:
+            caption = caption_item.get("text", "").strip()
+            if not caption:
+                caption = self.text_for_ref(caption_item.get("$ref", ""))
+
+        if not caption:
+            caption = item.get("caption", "").strip() or item.get("metadata", {}).get("caption", "").strip()
+
+        if not caption:
+            for i in range(max(0, position - CAPTION_SEARCH_RANGE),
+                           min(len(self.body_children), position + CAPTION_SEARCH_RANGE + 1)):
+                if i == position:
+                    continue
+                text = self._body_texts.get(i)
+                if text is not None and fallback_pattern.match(text):
+                    caption = text
+                    break
+
+        return caption
+
+    @cached_property
+    def references(self):
+        with timed("reference_scan"):
+            return ReferenceIndex(self.text_blocks)
+
+    def referencing_context(self, kind, number, title, position):
+        numbers = {number}
+        caption_reference = parse_reference(title)
+        if caption_reference and caption_reference[0] == kind:
+            numbers.add(caption_reference[1])
+
+        chunks_before = []
+        chunks_after = []
+        for i, text in self.references.referencing_blocks(kind, numbers):
+            if title and text.lower() == title.strip().lower():
+                continue
+            if i < position:
+                chunks_before.append(text)
+            elif i > position:
+                chunks_after.append(text)
+        return chunks_before, chunks_after
+
+    def preceding_texts(self, position, window=3, limit=3):
+        found = []
+        for i in range(position - 1, max(position - window - 1, -1), -1):
+            text = self._body_texts.get(i)
+            if text:
+                found.append(text)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def following_texts(self, position, window=3, limit=3):
+        found = []
+        for i in range(position + 1, min(position + window + 1, len(self.body_children))):
+            text = self._body_texts.get(i)
+            if text:
+                found.append(text)
+                if len(found) >= limit:
+                    break
+        return found
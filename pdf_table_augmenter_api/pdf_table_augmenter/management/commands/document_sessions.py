@@ -0,0 +1,123 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from pdf_table_augmenter.management.commands.chatbot import answer_session_question, answer_session_question_async
+from pdf_table_augmenter.management.commands.llm_batching import estimate_tokens
+from pdf_table_augmenter.management.commands.retrieval_index import cached_index, select_within_budget
+from pdf_table_augmenter.models import DocumentSession, SessionMessage
+
+ITEM_LABELS = (
+    ("table_index", "Table"),
+    ("image_index", "Image"),
+    ("equation_index", "Formula"),
+)
+
+
+def is_error_result(results):
+    if isinstance(results, dict):
+        return "error" in results
+    return len(results) == 1 and isinstance(results[0], dict) and set(results[0]) == {"error"}
+
+
+def result_items(results):
+    if isinstance(results, dict):
+        for section_items in results.values():
+            yield from section_items
+    else:
+        yield from results
+
+
+def item_label(item):
+    for key, label in ITEM_LABELS:
+        if key in item:
+            return f"{label} {item[key]}"
+    return "Item"
+
+
+def item_prompt_text(item):
+    return f"{item_label(item)} ({item.get('page', 'page unknown')}):\n{(item.get('description') or '').strip()}"
+
+
+def build_session_context(results):
+    blocks = [item_prompt_text(item) for item in result_items(results) if (item.get("description") or "").strip()]
+    return "\n\n".join(blocks) or "No descriptions were extracted from this document."
+
+
+def retrieval_documents(results):
+    documents = []
+    for item in result_items(results):
+        description = (item.get("description") or "").strip()
+        cells = " ".join(" ".join(str(cell) for cell in row) for row in item.get("preview_data") or []
+                         if isinstance(row, list))
+        documents.append({
+            "item": item_label(item),
+            "page": item.get("page"),
+            "text": " ".join(filter(None, [item_label(item), item.get("title") or "", description, cells])),
+            "prompt": item_prompt_text(item),
+        })
+    return documents
+
+
+def session_citations(selected):
+    return [
+        {"item": document["item"], "page": document["page"], "score": round(score, 3) if score is not None else None}
+        for document, score in selected
+    ]
+
+
+def create_session(kind, results, file_name=""):
+    return DocumentSession.objects.create(
+        kind=kind,
+        file_name=file_name or "",
+        results=results,
+        context=build_session_context(results),
+    )
+
+
+def session_history(session):
+    messages = list(session.messages.order_by("-created_at", "-id")[:settings.SESSION_HISTORY_MESSAGES])
+    return [{"role": message.role, "content": message.content} for message in reversed(messages)]
+
+
+def session_request(session, history, question):
+    # Returns (context, excerpts, selected); exactly one of context and excerpts is set.
+    if estimate_tokens(session.context) <= settings.SESSION_RETRIEVAL_MIN_TOKENS:
+        selected = [(document, None) for document in retrieval_documents(session.results)]
+        return session.context, None, selected
+
+    # Large documents only send the items relevant to this question (and
+    # the previous one, so follow-ups keep their referent).
+    index = cached_index(f"session-{session.id}", lambda: retrieval_documents(session.results))
+    previous_questions = [message["content"] for message in history if message["role"] == "user"][-1:]
+    selected = select_within_budget(
+        index, " ".join(previous_questions + [question]), settings.RETRIEVAL_TOKEN_BUDGET,
+        settings.RETRIEVAL_TOP_K
+    )
+    excerpts = "\n\n".join(document["prompt"] for document, _ in selected)
+    return None, excerpts, selected
+
+
+def record_exchange(session, question, answer):
+    with transaction.atomic():
+        SessionMessage.objects.create(session=session, role=SessionMessage.Role.USER, content=question)
+        SessionMessage.objects.create(session=session, role=SessionMessage.Role.ASSISTANT, content=answer)
+        session.save(update_fields=["updated_at"])
+
+
+def ask_session(session, question):
+    history = session_history(session)
+    context, excerpts, selected = session_request(session, history, question)
+    answer = answer_session_question(context, history, question, excerpts)
+    record_exchange(session, question, answer)
+    return answer, session_citations(selected)
+
+
+async def ask_session_async(session, question):
+    history = await sync_to_async(session_history)(session)
+    context, excerpts, selected = await asyncio.to_thread(session_request, session, history, question)
+    answer = await answer_session_question_async(context, history, question, excerpts)
+    await sync_to_async(record_exchange)(session, question, answer)
+    return answer, session_citations(selected)
@@ -0,0 +1,126 @@
+import logging
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.converter_registry import convert_document
+
+logger = logging.getLogger(__name__)
+
+REF_COLLECTIONS = ("texts", "tables", "pictures", "groups", "key_value_items", "form_items")
+TREE_ROOTS = ("body", "furniture")
+REF_PATTERN = re.compile(r"^#/(" + "|".join(REF_COLLECTIONS) + r")/(\d+)$")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def count_pdf_pages(source):
+    import pdfplumber
+
+    with pdfplumber.open(source) as pdf:
+        return len(pdf.pages)
+
+
+def page_shards(first_page, last_page, shard_pages):
+    return [
+        (start, min(start + shard_pages - 1, last_page))
+        for start in range(first_page, last_page + 1, shard_pages)
+    ]
+
+
+def _init_shard_worker():
+    import django
+
+    django.setup()
+
+
+def _convert_shard(profile, path, page_range):
+    return convert_document(profile, path, page_range=page_range).document.export_to_dict()
+
+
+def get_shard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned (not forked) workers keep torch/docling state out of the
+            # threaded web worker, and are recycled after a number of shards so
+            # that per-process memory stays bounded.
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.DOCUMENT_SHARD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_shard_worker,
+                max_tasks_per_child=settings.DOCUMENT_SHARD_MAX_TASKS_PER_CHILD,
+            )
+        return _pool
+
+
+def _reset_shard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def convert_page_ranges(profile, path, page_ranges):
+    total_pages = sum(end - start + 1 for start, end in page_ranges)
+    if not settings.DOCUMENT_SHARDING_ENABLED or total_pages <= settings.DOCUMENT_SHARD_MIN_PAGES:
+        return [_convert_shard(profile, path, page_range) for page_range in page_ranges]
+
+    shards = [page_shards(start, end, settings.DOCUMENT_SHARD_PAGES) for start, end in page_ranges]
+    logger.info("Converting %s pages in %s shards", total_pages, sum(len(group) for group in shards))
+
+    pool = get_shard_pool()
+    try:
+        futures = [[pool.submit(_convert_shard, profile, path, shard) for shard in group] for group in shards]
+        return [merge_shard_documents([future.result() for future in group]) for group in futures]
+    except BrokenProcessPool:
+        _reset_shard_pool()
+        raise
+
+
+def convert_in_shards(profile, path, page_count):
+    return convert_page_ranges(profile, path, [(1, page_count)])[0]
+
+
+def _renumber(node, offsets):
+    if isinstance(node, dict):
+        return {key: _renumber(value, offsets) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_renumber(value, offsets) for value in node]
+    if isinstance(node, str):
+        match = REF_PATTERN.match(node)
+        if match:
+            collection, position = match.groups()
+            return f"#/{collection}/{int(position) + offsets[collection]}"
+    return node
+
+
+def merge_shard_documents(shard_docs):
+    if len(shard_docs) == 1:
+        return shard_docs[0]
+
+    merged = {collection: [] for collection in REF_COLLECTIONS}
+    merged["pages"] = {}
+    for doc in shard_docs:
+        for key, value in doc.items():
+            if key in TREE_ROOTS:
+                merged.setdefault(key, dict(value, children=[]))
+            elif key not in merged:
+                merged[key] = value
+
+    for doc in shard_docs:
+        offsets = {collection: len(merged[collection]) for collection in REF_COLLECTIONS}
+        for collection in REF_COLLECTIONS:
+            merged[collection].extend(_renumber(doc.get(collection, []), offsets))
+        for root in TREE_ROOTS:
+            if root in merged:
+                merged[root]["children"].extend(_renumber(doc.get(root, {}).get("children", []), offsets))
+        merged["pages"].update(doc.get("pages", {}))
+
+    return merged
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+# Matches the item headers written by llm_batching.build_batch_prompt, so
+# batched JSON-mode prompts get one description per item back.
+BATCH_ITEM_PATTERN = re.compile(r"^=== Item (\S+) ===$", re.MULTILINE)
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+FILLER_WORDS = (
+    "the", "table", "reports", "values", "for", "each", "column", "with", "totals", "across", "rows", "showing",
+    "trend", "between", "groups", "measured", "results", "compared", "baseline", "increase", "decrease", "figure",
+    "summarizes", "relationship", "data", "sample", "average", "per", "category", "and", "period",
+)
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def canned_text(seed, words):
+    # Same request, same answer: the text is derived from a hash of the request only.
+    rng = random.Random(seed)
+    body = " ".join(rng.choice(FILLER_WORDS) for _ in range(max(words - 3, 1)))
+    return f"Synthetic description {seed[:12]}: {body}."
+
+
+def completion_content(body, words):
+    messages = body.get("messages", [])
+    seed = hashlib.sha256(json.dumps([body.get("model"), messages], sort_keys=True).encode("utf-8")).hexdigest()
+    if (body.get("response_format") or {}).get("type") != "json_object":
+        return canned_text(seed, words)
+
+    prompt = "\n".join(message_text(message) for message in messages)
+    item_ids = BATCH_ITEM_PATTERN.findall(prompt)
+    if not item_ids:
+        return json.dumps({"description": canned_text(seed, words)})
+    return json.dumps({"descriptions": [
+        {"id": item_id, "description": canned_text(f"{seed}-{item_id}", words)} for item_id in item_ids
+    ]})
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops connection bursts from a load
+    # test, adding ~1s SYN retransmits that the real API would not show.
+    request_queue_size = 1024
+
+    def __init__(self, address, options):
+        super().__init__(address, FakeOpenAIHandler)
+        self.options = options
+        self._random = random.Random(options["seed"])
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "server_errors": 0, "completion_tokens": 0}
+
+    def draw(self):
+        # One shared generator behind a lock keeps a seeded run reproducible
+        # in aggregate even though requests arrive on many threads.
+        options = self.options
+        with self._lock:
+            roll = self._random.random()
+            mean, stddev = options["latency_mean"], options["latency_stddev"]
+            distribution = options["latency_distribution"]
+            if distribution == "uniform":
+                latency = self._random.uniform(max(mean - stddev, 0), mean + stddev)
+            elif distribution == "normal":
+                latency = self._random.gauss(mean, stddev)
+            elif distribution == "lognormal" and mean > 0:
+                # Parameterized by the mean and standard deviation of the latency itself.
+                sigma2 = math.log(1 + (stddev / mean) ** 2)
+                latency = self._random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+            elif distribution == "exponential" and mean > 0:
+                latency = self._random.expovariate(1 / mean)
+            else:
+                latency = mean
+        if roll < options["rate_limit_rate"]:
+            outcome = "rate_limited"
+        elif roll < options["rate_limit_rate"] + options["error_rate"]:
+            outcome = "server_errors"
+        else:
+            outcome = "ok"
+        return outcome, max(latency, 0.0)
+
+    def record(self, outcome, completion_tokens=0):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[outcome] += 1
+            self.stats["completion_tokens"] += completion_tokens
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.options["verbose"]:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, error_type, message, headers=None):
+        self.send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": None}},
+                       headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "fake"}]})
+        else:
+            self.send_error_json(404, "invalid_request_error", f"Unknown path {self.path}")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error_json(404, "invalid_request_error", f"Unknown path {self.path}")
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            self.send_error_json(400, "invalid_request_error", "Request body is not valid JSON.")
+            return
+
+        options = self.server.options
+        outcome, latency = self.server.draw()
+        if outcome == "rate_limited":
+            # Rate limits are rejected up front, as the real API does.
+            self.server.record(outcome)
+            self.send_error_json(429, "rate_limit_exceeded", "Rate limit reached (injected).",
+                                 {"Retry-After": str(options["retry_after"])})
+            return
+
+        content = completion_content(body, options["output_words"])
+        completion_tokens = min(estimate_tokens(content), body.get("max_tokens") or estimate_tokens(content))
+        time.sleep(latency + completion_tokens * options["seconds_per_output_token"])
+
+        if outcome == "server_errors":
+            self.server.record(outcome)
+            self.send_error_json(500, "server_error", "The server had an error while processing your request "
+                                                      "(injected).")
+            return
+
+        prompt_tokens = sum(estimate_tokens(message_text(message)) for message in body.get("messages", []))
+        self.server.record(outcome, completion_tokens)
+        self.send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class Command(BaseCommand):
+    help = ("Serve a local stand-in for the OpenAI chat completions API with configurable latency and error "
+            "injection. Point the app at it with OPENAI_BASE_URL=http://<host>:<port>/v1.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+        parser.add_argument("--latency-mean", type=float, default=1.5, help="Mean time to first token, seconds.")
+        parser.add_argument("--latency-stddev", type=float, default=0.5)
+        parser.add_argument("--seconds-per-output-token", type=float, default=0.0,
+                            help="Extra generation time per completion token.")
+        parser.add_argument("--output-words", type=int, default=60, help="Length of the canned descriptions.")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with a 500.")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                            help="Fraction of calls answered with a 429.")
+        parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with injected 429s.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--verbose", action="store_true", help="Log every request.")
+
+    def handle(self, *args, **options):
+        server = FakeOpenAIServer((options["host"], options["port"]), options)
+        host, port = server.server_address[:2]
+        self.stdout.write(
+            f"Fake OpenAI API on http://{host}:{port}/v1 ({options['latency_distribution']} latency, "
+            f"mean {options['latency_mean']}s, {options['error_rate']:.0%} errors, "
+            f"{options['rate_limit_rate']:.0%} rate limited). Ctrl-C to stop."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("Served " + ", ".join(f"{key}={value}" for key, value in server.stats.items()))
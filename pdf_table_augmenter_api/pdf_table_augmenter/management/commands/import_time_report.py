@@ -0,0 +1,68 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pdf_table_augmenter.startup import HEAVY_MODULES
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+TRACKED_PACKAGES = ("docling", "torch", "transformers") + tuple(name.split(".")[0] for name in HEAVY_MODULES)
+
+
+def parse_import_times(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "top_level": len(indent) == 1,
+            })
+    return imports
+
+
+class Command(BaseCommand):
+    help = "Report what importing a module costs (python -X importtime), grouped by top-level package."
+
+    def add_arguments(self, parser):
+        parser.add_argument("modules", nargs="*", default=["pdf_table_augmenter.urls"],
+                            help="Modules to import after django.setup() (default: the app's URLconf).")
+        parser.add_argument("--top", type=int, default=15, help="Number of packages to list.")
+
+    def handle(self, *args, **options):
+        script = "import django; django.setup()\n" + "".join(f"import {module}\n" for module in options["modules"])
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "")
+                   or "pdf_table_augmenter_api.settings")
+
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        wall_seconds = time.perf_counter() - started
+        imports = parse_import_times(completed.stderr)
+        if completed.returncode != 0:
+            errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+            raise CommandError("Import failed:\n" + "\n".join(errors[-20:]))
+
+        packages = {}
+        for entry in imports:
+            package = entry["module"].split(".")[0]
+            packages[package] = packages.get(package, 0) + entry["self_us"]
+        total_us = sum(entry["cumulative_us"] for entry in imports if entry["top_level"])
+
+        self.stdout.write(f"Imported {', '.join(options['modules'])}: {len(imports)} modules, "
+                          f"{total_us / 1e6:.2f}s import time, {wall_seconds:.2f}s wall (interpreter included)")
+        self.stdout.write(f"{'package':<30} {'self seconds':>12}")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"{package:<30} {self_us / 1e6:>12.3f}")
+
+        loaded = [package for package in TRACKED_PACKAGES if package in packages]
+        self.stdout.write("Heavy packages loaded: " + (", ".join(loaded) if loaded else "none"))
@@ -0,0 +1,274 @@
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pdf_table_augmenter.management.commands.combined_pdf_augmenter import extract_all_descriptions_from_file
+from pdf_table_augmenter.management.commands.document_sessions import is_error_result
+from pdf_table_augmenter.management.commands.first_case_pdf_table_augmenter import \
+    extract_table_data_only_descriptions_from_file
+from pdf_table_augmenter.management.commands.pdf_formula_augmenter import extract_formula_descriptions_from_file
+from pdf_table_augmenter.management.commands.pdf_image_augmenter import extract_image_descriptions_from_file
+from pdf_table_augmenter.management.commands.pdf_table_augmenter import extract_table_descriptions_from_file
+from pdf_table_augmenter.management.commands.second_case_pdf_table_augmenter import \
+    extract_table_with_context_descriptions_from_file
+from pdf_table_augmenter.log_context import use_request_id
+from pdf_table_augmenter.models import ExtractionJob
+
+logger = logging.getLogger(__name__)
+
+EXTRACTORS = {
+    "tables": extract_table_descriptions_from_file,
+    "images": extract_image_descriptions_from_file,
+    "formulas": extract_formula_descriptions_from_file,
+    "first-case-tables": extract_table_data_only_descriptions_from_file,
+    "second-case-tables": extract_table_with_context_descriptions_from_file,
+    "all": extract_all_descriptions_from_file,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_recovery_thread = None
+_heartbeat_thread = None
+# Jobs this process has queued (job id) and is running (claim token).
+_queued = set()
+_running = {}
+
+
+def get_job_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix="extraction-job")
+        return _executor
+
+
+def submit_job(kind, pdf_file, webhook_url="", options=None):
+    if kind not in EXTRACTORS:
+        raise ValueError(f"Unknown extraction kind: {kind}")
+
+    os.makedirs(settings.JOB_UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(settings.JOB_UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
+    with open(file_path, "wb") as fh:
+        for chunk in pdf_file.chunks():
+            fh.write(chunk)
+
+    job = ExtractionJob.objects.create(
+        kind=kind,
+        file_path=file_path,
+        file_name=(pdf_file.name or "")[:ExtractionJob._meta.get_field("file_name").max_length],
+        webhook_url=webhook_url or "",
+        options=options or {},
+    )
+    transaction.on_commit(lambda: submit_job_id(job.id))
+    return job
+
+
+def submit_job_id(job_id):
+    with _executor_lock:
+        if job_id in _queued:
+            return False
+        _queued.add(job_id)
+    get_job_executor().submit(run_job, job_id)
+    return True
+
+
+def recover_jobs():
+    # Jobs only live in this process's executor, so a deploy or a recycled
+    # worker drops whatever was queued or running. RUNNING rows whose heartbeat
+    # is older than JOB_STALE_SECONDS have lost their worker and go back to
+    # PENDING; PENDING rows this process does not already hold are then
+    # submitted. The claim in execute_job keeps a job that several processes
+    # submit from running more than once.
+    close_old_connections()
+    try:
+        cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+        reset = ExtractionJob.objects.filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            status=ExtractionJob.Status.RUNNING,
+        ).update(status=ExtractionJob.Status.PENDING, started_at=None, claim_token=None, heartbeat_at=None)
+        pending = list(ExtractionJob.objects.filter(status=ExtractionJob.Status.PENDING).values_list("id", flat=True))
+    finally:
+        close_old_connections()
+
+    submitted = [job_id for job_id in pending if submit_job_id(job_id)]
+    if reset or submitted:
+        logger.info("Recovered extraction jobs: %d stale running reset, %d pending submitted", reset, len(submitted))
+    return submitted
+
+
+def _send_heartbeats():
+    while True:
+        time.sleep(settings.JOB_HEARTBEAT_SECONDS)
+        with _executor_lock:
+            tokens = list(_running.values())
+        if not tokens:
+            continue
+        close_old_connections()
+        try:
+            ExtractionJob.objects.filter(claim_token__in=tokens, status=ExtractionJob.Status.RUNNING).update(
+                heartbeat_at=timezone.now()
+            )
+        except Exception as e:
+            logger.warning("Extraction job heartbeat failed: %s", e)
+        finally:
+            close_old_connections()
+
+
+def _start_heartbeats():
+    global _heartbeat_thread
+    with _executor_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_send_heartbeats, name="extraction-job-heartbeat",
+                                                 daemon=True)
+            _heartbeat_thread.start()
+
+
+def _recover_periodically():
+    while True:
+        try:
+            recover_jobs()
+        except Exception as e:
+            logger.exception("Extraction job recovery failed: %s", e)
+        time.sleep(settings.JOB_RECOVERY_INTERVAL_SECONDS)
+
+
+def start_job_recovery():
+    # Called once per serving process (see gunicorn.conf.py).
+    global _recovery_thread
+    with _executor_lock:
+        if _recovery_thread is None:
+            _recovery_thread = threading.Thread(target=_recover_periodically, name="extraction-job-recovery",
+                                                daemon=True)
+            _recovery_thread.start()
+    return _recovery_thread
+
+
+def run_job(job_id):
+    # Jobs outlive the request that submitted them; their log lines carry the job id instead.
+    try:
+        with use_request_id(f"job-{job_id}"):
+            execute_job(job_id)
+    finally:
+        with _executor_lock:
+            _queued.discard(job_id)
+
+
+def execute_job(job_id):
+    close_old_connections()
+    token = uuid.uuid4()
+    try:
+        # The conditional update claims the job so it can only ever run once.
+        now = timezone.now()
+        claimed = ExtractionJob.objects.filter(id=job_id, status=ExtractionJob.Status.PENDING).update(
+            status=ExtractionJob.Status.RUNNING, started_at=now, heartbeat_at=now, claim_token=token
+        )
+        if not claimed:
+            return
+
+        _start_heartbeats()
+        with _executor_lock:
+            _running[job_id] = token
+
+        job = ExtractionJob.objects.get(id=job_id)
+        try:
+            # A recovered job may have lost its upload along with the worker that ran it.
+            with open(job.file_path, "rb") as fh:
+                result = EXTRACTORS[job.kind](fh, **job.options)
+            if is_error_result(result):
+                job.status = ExtractionJob.Status.FAILED
+                job.error = result["error"] if isinstance(result, dict) else result[0]["error"]
+            else:
+                job.status = ExtractionJob.Status.SUCCEEDED
+                job.result = result
+        except Exception as e:
+            logger.exception("Extraction job %s failed: %s", job_id, e)
+            job.status = ExtractionJob.Status.FAILED
+            job.error = str(e)
+
+        # Only the holder of the claim may finish the job; a job reset as stale
+        # belongs to whichever process claimed it next.
+        job.finished_at = timezone.now()
+        finished = ExtractionJob.objects.filter(
+            id=job_id, claim_token=token, status=ExtractionJob.Status.RUNNING
+        ).update(status=job.status, result=job.result, error=job.error, finished_at=job.finished_at)
+        if not finished:
+            logger.warning("Extraction job %s lost its claim; its result is discarded", job_id)
+            return
+
+        if os.path.exists(job.file_path):
+            os.remove(job.file_path)
+
+        if job.webhook_url:
+            notify_webhook(job)
+    finally:
+        with _executor_lock:
+            _running.pop(job_id, None)
+        close_old_connections()
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # A redirect would lead the request to a host check_webhook_url never saw.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        raise urllib.error.HTTPError(req.full_url, code, f"Webhook redirects are not followed ({newurl})", headers, fp)
+
+
+def check_webhook_url(url):
+    # Webhooks are fetched from inside the network, so they may only reach
+    # public addresses, or the hosts listed in JOB_WEBHOOK_ALLOWED_HOSTS.
+    parsed = urllib.parse.urlsplit(url)
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme not in ("http", "https") or not host:
+        raise ValueError("Webhook URL must be an http(s) URL with a host.")
+
+    allowed_hosts = [name.lower() for name in settings.JOB_WEBHOOK_ALLOWED_HOSTS]
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError(f"Webhook host {host} is not allowed.")
+        return
+
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError):
+        raise ValueError(f"Webhook host {host} cannot be resolved.")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"Webhook host {host} resolves to a non-public address.")
+
+
+def notify_webhook(job):
+    payload = json.dumps({
+        "job_id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+    }).encode("utf-8")
+    request = urllib.request.Request(
+        job.webhook_url,
+        data=payload,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        # Checked again at delivery time, in case the name resolves differently than at submission.
+        check_webhook_url(job.webhook_url)
+        with urllib.request.build_opener(_NoRedirects).open(request, timeout=settings.JOB_WEBHOOK_TIMEOUT_SECONDS):
+            pass
+    except Exception as e:
+        logger.warning("Webhook for job %s failed: %s", job.id, e)
+
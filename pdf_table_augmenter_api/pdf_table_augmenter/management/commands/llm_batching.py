@@ -0,0 +1,139 @@
+import json
+import logging
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.llm_cache import cached_chat_completion
+from pdf_table_augmenter.management.commands.reusable_functions_for_formula import build_formula_llm_prompt, \
+    generate_formula_llm_description
+from pdf_table_augmenter.management.commands.reusable_functions_for_image import build_image_llm_prompt, \
+    generate_image_llm_description
+from pdf_table_augmenter.management.commands.reusable_functions_for_table import build_table_llm_prompt, \
+    build_table_only_prompt, build_table_with_context_prompt, generate_table_llm_description, \
+    generate_table_only_description, generate_table_with_context_description
+
+logger = logging.getLogger(__name__)
+
+# Generators that can be packed into a multi-item prompt, mapped to the
+# builder of the exact prompt they would send on their own.
+BATCH_PROMPT_BUILDERS = {
+    generate_table_llm_description: build_table_llm_prompt,
+    generate_table_only_description: build_table_only_prompt,
+    generate_table_with_context_description: build_table_with_context_prompt,
+    generate_image_llm_description: build_image_llm_prompt,
+    generate_formula_llm_description: build_formula_llm_prompt,
+}
+
+BATCH_INSTRUCTIONS = (
+    "You will describe several independent items. Each item below starts with its id and contains its own "
+    "instructions and data. Follow each item's instructions separately, using only the information given "
+    "for that item.\n"
+    'Return a JSON object of the form {"descriptions": [{"id": "<item id>", "description": "<text>"}]} '
+    "with exactly one entry per item."
+)
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def run_generator(generator, kwargs):
+    return generator(**kwargs)
+
+
+def batching_enabled(func):
+    return settings.LLM_BATCH_ENABLED and (func in BATCH_PROMPT_BUILDERS or func is run_generator)
+
+
+def item_prompt(func, kwargs):
+    # Every item of a batch carries its own instructions, so calls dispatched
+    # through run_generator may mix generators within one batch.
+    if func is run_generator:
+        func, kwargs = kwargs["generator"], kwargs["kwargs"]
+    builder = BATCH_PROMPT_BUILDERS.get(func)
+    return builder(**kwargs) if builder else None
+
+
+def plan_batches(func, calls):
+    # Returns (positions to describe individually, batches of (position, prompt)).
+    individual = []
+    batches = []
+    current = []
+    current_tokens = 0
+    for position, kwargs in enumerate(calls):
+        prompt = item_prompt(func, kwargs)
+        if prompt is None:
+            individual.append(position)
+            continue
+
+        tokens = estimate_tokens(prompt)
+        if tokens > settings.LLM_BATCH_MAX_ITEM_TOKENS:
+            individual.append(position)
+            continue
+
+        if current and (current_tokens + tokens > settings.LLM_BATCH_MAX_PROMPT_TOKENS
+                        or len(current) >= settings.LLM_BATCH_MAX_ITEMS):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append((position, prompt))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+
+    individual.extend(position for batch in batches if len(batch) == 1 for position, _ in batch)
+    return sorted(individual), [batch for batch in batches if len(batch) > 1]
+
+
+def build_batch_prompt(items):
+    sections = [f"=== Item {item_id} ===\n{prompt.strip()}" for item_id, prompt in items]
+    return BATCH_INSTRUCTIONS + "\n\n" + "\n\n".join(sections)
+
+
+def parse_batch_response(content, item_ids):
+    try:
+        entries = json.loads(content).get("descriptions", [])
+    except (ValueError, AttributeError):
+        return {}
+
+    descriptions = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        item_id = str(entry.get("id", ""))
+        description = entry.get("description")
+        if item_id in item_ids and isinstance(description, str) and description.strip():
+            descriptions[item_id] = description.strip()
+    return descriptions
+
+
+def batch_request(generator_name, batch):
+    items = [(f"item-{number}", prompt) for number, (_, prompt) in enumerate(batch, start=1)]
+    positions = {item_id: position for (item_id, _), (position, _) in zip(items, batch)}
+    request = {
+        "generator": f"{generator_name}[batch]",
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": build_batch_prompt(items)}],
+        "temperature": 0.2,
+        "max_tokens": min(settings.LLM_BATCH_OUTPUT_TOKENS_PER_ITEM * len(items), 16000),
+        "response_format": {"type": "json_object"},
+    }
+    return positions, request
+
+
+def batch_descriptions(generator_name, positions, content):
+    descriptions = parse_batch_response(content, set(positions))
+    if len(descriptions) < len(positions):
+        logger.warning("Batched %s call returned %s of %s descriptions", generator_name, len(descriptions),
+                       len(positions))
+    return {positions[item_id]: description for item_id, description in descriptions.items()}
+
+
+def describe_batch(generator_name, batch):
+    positions, request = batch_request(generator_name, batch)
+    try:
+        content = cached_chat_completion(**request)
+    except Exception as e:
+        logger.warning("Batched %s call failed, falling back to single calls: %s", generator_name, e)
+        return {}
+    return batch_descriptions(generator_name, positions, content)
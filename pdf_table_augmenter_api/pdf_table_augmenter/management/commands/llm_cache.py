@@ -0,0 +1,160 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.llm_gateway import async_chat_completion, chat_completion
+from pdf_table_augmenter.metrics import CACHE_EVENTS
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_llm_cache(enabled=True):
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def llm_cache_key(model, messages, **params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path, ttl_seconds, max_entries, prune_interval=500):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.prune_interval = max(prune_interval, 1)
+        self._local = threading.local()
+        self._inserts_lock = threading.Lock()
+        self._inserts = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, generator TEXT, content TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_accessed ON llm_responses (accessed_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, generator, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT content, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and now - row[1] > self.ttl_seconds:
+            conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            row = None
+        if row is not None:
+            conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self.record(generator, "hits" if row is not None else "misses")
+        return row[0] if row is not None else None
+
+    def set(self, generator, key, content):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, generator, content, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, generator, content, now, now),
+        )
+        with self._inserts_lock:
+            self._inserts += 1
+            due = self._inserts % self.prune_interval == 0
+        if due:
+            self.prune(now)
+
+    def prune(self, now=None):
+        # Runs every prune_interval inserts rather than on each one, so the
+        # table may briefly exceed max_entries by that many rows per worker.
+        now = time.time() if now is None else now
+        conn = self._connection()
+        conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        excess = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            # Oldest first, so this walks the accessed_at index instead of sorting the table.
+            conn.execute(
+                "DELETE FROM llm_responses WHERE key IN ("
+                "SELECT key FROM llm_responses ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+
+    def record(self, generator, outcome):
+        CACHE_EVENTS.inc(cache="llm", generator=generator, outcome=outcome)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                path=settings.LLM_CACHE_PATH,
+                ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                prune_interval=settings.LLM_CACHE_PRUNE_INTERVAL,
+            )
+        return _cache
+
+
+def _cache_lookup(generator, model, messages, params):
+    cache = get_llm_cache() if settings.LLM_CACHE_ENABLED else None
+    key = llm_cache_key(model, messages, **params)
+    content = None
+    if cache is not None:
+        if settings.LLM_CACHE_BYPASS or _bypass.get():
+            cache.record(generator, "bypassed")
+        else:
+            content = cache.get(generator, key)
+    return cache, key, content
+
+
+def cached_chat_completion(generator, model, messages, temperature, max_tokens, response_format=None):
+    params = {"temperature": temperature, "max_tokens": max_tokens}
+    if response_format is not None:
+        params["response_format"] = response_format
+    cache, key, content = _cache_lookup(generator, model, messages, params)
+    if content is not None:
+        return content
+
+    content = chat_completion(model, messages, generator=generator, **params)
+
+    if cache is not None:
+        cache.set(generator, key, content)
+    return content
+
+
+async def async_cached_chat_completion(generator, model, messages, temperature, max_tokens, response_format=None):
+    params = {"temperature": temperature, "max_tokens": max_tokens}
+    if response_format is not None:
+        params["response_format"] = response_format
+    # SQLite reads and writes may wait on the shared lock, so they run off the event loop.
+    cache, key, content = await asyncio.to_thread(_cache_lookup, generator, model, messages, params)
+    if content is not None:
+        return content
+
+    content = await async_chat_completion(model, messages, generator=generator, **params)
+
+    if cache is not None:
+        await asyncio.to_thread(cache.set, generator, key, content)
+    return content
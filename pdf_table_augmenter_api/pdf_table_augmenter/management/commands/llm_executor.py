@@ -0,0 +1,110 @@
+import contextvars
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.llm_batching import batching_enabled, describe_batch, plan_batches
+from pdf_table_augmenter.management.commands.llm_gateway import LLMError
+
+logger = logging.getLogger(__name__)
+
+
+def call_safely(func, **kwargs):
+    # Failed calls come back as LLMError values so one bad item does not sink
+    # the rest of the document; callers attach them with apply_description.
+    try:
+        return func(**kwargs)
+    except LLMError as e:
+        return e
+    except Exception as e:
+        logger.exception("Description call failed: %s", e)
+        return LLMError("internal_error", str(e), status=500)
+
+
+def apply_description(output, result):
+    if isinstance(result, LLMError):
+        output["description"] = None
+        output["error"] = result.to_dict()
+    else:
+        output["description"] = result
+    return output
+
+
+def describe_concurrently(func, calls, max_workers=None):
+    if not calls:
+        return []
+
+    if batching_enabled(func):
+        results = [None] * len(calls)
+        for position, result in describe_as_completed(func, calls, max_workers):
+            results[position] = result
+        return results
+
+    max_workers = min(max_workers or settings.LLM_MAX_CONCURRENCY, len(calls))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm") as executor:
+        # Each call runs in a copy of the caller's context so request-scoped
+        # flags such as the LLM cache bypass carry over into the worker threads.
+        futures = [
+            executor.submit(contextvars.copy_context().run, call_safely, func, **kwargs)
+            for kwargs in calls
+        ]
+        return [future.result() for future in futures]
+
+
+def describe_as_completed(func, calls, max_workers=None):
+    if not calls:
+        return
+
+    if batching_enabled(func):
+        yield from describe_batched_as_completed(func, calls, max_workers)
+        return
+
+    max_workers = min(max_workers or settings.LLM_MAX_CONCURRENCY, len(calls))
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+    try:
+        futures = {
+            executor.submit(contextvars.copy_context().run, call_safely, func, **kwargs): position
+            for position, kwargs in enumerate(calls)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # A closed stream (e.g. the client went away) drops the calls not yet started.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def describe_batched_as_completed(func, calls, max_workers=None):
+    individual, batches = plan_batches(func, calls)
+    logger.info("Describing %s items with %s batched and %s single calls", len(calls), len(batches), len(individual))
+
+    max_workers = min(max_workers or settings.LLM_MAX_CONCURRENCY, len(individual) + len(batches))
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+    pending = {}
+
+    def submit(target, *args, **kwargs):
+        return executor.submit(contextvars.copy_context().run, target, *args, **kwargs)
+
+    try:
+        for position in individual:
+            pending[submit(call_safely, func, **calls[position])] = position
+        for batch in batches:
+            pending[submit(describe_batch, func.__name__, batch)] = batch
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                owner = pending.pop(future)
+                if isinstance(owner, int):
+                    yield owner, future.result()
+                    continue
+
+                descriptions = future.result()
+                for position, _ in owner:
+                    if position in descriptions:
+                        yield position, descriptions[position]
+                    else:
+                        # Items the batch lost or garbled get their own call.
+                        pending[submit(call_safely, func, **calls[position])] = position
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
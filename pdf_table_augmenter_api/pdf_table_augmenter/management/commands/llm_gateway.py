@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+from pdf_table_augmenter.metrics import LLM_CALL_SECONDS, LLM_TOKENS, record_stage
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    def __init__(self, code, message, retryable=False, status=502):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.retryable = retryable
+        self.status = status
+
+    def to_dict(self):
+        return {"code": self.code, "message": self.message, "retryable": self.retryable}
+
+
+class TokenBucketLimiter:
+    # Buckets live in a SQLite file so every worker process on the host draws
+    # from the same requests-per-minute and tokens-per-minute budget.
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _try_acquire(self, requests):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            levels = {}
+            wait_seconds = 0.0
+            for name, (amount, capacity) in requests.items():
+                row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+                rate = capacity / 60.0
+                level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                levels[name] = level
+                if level < amount:
+                    wait_seconds = max(wait_seconds, (amount - level) / rate)
+
+            if not wait_seconds:
+                for name, (amount, _) in requests.items():
+                    conn.execute(
+                        "INSERT INTO rate_buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                        (name, levels[name] - amount, now),
+                    )
+            conn.execute("COMMIT")
+            return wait_seconds
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _clamp(self, requests):
+        return {
+            name: (min(amount, capacity), capacity)
+            for name, (amount, capacity) in requests.items() if capacity > 0
+        }
+
+    def _next_pause(self, requests, waited, max_wait_seconds):
+        wait_seconds = self._try_acquire(requests)
+        if not wait_seconds:
+            return None
+        if waited + wait_seconds > max_wait_seconds:
+            raise LLMError("rate_limited", "Local LLM rate limit budget exhausted", retryable=True, status=429)
+        return wait_seconds + random.uniform(0, 0.05)
+
+    def acquire(self, requests, max_wait_seconds):
+        requests = self._clamp(requests)
+        waited = 0.0
+        while requests:
+            pause = self._next_pause(requests, waited, max_wait_seconds)
+            if pause is None:
+                break
+            time.sleep(pause)
+            waited += pause
+        return waited
+
+    async def acquire_async(self, requests, max_wait_seconds):
+        requests = self._clamp(requests)
+        waited = 0.0
+        while requests:
+            # BEGIN IMMEDIATE can wait on other workers' write lock; that wait
+            # must not stall every other request on the event loop.
+            pause = await asyncio.to_thread(self._next_pause, requests, waited, max_wait_seconds)
+            if pause is None:
+                break
+            await asyncio.sleep(pause)
+            waited += pause
+        return waited
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                raise LLMError("circuit_open", "LLM provider is failing; calls are paused", retryable=True,
+                               status=503)
+            # Half-open: let one trial call through.
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_limiter = None
+_breaker = None
+_gateway_lock = threading.Lock()
+
+
+def _connection_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+    )
+
+
+def get_client():
+    global _client
+    from openai import DefaultHttpxClient, OpenAI
+
+    with _gateway_lock:
+        if _client is None:
+            # Retries are handled here, so the SDK's own retry loop is off.
+            _client = OpenAI(
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=0,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                http_client=DefaultHttpxClient(limits=_connection_limits()),
+            )
+        return _client
+
+
+def get_async_client():
+    # httpx async pools are bound to the event loop that opened them, so each
+    # loop (normally the single ASGI server loop) gets its own client.
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    loop = asyncio.get_running_loop()
+    with _gateway_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                base_url=settings.OPENAI_BASE_URL,
+                max_retries=0,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                http_client=DefaultAsyncHttpxClient(limits=_connection_limits()),
+            )
+            _async_clients[loop] = client
+        return client
+
+
+def _get_limiter():
+    global _limiter
+    with _gateway_lock:
+        if _limiter is None:
+            _limiter = TokenBucketLimiter(settings.LLM_RATE_LIMIT_PATH)
+        return _limiter
+
+
+def _get_breaker():
+    global _breaker
+    with _gateway_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
+        return _breaker
+
+
+def _estimate_request_tokens(messages, max_tokens):
+    return sum(len(message.get("content") or "") for message in messages) // 4 + max_tokens
+
+
+def _classify(error):
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+
+    if isinstance(error, RateLimitError):
+        return LLMError("rate_limited", str(error), retryable=True, status=429)
+    if isinstance(error, APITimeoutError):
+        return LLMError("timeout", str(error), retryable=True, status=504)
+    if isinstance(error, APIConnectionError):
+        return LLMError("connection_error", str(error), retryable=True, status=502)
+    if isinstance(error, InternalServerError):
+        return LLMError("provider_error", str(error), retryable=True, status=502)
+    if isinstance(error, APIStatusError):
+        return LLMError("request_rejected", str(error), retryable=False, status=502)
+    return LLMError("unexpected_error", str(error), retryable=False, status=500)
+
+
+def _retry_delay(error, attempt):
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            retry_after = None
+    backoff = min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+    # Full jitter keeps workers that failed together from retrying together.
+    delay = random.uniform(0, backoff)
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+def _request_params(temperature, max_tokens, response_format):
+    params = {"temperature": temperature, "max_tokens": max_tokens}
+    if response_format is not None:
+        params["response_format"] = response_format
+    return params
+
+
+def _budget(messages, max_tokens):
+    return {
+        "requests": (1, settings.LLM_REQUESTS_PER_MINUTE),
+        "tokens": (_estimate_request_tokens(messages, max_tokens), settings.LLM_TOKENS_PER_MINUTE),
+    }
+
+
+def _failure_delay(breaker, e, attempt):
+    error = _classify(e)
+    if error.retryable:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    if not error.retryable or attempt == settings.LLM_MAX_RETRIES:
+        raise error from e
+    delay = _retry_delay(e, attempt)
+    logger.warning("LLM call failed (%s), retry %s in %.1fs", error.code, attempt + 1, delay,
+                   extra={"error_code": error.code})
+    return delay
+
+
+def _content(response):
+    return (response.choices[0].message.content or "").strip()
+
+
+def _observe_attempt(generator, model, started, response=None, error=None):
+    seconds = time.perf_counter() - started
+    outcome = "ok" if error is None else _classify(error).code
+    LLM_CALL_SECONDS.observe(seconds, generator=generator, model=model, outcome=outcome)
+    record_stage("llm", seconds)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, generator=generator, model=model, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, generator=generator, model=model, kind="completion")
+
+
+def chat_completion(model, messages, temperature, max_tokens, response_format=None, generator="unknown"):
+    params = _request_params(temperature, max_tokens, response_format)
+    breaker = _get_breaker()
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        breaker.before_call()
+        if settings.LLM_RATE_LIMIT_ENABLED:
+            _get_limiter().acquire(_budget(messages, max_tokens), settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS)
+
+        started = time.perf_counter()
+        try:
+            response = get_client().chat.completions.create(model=model, messages=messages, **params)
+        except Exception as e:
+            _observe_attempt(generator, model, started, error=e)
+            time.sleep(_failure_delay(breaker, e, attempt))
+            continue
+
+        _observe_attempt(generator, model, started, response)
+        breaker.record_success()
+        return _content(response)
+
+
+async def async_chat_completion(model, messages, temperature, max_tokens, response_format=None,
+                                generator="unknown"):
+    params = _request_params(temperature, max_tokens, response_format)
+    breaker = _get_breaker()
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        breaker.before_call()
+        if settings.LLM_RATE_LIMIT_ENABLED:
+            await _get_limiter().acquire_async(_budget(messages, max_tokens),
+                                               settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS)
+
+        started = time.perf_counter()
+        try:
+            response = await get_async_client().chat.completions.create(model=model, messages=messages, **params)
+        except Exception as e:
+            _observe_attempt(generator, model, started, error=e)
+            await asyncio.sleep(_failure_delay(breaker, e, attempt))
+            continue
+
+        _observe_attempt(generator, model, started, response)
+        breaker.record_success()
+        return _content(response)
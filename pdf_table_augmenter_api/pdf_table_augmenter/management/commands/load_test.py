@@ -0,0 +1,229 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+# The request endpoints of pdf_table_augmenter/urls.py, keyed like the views' kinds. All of them take a
+# PDF upload except "ask", which posts a JSON question about a table description.
+ENDPOINTS = {
+    "tables": "extract-description/tables",
+    "images": "extract-description/images",
+    "formulas": "extract-description/formulas",
+    "ask": "ask-question",
+    "first-case-tables": "extract-description/first-case/tables",
+    "second-case-tables": "extract-description/second-case/tables",
+    "all": "extract-description/all",
+}
+UPLOAD_ENDPOINTS = tuple(name for name in ENDPOINTS if name != "ask")
+
+SAMPLE_TABLE_DESCRIPTION = (
+    "Table 2 reports quarterly revenue, operating costs and net margin for the three business units "
+    "(Retail, Wholesale, Online) from Q1 2022 to Q4 2023. Online revenue grows every quarter and overtakes "
+    "Wholesale in Q3 2023, while Retail margins fall from 12% to 7% as operating costs rise."
+)
+
+
+def find_pdfs(paths):
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdfs.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        elif os.path.isfile(path):
+            pdfs.append(path)
+        else:
+            raise CommandError(f"No such file or directory: {path}")
+    return sorted(pdfs)
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of already sorted values.
+    if not values:
+        return None
+    return values[max(1, math.ceil(len(values) * q / 100)) - 1]
+
+
+def item_errors(payload):
+    if isinstance(payload, dict):
+        if "error" in payload:
+            return 1
+        items = [item for value in payload.values() if isinstance(value, list) for item in value]
+    elif isinstance(payload, list):
+        items = payload
+    else:
+        return 0
+    return sum(1 for item in items if isinstance(item, dict) and item.get("error"))
+
+
+def summarize(samples, wall_seconds):
+    latencies = sorted(sample["seconds"] for sample in samples)
+    failed = sum(1 for sample in samples if not sample["ok"])
+    return {
+        "requests": len(samples),
+        "failed": failed,
+        "error_rate": failed / len(samples) if samples else 0.0,
+        "item_errors": sum(sample["item_errors"] for sample in samples),
+        "throughput_rps": len(samples) / wall_seconds if wall_seconds else 0.0,
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "p99_seconds": percentile(latencies, 99),
+        "max_seconds": latencies[-1] if latencies else None,
+    }
+
+
+async def send(client, url, pdf_path, params, question=None):
+    if question is not None:
+        body = {"json": question}
+    else:
+        with open(pdf_path, "rb") as fh:
+            body = {"files": {"pdf": (os.path.basename(pdf_path), fh.read(), "application/pdf")}}
+    started = time.perf_counter()
+    sample = {"ok": False, "status": None, "item_errors": 0}
+    try:
+        response = await client.post(url, params=params, **body)
+        sample["status"] = response.status_code
+        sample["ok"] = response.is_success
+        if response.is_success:
+            sample["item_errors"] = item_errors(response.json())
+    except (httpx.HTTPError, ValueError) as e:
+        sample["error"] = f"{type(e).__name__}: {e}"
+    sample["seconds"] = time.perf_counter() - started
+    return sample
+
+
+async def run_load(base_url, endpoints, pdfs, total, concurrency, timeout, params, on_sample, question=None):
+    # Requests cycle through every (endpoint, pdf) pair so each endpoint sees the whole corpus.
+    plan = itertools.islice(itertools.cycle(itertools.product(endpoints, pdfs or [None])), total)
+    queue = asyncio.Queue()
+    for job in plan:
+        queue.put_nowait(job)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def worker():
+            while True:
+                try:
+                    endpoint, pdf_path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                sample = await send(client, base_url + ENDPOINTS[endpoint], pdf_path, params,
+                                    question if endpoint == "ask" else None)
+                sample["endpoint"] = endpoint
+                on_sample(sample)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+class Command(BaseCommand):
+    help = ("Drive the PDF extraction endpoints of a running server with a corpus of PDFs at a fixed "
+            "concurrency and report throughput, latency percentiles and error rates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("corpus", nargs="*",
+                            help="PDF files or directories searched for *.pdf (not needed for --endpoints ask).")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/table-augmenter/")
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                            help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once.")
+        parser.add_argument("--requests", type=int, default=None,
+                            help="Total requests (default: every endpoint once per PDF).")
+        parser.add_argument("--warmup", type=int, default=0, help="Requests sent first and left out of the report.")
+        parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--bypass-llm-cache", action="store_true",
+                            help="Send bypass_llm_cache=true so every request reaches the LLM.")
+        parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                            help="Extra query parameter for every request, e.g. --param prescan=true.")
+        parser.add_argument("--question", default="Which business unit has the highest revenue growth?",
+                            help="Question sent to the ask endpoint.")
+        parser.add_argument("--table-description", dest="table_description_path",
+                            help="Text file with the table description sent to the ask endpoint "
+                                 "(default: a built-in sample).")
+        parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file.")
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options["endpoints"].split(",") if name.strip()]
+        unknown = [name for name in endpoints if name not in ENDPOINTS]
+        if unknown or not endpoints:
+            raise CommandError(f"Unknown endpoints: {', '.join(unknown)}. Choose from {', '.join(ENDPOINTS)}.")
+        pdfs = find_pdfs(options["corpus"])
+        if not pdfs and any(name in UPLOAD_ENDPOINTS for name in endpoints):
+            raise CommandError("The corpus contains no PDF files.")
+        if pdfs and set(endpoints) <= {"ask"}:
+            pdfs = []
+        table_description = SAMPLE_TABLE_DESCRIPTION
+        if options["table_description_path"]:
+            with open(options["table_description_path"]) as fh:
+                table_description = fh.read()
+        question = {"question": options["question"], "table_description": table_description}
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        params = dict(param.split("=", 1) for param in options["param"] if "=" in param)
+        if options["bypass_llm_cache"]:
+            params["bypass_llm_cache"] = "true"
+        base_url = options["base_url"].rstrip("/") + "/"
+        total = options["requests"] or len(endpoints) * max(len(pdfs), 1)
+
+        if options["warmup"]:
+            self.stdout.write(f"Warming up with {options['warmup']} requests...")
+            asyncio.run(run_load(base_url, endpoints, pdfs, options["warmup"], options["concurrency"],
+                                 options["timeout"], params, lambda sample: None, question))
+
+        samples = []
+        started = time.perf_counter()
+
+        def on_sample(sample):
+            samples.append(sample)
+            if "error" in sample:
+                self.stderr.write(f"{sample['endpoint']}: {sample['error']}")
+            if len(samples) % max(1, total // 10) == 0 or len(samples) == total:
+                self.stdout.write(f"{len(samples)}/{total} requests, {time.perf_counter() - started:.1f}s")
+
+        self.stdout.write(f"Sending {total} requests to {len(endpoints)} endpoints with {len(pdfs)} PDFs "
+                          f"at concurrency {options['concurrency']}")
+        asyncio.run(run_load(base_url, endpoints, pdfs, total, options["concurrency"], options["timeout"],
+                             params, on_sample, question))
+        wall_seconds = time.perf_counter() - started
+
+        report = {
+            "wall_seconds": wall_seconds,
+            "concurrency": options["concurrency"],
+            "overall": summarize(samples, wall_seconds),
+            "endpoints": {
+                endpoint: summarize([sample for sample in samples if sample["endpoint"] == endpoint], wall_seconds)
+                for endpoint in endpoints
+            },
+            "status_codes": {},
+        }
+        for sample in samples:
+            status = str(sample["status"] or "exception")
+            report["status_codes"][status] = report["status_codes"].get(status, 0) + 1
+
+        self.write_report(report)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump(report, fh, indent=2)
+
+    def write_report(self, report):
+        def seconds(value):
+            return f"{value:.3f}" if value is not None else "-"
+
+        header = f"{'endpoint':<20} {'requests':>8} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} " \
+                 f"{'errors':>7} {'item errs':>9}"
+        self.stdout.write("")
+        self.stdout.write(header)
+        rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+        for name, summary in rows:
+            self.stdout.write(
+                f"{name:<20} {summary['requests']:>8} {summary['throughput_rps']:>7.2f} "
+                f"{seconds(summary['p50_seconds']):>8} {seconds(summary['p95_seconds']):>8} "
+                f"{seconds(summary['p99_seconds']):>8} {seconds(summary['max_seconds']):>8} "
+                f"{summary['error_rate']:>7.1%} {summary['item_errors']:>9}"
+            )
+        self.stdout.write(f"Wall time {report['wall_seconds']:.1f}s; status codes: "
+                          + ", ".join(f"{code}={count}" for code, count in sorted(report["status_codes"].items())))
@@ -0,0 +1,143 @@
+import re
+
+from django.conf import settings
+
+TABLES = "tables"
+PICTURES = "pictures"
+FORMULAS = "formulas"
+
+MATH_FONT_MARKERS = ("cmmi", "cmsy", "cmex", "msbm", "math", "stix", "symbol")
+MATH_SYMBOLS = set("=+±×÷−∑∏∫∮√∂∇∞≤≥≠≈≡∝∈∉⊂⊆∪∩∀∃αβγδεζηθλμνξπρστφχψωΓΔΘΛΞΠΣΦΨΩ")
+TABLE_CAPTION_LINE = re.compile(r"^\s*table\s*(\d+|[ivxlc]+)\b", re.IGNORECASE | re.MULTILINE)
+FIGURE_CAPTION_LINE = re.compile(r"^\s*fig(ure)?\.?\s*(\d+|[ivxlc]+)\b", re.IGNORECASE | re.MULTILINE)
+
+
+def _math_glyph_ratio(chars):
+    if not chars:
+        return 0.0
+    math_glyphs = sum(
+        1 for char in chars
+        if char.get("text") in MATH_SYMBOLS
+        or any(marker in char.get("fontname", "").lower() for marker in MATH_FONT_MARKERS)
+    )
+    return math_glyphs / len(chars)
+
+
+def _paragraphs(page):
+    paragraphs = []
+    current = []
+    previous_bottom = None
+    for line in page.extract_text_lines(return_chars=False):
+        height = line["bottom"] - line["top"]
+        if current and previous_bottom is not None and line["top"] - previous_bottom > height * 0.8:
+            paragraphs.append(" ".join(current))
+            current = []
+        current.append(line["text"].strip())
+        previous_bottom = line["bottom"]
+    if current:
+        paragraphs.append(" ".join(current))
+    return [paragraph for paragraph in paragraphs if paragraph]
+
+
+def _coverage(objects, page_area):
+    if not page_area:
+        return 0.0
+    covered = sum(max(0.0, float(obj["x1"] - obj["x0"])) * max(0.0, float(obj["bottom"] - obj["top"]))
+                  for obj in objects)
+    return min(1.0, covered / page_area)
+
+
+def scan_page(page):
+    text = page.extract_text() or ""
+    page_area = float(page.width) * float(page.height)
+    return {
+        "page_no": page.page_number,
+        "width": float(page.width),
+        "height": float(page.height),
+        "ruling_lines": len(page.lines) + len(page.rects),
+        "images": len(page.images),
+        "curves": len(page.curves),
+        "chars": len(page.chars),
+        "math_glyph_ratio": round(_math_glyph_ratio(page.chars), 4),
+        "text_coverage": round(_coverage(page.chars, page_area), 4),
+        "image_coverage": round(_coverage(page.images, page_area), 4),
+        "table_caption": bool(TABLE_CAPTION_LINE.search(text)),
+        "figure_caption": bool(FIGURE_CAPTION_LINE.search(text)),
+    }
+
+
+def is_candidate(signals, kind):
+    if kind == TABLES:
+        return signals["ruling_lines"] >= settings.PRESCAN_TABLE_MIN_RULINGS or signals["table_caption"]
+    if kind == PICTURES:
+        return (signals["images"] > 0 or signals["curves"] >= settings.PRESCAN_PICTURE_MIN_CURVES
+                or signals["figure_caption"])
+    if kind == FORMULAS:
+        return signals["math_glyph_ratio"] >= settings.PRESCAN_FORMULA_MIN_MATH_RATIO
+    return True
+
+
+def ocr_decision(signals):
+    if signals["chars"] < settings.ADAPTIVE_OCR_MIN_CHARS:
+        return True, "no text layer"
+    if (signals["image_coverage"] >= settings.ADAPTIVE_OCR_MIN_IMAGE_COVERAGE
+            and signals["text_coverage"] < settings.ADAPTIVE_OCR_MAX_TEXT_COVERAGE):
+        return True, "image-only page"
+    return False, "text layer present"
+
+
+def prescan_pages(path, kind=None):
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            signals = scan_page(page)
+            signals["candidate"] = kind is None or any(is_candidate(signals, part) for part in kind.split("+"))
+            if not signals["candidate"]:
+                signals["paragraphs"] = _paragraphs(page)
+            pages.append(signals)
+            page.close()
+    return pages
+
+
+def page_runs(pages):
+    runs = []
+    for page in pages:
+        if runs and runs[-1]["profile"] == page["profile"] and runs[-1]["pages"][-1]["page_no"] == page["page_no"] - 1:
+            runs[-1]["pages"].append(page)
+        else:
+            runs.append({"profile": page["profile"], "pages": [page]})
+    return runs
+
+
+def text_layer_document(pages):
+    texts = []
+    children = []
+    doc_pages = {}
+    for page in pages:
+        page_no = page["page_no"]
+        doc_pages[str(page_no)] = {"page_no": page_no, "size": {"width": page["width"], "height": page["height"]}}
+        for paragraph in page["paragraphs"]:
+            ref = f"#/texts/{len(texts)}"
+            texts.append({
+                "self_ref": ref,
+                "parent": {"$ref": "#/body"},
+                "children": [],
+                "content_layer": "body",
+                "label": "text",
+                "prov": [{"page_no": page_no, "charspan": [0, len(paragraph)]}],
+                "orig": paragraph,
+                "text": paragraph,
+            })
+            children.append({"$ref": ref})
+
+    return {
+        "texts": texts,
+        "tables": [],
+        "pictures": [],
+        "groups": [],
+        "body": {"self_ref": "#/body", "children": children, "content_layer": "body", "name": "_root_",
+                 "label": "unspecified"},
+        "pages": doc_pages,
+    }
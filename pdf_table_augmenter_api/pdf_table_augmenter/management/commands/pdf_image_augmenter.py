@@ -1,147 +1,108 @@
-import os
-import tempfile
-import re
+import logging
+
+from pdf_table_augmenter.management.commands.converter_registry import IMAGES_WITH_OCR
+from pdf_table_augmenter.management.commands.description_stream import stream_descriptions, stream_descriptions_async
+from pdf_table_augmenter.management.commands.document_index import DocumentIndex
+from pdf_table_augmenter.management.commands.llm_executor import apply_description, describe_concurrently
+from pdf_table_augmenter.management.commands.reference_scanner import FIGURE
+from pdf_table_augmenter.management.commands.reusable_functions_for_document import parse_pdf_document
+from pdf_table_augmenter.management.commands.reusable_functions_for_image import generate_image_llm_description
+from pdf_table_augmenter.metrics import record_items
 
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
+logger = logging.getLogger(__name__)
 
-from pdf_table_augmenter.management.commands.reusable_functions_for_image import generate_image_llm_description
-from pdf_table_augmenter.management.commands.reusable_functions_for_table import extract_caption, roman_numeral
 
+def prepare_image_descriptions(doc, index=None):
+    logger.debug("Document parsed: %s texts, %s images", len(doc.get("texts", [])), len(doc.get("pictures", [])))
 
-def extract_image_descriptions_from_file(file_obj):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(file_obj.read())
-        tmp_path = tmp.name
+    index = index or DocumentIndex(doc)
 
-    try:
-        pipeline_options = PdfPipelineOptions(
-            do_ocr=True,
-            do_table_structure=False,
-            generate_page_images=True,
-            generate_picture_images=True,
-        )
-        converter = DocumentConverter(format_options={
-            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-        })
+    valid_images = []
+    for idx, image in enumerate(doc.get("pictures", [])):
+        prov = image.get("prov", [])
+        if prov and isinstance(prov, list) and len(prov) > 0:
+            valid_images.append(image)
+        else:
+            logger.debug("Skipping invalid image %s: %s", idx + 1, image.get("captions", []))
+
+    for idx, image in enumerate(valid_images):
+        image["index"] = idx
 
-        result = converter.convert(tmp_path)
-        doc = result.document.export_to_dict()
-        print(f"Document parsed: {len(doc.get('texts', []))} texts, {len(doc.get('pictures', []))} images")
+    outputs = []
+    description_calls = []
+    for idx, image in enumerate(valid_images):
+        image_ref = f"#/pictures/{image.get('index', idx)}"
+        image_index_in_body = index.body_position(image_ref)
 
-        texts = doc.get("texts", [])
-        body_children = doc.get("body", {}).get("children", [])
+        if image_index_in_body is None:
+            continue
 
-        valid_images = []
-        for idx, image in enumerate(doc.get("pictures", [])):
-            prov = image.get("prov", [])
-            if prov and isinstance(prov, list) and len(prov) > 0:
-                valid_images.append(image)
+        page_display = index.page_display(image)
+
+        title = index.caption(image, image_index_in_body)
+        chunks_before, chunks_after = index.referencing_context(FIGURE, idx + 1, title, image_index_in_body)
+        try:
+            metadata = image.get("metadata", {})
+            if metadata:
+                image_metadata = "\n".join(f"{key}: {value}" for key, value in metadata.items())
             else:
-                print(f"Skipping invalid image {idx + 1}: {image.get('captions', [])}")
-
-        for idx, image in enumerate(valid_images):
-            image["index"] = idx
-
-        outputs = []
-        for idx, image in enumerate(valid_images):
-            image_ref = f"#/pictures/{image.get('index', idx)}"
-            image_index_in_body = next(
-                (i for i, child in enumerate(body_children) if child.get("$ref") == image_ref),
-                None
-            )
-
-            if image_index_in_body is None:
-                continue
-
-            prov = image.get("prov", [])
-            page_numbers = sorted(set(p.get("page_no", 1) for p in prov)) if prov else [1]
-            page_display = f"Pages {min(page_numbers)}-{max(page_numbers)}" if len(
-                page_numbers) > 1 else f"Page {page_numbers[0]}" if page_numbers else "Page 1"
-
-            title = extract_caption(image, body_children, image_index_in_body, texts)
-            ref_id = None
-            if title:
-                match = re.match(r'^(FIGURE|Figure|Fig\.?)\s*(\d+|I|II|III|IV|V|VI|VII|VIII|IX|X)', title,
-                                 re.IGNORECASE)
-                if match:
-                    ref_id = f"{match.group(1)} {match.group(2)}"
-
-            roman_id = roman_numeral(idx + 1)
-            image_ref_patterns = [
-                rf"\b[Ff]igure\s*{idx + 1}\b",
-                rf"\b[Ff]ig\.?\s*{idx + 1}\b",
-                rf"\b[Ss]ee\s*[Ff]igure\s*{idx + 1}\b",
-                rf"\b[Ss]ee\s*[Ff]ig\.?\s*{idx + 1}\b",
-                rf"\b[Tt]he\s*[Ff]igure\s*{idx + 1}\b",
-                rf"\b[Tt]he\s*[Ff]ig\.?\s*{idx + 1}\b",
-                rf"\b[Aa]s\s*shown\s*in\s*[Ff]igure\s*{idx + 1}\b",
-                rf"\b[Aa]s\s*shown\s*in\s*[Ff]ig\.?\s*{idx + 1}\b",
-                rf"\b[Aa]s\s*illustrated\s*in\s*[Ff]igure\s*{idx + 1}\b",
-                rf"\b[Aa]s\s*illustrated\s*in\s*[Ff]ig\.?\s*{idx + 1}\b",
-                rf"\b[Ff]igure\s*{roman_id}\b",
-                rf"\b[Ff]ig\.?\s*{roman_id}\b",
-                rf"\b[Ss]ee\s*[Ff]igure\s*{roman_id}\b",
-                rf"\b[Ss]ee\s*[Ff]ig\.?\s*{roman_id}\b",
-                rf"\b[Tt]he\s*[Ff]igure\s*{roman_id}\b",
-                rf"\b[Tt]he\s*[Ff]ig\.?\s*{roman_id}\b",
-                rf"\b[Aa]s\s*shown\s*in\s*[Ff]igure\s*{roman_id}\b",
-                rf"\b[Aa]s\s*shown\s*in\s*[Ff]ig\.?\s*{roman_id}\b",
-                rf"\b[Aa]s\s*illustrated\s*in\s*[Ff]igure\s*{roman_id}\b",
-                rf"\b[Aa]s\s*illustrated\s*in\s*[Ff]ig\.?\s*{roman_id}\b",
-            ]
-
-            if ref_id:
-                image_ref_patterns.append(rf"\b{re.escape(ref_id)}\b")
-
-            chunks_before = []
-            chunks_after = []
-            for i, child in enumerate(body_children):
-                if child.get("$ref", "").startswith("#/texts/"):
-                    text_idx = int(child["$ref"].split("/")[-1])
-                    text_content = texts[text_idx]["text"].strip()
-
-                    if title and text_content.strip().lower() == title.strip().lower():
-                        continue
-
-                    if any(re.search(pattern, text_content, re.IGNORECASE) for pattern in image_ref_patterns):
-                        if i < image_index_in_body:
-                            chunks_before.append(text_content)
-                        elif i > image_index_in_body:
-                            chunks_after.append(text_content)
-            try:
-                metadata = image.get("metadata", {})
-                if metadata:
-                    image_metadata = "\n".join(f"{key}: {value}" for key, value in metadata.items())
-                else:
-                    image_metadata = "[No image metadata available]"
-            except Exception as e:
-                image_metadata = f"[Error extracting image metadata: {str(e)}]"
-
-            try:
-                base64_uri = image.get("image", {}).get("uri", "")
-                if not base64_uri:
-                    base64_uri = "[No base64 URI available]"
-            except Exception as e:
-                base64_uri = f"[Error extracting base64 URI: {str(e)}]"
-
-            description = generate_image_llm_description(chunks_before, chunks_after, title, image_metadata)
-
-            outputs.append({
-                "page": page_display,
-                "image_index": idx + 1,
-                "description": description,
-                "base64": base64_uri
-            })
-
-        print(f"Returning {len(outputs)} image descriptions")
+                image_metadata = "[No image metadata available]"
+        except Exception as e:
+            image_metadata = f"[Error extracting image metadata: {str(e)}]"
+
+        try:
+            base64_uri = image.get("image", {}).get("uri", "")
+            if not base64_uri:
+                base64_uri = "[No base64 URI available]"
+        except Exception as e:
+            base64_uri = f"[Error extracting base64 URI: {str(e)}]"
+
+        description_calls.append({
+            "chunks_before": chunks_before,
+            "chunks_after": chunks_after,
+            "title": title,
+            "image_metadata": image_metadata
+        })
+
+        outputs.append({
+            "page": page_display,
+            "image_index": idx + 1,
+            "description": None,
+            "base64": base64_uri
+        })
+
+    record_items("images", outputs)
+    return outputs, description_calls
+
+
+def extract_image_descriptions_from_file(file_obj, prescan=None, adaptive_ocr=False):
+    try:
+        doc = parse_pdf_document(file_obj, IMAGES_WITH_OCR, prescan, adaptive_ocr)
+        outputs, description_calls = prepare_image_descriptions(doc)
+
+        descriptions = describe_concurrently(generate_image_llm_description, description_calls)
+        for output, description in zip(outputs, descriptions):
+            apply_description(output, description)
+
+        logger.info("Returning %s image descriptions", len(outputs))
         return outputs
 
     except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
+        logger.exception("Error processing PDF: %s", e)
         return [{"error": f"Failed to process PDF: {str(e)}"}]
 
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+
+def stream_image_descriptions_from_file(file_obj, prescan=None, adaptive_ocr=False):
+    return stream_descriptions(
+        lambda: parse_pdf_document(file_obj, IMAGES_WITH_OCR, prescan, adaptive_ocr),
+        prepare_image_descriptions,
+        generate_image_llm_description
+    )
+
+
+def stream_image_descriptions_from_file_async(file_obj, prescan=None, adaptive_ocr=False):
+    return stream_descriptions_async(
+        lambda: parse_pdf_document(file_obj, IMAGES_WITH_OCR, prescan, adaptive_ocr),
+        prepare_image_descriptions,
+        generate_image_llm_description
+    )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pdf_table_augmenter.management.commands.job_runner import get_job_executor, recover_jobs
+
+
+class Command(BaseCommand):
+    help = ("Re-submit PENDING extraction jobs and reset stale RUNNING ones, then run them to completion. "
+            "Servers started through gunicorn.conf.py do this on their own.")
+
+    def handle(self, *args, **options):
+        pending = recover_jobs()
+        self.stdout.write(f"Running {len(pending)} pending extraction jobs...")
+        get_job_executor().shutdown(wait=True)
+        self.stdout.write("Done.")
@@ -0,0 +1,49 @@
+import re
+
+import roman
+
+TABLE = "table"
+FIGURE = "figure"
+EQUATION = "equation"
+
+REFERENCE_PATTERN = re.compile(
+    r"\b(?:(?P<table>table)|(?P<figure>fig(?:ure)?\.?)|(?P<equation>eq(?:uation)?\.?|formula))\s*"
+    r"(?:\(\s*(?P<parenthesised>\d+|[ivxlcdm]+)\s*\)|(?P<number>\d+|[ivxlcdm]+)\b)",
+    re.IGNORECASE
+)
+
+
+def _reference_from_match(match):
+    kind = TABLE if match.group("table") else FIGURE if match.group("figure") else EQUATION
+    token = match.group("number") or match.group("parenthesised")
+    if token.isdigit():
+        return kind, int(token)
+    try:
+        return kind, roman.fromRoman(token.upper())
+    except roman.InvalidRomanNumeralError:
+        return None
+
+
+def parse_reference(text):
+    match = REFERENCE_PATTERN.match(text or "")
+    return _reference_from_match(match) if match else None
+
+
+class ReferenceIndex:
+    def __init__(self, text_blocks):
+        self._postings = {}
+        for position, text in text_blocks:
+            seen = set()
+            for match in REFERENCE_PATTERN.finditer(text):
+                reference = _reference_from_match(match)
+                if reference is None or reference in seen:
+                    continue
+                seen.add(reference)
+                self._postings.setdefault(reference, []).append((position, text))
+
+    def referencing_blocks(self, kind, numbers):
+        blocks = {}
+        for number in numbers:
+            for position, text in self._postings.get((kind, number), []):
+                blocks[position] = text
+        return sorted(blocks.items())
@@ -0,0 +1,98 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.llm_batching import estimate_tokens
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what when "
+    "where which who why with".split()
+)
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class RetrievalIndex:
+    # Okapi BM25 over a sparse document-term matrix; the per-term weights are
+    # folded into the matrix up front so a query is one sparse mat-vec.
+    def __init__(self, documents, k1=1.5, b=0.75):
+        import numpy as np
+        from scipy import sparse
+
+        self.documents = documents
+        self.vocabulary = {}
+        rows, columns, counts = [], [], []
+        lengths = np.zeros(len(documents))
+        for row, document in enumerate(documents):
+            terms = tokenize(document["text"])
+            lengths[row] = len(terms)
+            term_counts = {}
+            for term in terms:
+                column = self.vocabulary.setdefault(term, len(self.vocabulary))
+                term_counts[column] = term_counts.get(column, 0) + 1
+            rows.extend([row] * len(term_counts))
+            columns.extend(term_counts)
+            counts.extend(term_counts.values())
+
+        shape = (len(documents), max(len(self.vocabulary), 1))
+        frequencies = sparse.csr_matrix((np.array(counts, dtype=float), (rows, columns)), shape=shape)
+
+        document_frequency = np.bincount(frequencies.indices, minlength=shape[1])
+        idf = np.log(1 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        average_length = lengths.mean() if len(documents) else 0.0
+        norms = k1 * (1 - b + b * lengths / average_length) if average_length else np.full(len(documents), k1)
+        row_norms = np.repeat(norms, np.diff(frequencies.indptr))
+        data = frequencies.data
+        weights = frequencies.copy()
+        weights.data = idf[frequencies.indices] * data * (k1 + 1) / (data + row_norms)
+        self.weights = weights.tocsc()
+
+    def search(self, query, top_k=None):
+        import numpy as np
+
+        columns = sorted({self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary})
+        if not columns:
+            return []
+
+        scores = np.asarray(self.weights[:, columns].sum(axis=1)).ravel()
+        ranked = np.argsort(-scores, kind="stable")
+        if top_k:
+            ranked = ranked[:top_k]
+        return [(int(row), float(scores[row])) for row in ranked if scores[row] > 0]
+
+
+def select_within_budget(index, query, token_budget, top_k):
+    selected = []
+    used = 0
+    for row, score in index.search(query, top_k):
+        document = index.documents[row]
+        tokens = estimate_tokens(document["prompt"])
+        if used + tokens > token_budget:
+            continue
+        selected.append((document, score))
+        used += tokens
+    return selected
+
+
+def cached_index(key, build_documents):
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = RetrievalIndex(build_documents())
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > settings.RETRIEVAL_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,136 @@
+import logging
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.converter_registry import OCR_FALLBACK_PROFILES, convert_document, \
+    is_document_stream
+from pdf_table_augmenter.management.commands.document_cache import document_cache_key, get_document_cache
+from pdf_table_augmenter.management.commands.document_sharding import convert_in_shards, convert_page_ranges, \
+    count_pdf_pages, merge_shard_documents
+from pdf_table_augmenter.management.commands.page_prescan import ocr_decision, page_runs, prescan_pages, \
+    text_layer_document
+from pdf_table_augmenter.management.commands.upload_staging import CHUNK_SIZE, spooled_file, staged_upload
+from pdf_table_augmenter.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+def plan_pages(path, profile, prescan=None, adaptive_ocr=False):
+    pages = prescan_pages(path, prescan)
+    for page in pages:
+        page["profile"] = profile if page["candidate"] else None
+        if adaptive_ocr and page["candidate"] and profile in OCR_FALLBACK_PROFILES:
+            page["ocr"], page["ocr_reason"] = ocr_decision(page)
+            if not page["ocr"]:
+                page["profile"] = OCR_FALLBACK_PROFILES[profile]
+    return pages
+
+
+def ocr_report(pages):
+    decisions = [
+        {"page": page["page_no"], "ocr": page["ocr"], "reason": page["ocr_reason"]}
+        for page in pages if "ocr" in page
+    ]
+    skipped = sum(1 for decision in decisions if not decision["ocr"])
+
+    # OCR and non-OCR runs cover different pages, so their timings cannot be
+    # subtracted; the saving is estimated from a configured per-page OCR cost.
+    return {
+        "pages": decisions,
+        "ocr_pages": len(decisions) - skipped,
+        "skipped_ocr_pages": skipped,
+        "ocr_seconds_per_page": settings.ADAPTIVE_OCR_SECONDS_PER_PAGE,
+        "estimated_seconds_saved": round(skipped * settings.ADAPTIVE_OCR_SECONDS_PER_PAGE, 2),
+    }
+
+
+def convert_planned_pages(path, profile, prescan=None, adaptive_ocr=False):
+    pages = plan_pages(path, profile, prescan, adaptive_ocr)
+    runs = page_runs(pages)
+
+    converted = {}
+    for run_profile in dict.fromkeys(run["profile"] for run in runs if run["profile"]):
+        ranges = [
+            (run["pages"][0]["page_no"], run["pages"][-1]["page_no"]) for run in runs if run["profile"] == run_profile
+        ]
+        converted[run_profile] = iter(convert_page_ranges(run_profile, path, ranges))
+
+    # Skipped pages keep their PDF text layer as plain text blocks, so page
+    # numbers, captions and referencing context around candidates survive.
+    doc = merge_shard_documents([
+        next(converted[run["profile"]]) if run["profile"] else text_layer_document(run["pages"]) for run in runs
+    ])
+
+    metadata = {"page_count": len(pages)}
+    if prescan:
+        candidate_pages = [page["page_no"] for page in pages if page["candidate"]]
+        metadata.update({
+            "prescan": prescan,
+            "candidate_pages": candidate_pages,
+            "skipped_pages": [page["page_no"] for page in pages if not page["candidate"]],
+        })
+        logger.info("Pre-scan (%s): %s of %s pages are candidates", prescan, len(candidate_pages), len(pages))
+    if adaptive_ocr and profile in OCR_FALLBACK_PROFILES:
+        metadata["ocr"] = ocr_report(pages)
+        logger.info("Adaptive OCR: %s of %s pages need OCR", metadata["ocr"]["ocr_pages"], len(pages))
+    doc["augmenter_metadata"] = metadata
+    return doc
+
+
+def needs_local_file(stream, prescan=None, adaptive_ocr=False):
+    if prescan or adaptive_ocr:
+        return True
+    if not settings.DOCUMENT_SHARDING_ENABLED:
+        return False
+    stream.seek(0)
+    return count_pdf_pages(stream) > settings.DOCUMENT_SHARD_MIN_PAGES
+
+
+def convert_pdf(profile, source, prescan=None, adaptive_ocr=False):
+    if is_document_stream(source):
+        # Page planning and sharding work on page ranges of a file on disk.
+        if needs_local_file(source.stream, prescan, adaptive_ocr):
+            source.stream.seek(0)
+            with spooled_file(iter(lambda: source.stream.read(CHUNK_SIZE), b"")) as (path, _):
+                return convert_pdf(profile, path, prescan, adaptive_ocr)
+        source.stream.seek(0)
+        return convert_document(profile, source).document.export_to_dict()
+
+    if prescan or (adaptive_ocr and profile in OCR_FALLBACK_PROFILES):
+        return convert_planned_pages(source, profile, prescan, adaptive_ocr)
+
+    if settings.DOCUMENT_SHARDING_ENABLED:
+        page_count = count_pdf_pages(source)
+        if page_count > settings.DOCUMENT_SHARD_MIN_PAGES:
+            return convert_in_shards(profile, source, page_count)
+
+    return convert_document(profile, source).document.export_to_dict()
+
+
+def conversion_variant(profile, prescan=None, adaptive_ocr=False):
+    variant = profile
+    if prescan:
+        variant += f"-prescan-{prescan}"
+    if adaptive_ocr and profile in OCR_FALLBACK_PROFILES:
+        variant += "-adaptive-ocr"
+    return variant
+
+
+def parse_pdf_document(file_obj, profile, prescan=None, adaptive_ocr=False):
+    adaptive_ocr = adaptive_ocr and profile in OCR_FALLBACK_PROFILES
+    cache = get_document_cache() if settings.DOCUMENT_CACHE_ENABLED else None
+
+    with staged_upload(file_obj) as (digest, source):
+        cache_key = document_cache_key(digest, conversion_variant(profile, prescan, adaptive_ocr))
+        if cache is not None:
+            doc = cache.get(cache_key)
+            if doc is not None:
+                logger.info("Document cache hit: %s", cache_key)
+                return doc
+
+        with timed("convert"):
+            doc = convert_pdf(profile, source, prescan, adaptive_ocr)
+
+    if cache is not None:
+        cache.put(cache_key, doc)
+    return doc
@@ -1,11 +1,7 @@
-import os
+from pdf_table_augmenter.management.commands.llm_cache import cached_chat_completion
 
-from openai import OpenAI
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-
-def generate_image_llm_description(chunks_before, chunks_after, title=None, image_metadata=None):
+def build_image_llm_prompt(chunks_before, chunks_after, title=None, image_metadata=None):
     prompt_parts = []
 
     if title:
@@ -28,15 +24,16 @@ def generate_image_llm_description(chunks_before, chunks_after, title=None, imag
         "the image might provide. Ensure the description is coherent and relevant to the provided information."
     )
 
-    prompt = "\n---\n".join(prompt_parts)
+    return "\n---\n".join(prompt_parts)
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Error generating description: {str(e)}"
+
+def generate_image_llm_description(chunks_before, chunks_after, title=None, image_metadata=None):
+    prompt = build_image_llm_prompt(chunks_before, chunks_after, title, image_metadata)
+
+    return cached_chat_completion(
+        "generate_image_llm_description",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=1000
+    )
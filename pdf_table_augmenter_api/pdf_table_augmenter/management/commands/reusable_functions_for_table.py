@@ -1,20 +1,23 @@
-import os
-import re
-import roman
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from openai import OpenAI
+from django.conf import settings
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+from pdf_table_augmenter.management.commands.llm_cache import cached_chat_completion
+from pdf_table_augmenter.management.commands.llm_gateway import LLMError
 
+logger = logging.getLogger(__name__)
 
-def roman_numeral(n):
-    try:
-        return roman.toRoman(n).upper()
-    except:
-        return str(n)
+_map_slots = None
+_map_slots_lock = threading.Lock()
 
 
-def generate_table_llm_description(chunks_before, chunks_after, title=None, table_data_preview=None):
+def build_table_llm_prompt(chunks_before, chunks_after, title=None, table_data_preview=None, row_chunks=None):
+    if row_chunks:
+        return None
+
     prompt_parts = []
 
     if title:
@@ -37,84 +40,110 @@ def generate_table_llm_description(chunks_before, chunks_after, title=None, tabl
         "the table might provide. Ensure the description is coherent and relevant to the provided information."
     )
 
-    prompt = "\n---\n".join(prompt_parts)
+    return "\n---\n".join(prompt_parts)
+
+
+def generate_table_llm_description(chunks_before, chunks_after, title=None, table_data_preview=None,
+                                   row_chunks=None):
+    if row_chunks:
+        return generate_table_map_reduce_description(chunks_before, chunks_after, title, row_chunks)
+
+    prompt = build_table_llm_prompt(chunks_before, chunks_after, title, table_data_preview)
+
+    return cached_chat_completion(
+        "generate_table_llm_description",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=1000
+    )
+
 
-    try:
-        response = client.chat.completions.create(
+def map_slots():
+    # Map-reduce tables are described from threads of describe_concurrently's
+    # pool, so a per-table pool alone would multiply the two limits. One
+    # process-wide semaphore caps the chunk summaries in flight instead.
+    global _map_slots
+    with _map_slots_lock:
+        if _map_slots is None:
+            _map_slots = threading.BoundedSemaphore(settings.TABLE_MAP_REDUCE_MAX_WORKERS)
+        return _map_slots
+
+
+def generate_table_chunk_summary(title, chunk):
+    prompt = (
+        (f"Table Title:\n{title}\n---\n" if title else "")
+        + f"Rows {chunk['first_row']}-{chunk['last_row']} of the table (tab-separated, with headers):\n"
+        + chunk["text"]
+        + "\n---\nSummarize what these rows contain: the entities covered, notable values, ranges, totals "
+          "and trends. Be factual and concise; do not describe rows that are not shown."
+    )
+    with map_slots():
+        return cached_chat_completion(
+            "generate_table_chunk_summary",
             model="gpt-4o",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
-            max_tokens=1000
+            max_tokens=400
         )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Error generating description: {str(e)}"
 
 
-def get_cell_text(cell):
-    return cell.get("text", "").strip() if isinstance(cell, dict) else str(cell).strip()
+def generate_table_map_reduce_description(chunks_before, chunks_after, title, row_chunks):
+    # Chunk summaries are cached by prompt, so a retry after a partial failure
+    # only pays for the chunks that failed.
+    max_workers = min(settings.TABLE_MAP_REDUCE_MAX_WORKERS, len(row_chunks))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-map") as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, generate_table_chunk_summary, title, chunk)
+            for chunk in row_chunks
+        ]
+        summaries = []
+        failures = 0
+        for chunk, future in zip(row_chunks, futures):
+            try:
+                summaries.append(f"Rows {chunk['first_row']}-{chunk['last_row']}:\n{future.result()}")
+            except Exception as e:
+                logger.warning("Summary of rows %s-%s failed: %s", chunk["first_row"], chunk["last_row"], e)
+                failures += 1
+
+    if failures:
+        raise LLMError("map_reduce_failed", f"{failures} of {len(row_chunks)} table chunks failed",
+                       retryable=True)
+
+    prompt_parts = []
+    if title:
+        prompt_parts.append(f"Table Title:\n{title}\n")
+    if chunks_before:
+        prompt_parts.append("Context Before the Table:\n" + "\n".join(chunks_before) + "\n")
+    if chunks_after:
+        prompt_parts.append("Context After the Table:\n" + "\n".join(chunks_after) + "\n")
+    prompt_parts.append("Summaries of consecutive parts of the table:\n" + "\n\n".join(summaries) + "\n")
+    prompt_parts.append(
+        "Merge these partial summaries into one clear and concise description of what the whole table "
+        "represents. Focus on the purpose, contents, and insights the table might provide. Ensure the "
+        "description is coherent and relevant to the provided information."
+    )
 
+    return cached_chat_completion(
+        "generate_table_map_reduce_description",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": "\n---\n".join(prompt_parts)}],
+        temperature=0.2,
+        max_tokens=1000
+    )
 
-def extract_caption(table, body_children, table_index_in_body, texts):
-    if table_index_in_body is None:
-        return None
 
-    caption = None
-    captions = table.get("captions", [])
-
-    if captions:
-        if isinstance(captions, list) and captions:
-            caption_item = captions[0]
-            caption = caption_item.get("text", "").strip()
-            if not caption and caption_item.get("$ref", "").startswith("#/texts/"):
-                try:
-                    text_idx = int(caption_item["$ref"].split("/")[-1])
-                    if text_idx < len(texts):
-                        caption = texts[text_idx]["text"].strip()
-                except (ValueError, IndexError):
-                    caption = None
-        elif isinstance(captions, dict):
-            caption = captions.get("text", "").strip()
-            if not caption and captions.get("$ref", "").startswith("#/texts/"):
-                try:
-                    text_idx = int(captions["$ref"].split("/")[-1])
-                    if text_idx < len(texts):
-                        caption = texts[text_idx]["text"].strip()
-                except (ValueError, IndexError):
-                    caption = None
-
-    if not caption:
-        caption = table.get("caption", "").strip() or table.get("metadata", {}).get("caption", "").strip()
-
-    if not caption and table_index_in_body is not None:
-        search_range = 3
-        for i in range(max(0, table_index_in_body - search_range),
-                       min(len(body_children), table_index_in_body + search_range + 1)):
-            if i == table_index_in_body:
-                continue
-            child = body_children[i]
-            if child.get("$ref", "").startswith("#/texts/"):
-                try:
-                    text_idx = int(child["$ref"].split("/")[-1])
-                    if text_idx < len(texts):
-                        text_content = texts[text_idx]["text"].strip()
-                        if re.match(r'^(TABLE|Table)\s*(\d+|I|II|III|IV|V|VI|VII|VIII|IX|X)', text_content,
-                                    re.IGNORECASE):
-                            caption = text_content
-                            break
-                except (ValueError, IndexError):
-                    continue
-
-    return caption
+def get_cell_text(cell):
+    return cell.get("text", "").strip() if isinstance(cell, dict) else str(cell).strip()
 
 
-def generate_table_only_description(table_data_preview: str) -> str:
+def build_table_only_prompt(table_data_preview: str):
     cleaned_preview = "\n".join(line.strip() for line in table_data_preview.splitlines() if line.strip())
 
     if not cleaned_preview:
-        return "No table data provided."
+        return None
 
-    prompt = f"""Describe the following table in 2–4 clear sentences based ONLY on the visible data.
+    return f"""Describe the following table in 2–4 clear sentences based ONLY on the visible data.
 
         Table (tab-separated):
         {cleaned_preview}
@@ -132,19 +161,22 @@ def generate_table_only_description(table_data_preview: str) -> str:
         Do NOT guess, invent, or assume missing information. Be honest and concise.
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"[LLM ERROR] {str(e)}"
 
+def generate_table_only_description(table_data_preview: str) -> str:
+    prompt = build_table_only_prompt(table_data_preview)
+    if prompt is None:
+        return "No table data provided."
+
+    return cached_chat_completion(
+        "generate_table_only_description",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=1000
+    )
 
-def generate_table_with_context_description(
+
+def build_table_with_context_prompt(
         before_text,
         after_text
 ):
@@ -155,9 +187,9 @@ def generate_table_with_context_description(
     after_context = "\n".join(after_lines[:3])
 
     if not before_context and not after_context:
-        return "No surrounding text context available."
+        return None
 
-    prompt = f"""Describe the table below using the surrounding text for context. Use ONLY what is provided.
+    return f"""Describe the table below using the surrounding text for context. Use ONLY what is provided.
                 
                 TEXT BEFORE TABLE (up to 3 sentences):
                 {before_context or "None"}
@@ -178,13 +210,19 @@ def generate_table_with_context_description(
                 - NEVER guess, invent, or assume. Be precise and honest.
     """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"[LLM ERROR] {str(e)}"
+
+def generate_table_with_context_description(
+        before_text,
+        after_text
+):
+    prompt = build_table_with_context_prompt(before_text, after_text)
+    if prompt is None:
+        return "No surrounding text context available."
+
+    return cached_chat_completion(
+        "generate_table_with_context_description",
+        model="gpt-4o",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=1000
+    )
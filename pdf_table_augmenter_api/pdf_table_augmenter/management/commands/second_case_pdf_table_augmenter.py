@@ -1,131 +1,107 @@
-import os
-import tempfile
+import logging
 
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
+from pdf_table_augmenter.management.commands.converter_registry import TABLES_NO_OCR
+from pdf_table_augmenter.management.commands.description_stream import stream_descriptions, stream_descriptions_async
+from pdf_table_augmenter.management.commands.document_index import DocumentIndex
+from pdf_table_augmenter.management.commands.llm_executor import apply_description, describe_concurrently
+from pdf_table_augmenter.management.commands.reusable_functions_for_document import parse_pdf_document
 from pdf_table_augmenter.management.commands.reusable_functions_for_table import (
     get_cell_text,
     generate_table_with_context_description
 )
+from pdf_table_augmenter.metrics import record_items
 
+logger = logging.getLogger(__name__)
 
-def extract_table_with_context_descriptions_from_file(file_obj):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(file_obj.read())
-        tmp_path = tmp.name
 
-    try:
-        pipeline_options = PdfPipelineOptions(
-            do_ocr=False,
-            do_table_structure=True,
-            generate_picture_images=False,
-            do_picture_description=False
-        )
-        converter = DocumentConverter(format_options={
-            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-        })
+def prepare_table_with_context_descriptions(doc, index=None):
+    logger.debug("Document parsed: %s texts, %s tables", len(doc.get("texts", [])), len(doc.get("tables", [])))
+
+    index = index or DocumentIndex(doc)
+    tables = doc.get("tables", [])
+
+    valid_tables = []
+    for table in tables:
+        grid = table.get("data", {}).get("grid", [])
+        if grid and isinstance(grid, list) and len(grid) > 0 and any(len(row) > 0 for row in grid):
+            valid_tables.append(table)
+
+    for idx, table in enumerate(valid_tables):
+        table["index"] = idx
 
-        result = converter.convert(tmp_path)
-        doc = result.document.export_to_dict()
-        print(f"Document parsed: {len(doc.get('texts', []))} texts, {len(doc.get('tables', []))} tables")
-
-        texts = doc.get("texts", [])
-        body_children = doc.get("body", {}).get("children", [])
-        tables = doc.get("tables", [])
-
-        valid_tables = []
-        for table in tables:
-            grid = table.get("data", {}).get("grid", [])
-            if grid and isinstance(grid, list) and len(grid) > 0 and any(len(row) > 0 for row in grid):
-                valid_tables.append(table)
-
-        for idx, table in enumerate(valid_tables):
-            table["index"] = idx
-
-        outputs = []
-
-        for idx, table in enumerate(valid_tables):
-            table_ref = f"#/tables/{table['index']}"
-            table_index_in_body = next(
-                (i for i, child in enumerate(body_children) if child.get("$ref") == table_ref),
-                None
-            )
-            if table_index_in_body is None:
-                print(f"Table {idx + 1} not in body, skipping")
-                continue
-
-            chunks_before = []
-            for j in range(table_index_in_body - 1, max(table_index_in_body - 4, -1), -1):
-                child = body_children[j]
-                if child.get("$ref", "").startswith("#/texts/"):
-                    try:
-                        text_idx = int(child["$ref"].split("/")[-1])
-                        text = texts[text_idx]["text"].strip()
-                        if text:
-                            chunks_before.append(text)
-                            if len(chunks_before) >= 3:
-                                break
-                    except (IndexError, ValueError):
-                        continue
-            chunks_before = chunks_before[-3:]
-
-            chunks_after = []
-            for j in range(table_index_in_body + 1, min(table_index_in_body + 4, len(body_children))):
-                child = body_children[j]
-                if child.get("$ref", "").startswith("#/texts/"):
-                    try:
-                        text_idx = int(child["$ref"].split("/")[-1])
-                        text = texts[text_idx]["text"].strip()
-                        if text:
-                            chunks_after.append(text)
-                            if len(chunks_after) >= 3:
-                                break
-                    except (IndexError, ValueError):
-                        continue
-            chunks_after = chunks_after[:3]
-
-            if not chunks_before and not chunks_after:
-                try:
-                    df = table["data"].export_to_dataframe()
-                    preview_rows = df.head(3).to_string(index=False)
-                    chunks_before = [f"Table preview:\n{preview_rows}"]
-                except Exception:
-                    chunks_before = ["[No context or preview available]"]
-
-            prov = table.get("prov", [])
-            page_numbers = sorted(set(p.get("page_no", 1) for p in prov)) if prov else [1]
-            page_display = (
-                f"Pages {min(page_numbers)}-{max(page_numbers)}"
-                if len(page_numbers) > 1
-                else f"Page {page_numbers[0]}"
-            )
+    outputs = []
+    description_calls = []
 
+    for idx, table in enumerate(valid_tables):
+        table_ref = f"#/tables/{table['index']}"
+        table_index_in_body = index.body_position(table_ref)
+        if table_index_in_body is None:
+            logger.debug("Table %s not in body, skipping", idx + 1)
+            continue
+
+        chunks_before = index.preceding_texts(table_index_in_body)
+        chunks_after = index.following_texts(table_index_in_body)
+
+        if not chunks_before and not chunks_after:
             try:
-                grid = table["data"]["grid"]
-                preview_data = [[get_cell_text(cell) for cell in row] for row in grid]
+                df = table["data"].export_to_dataframe()
+                preview_rows = df.head(3).to_string(index=False)
+                chunks_before = [f"Table preview:\n{preview_rows}"]
             except Exception:
-                preview_data = []
+                chunks_before = ["[No context or preview available]"]
 
-            description = generate_table_with_context_description(
-                before_text="\n".join(chunks_before),
-                after_text="\n".join(chunks_after)
-            )
+        page_display = index.page_display(table)
 
-            outputs.append({
-                "page": page_display,
-                "table_index": idx + 1,
-                "description": description,
-                "preview_data": preview_data
-            })
+        try:
+            grid = table["data"]["grid"]
+            preview_data = [[get_cell_text(cell) for cell in row] for row in grid]
+        except Exception:
+            preview_data = []
 
-        print(f"Returning {len(outputs)} table descriptions (3 before + 3 after)")
+        description_calls.append({
+            "before_text": "\n".join(chunks_before),
+            "after_text": "\n".join(chunks_after)
+        })
+
+        outputs.append({
+            "page": page_display,
+            "table_index": idx + 1,
+            "description": None,
+            "preview_data": preview_data
+        })
+
+    record_items("second-case-tables", outputs)
+    return outputs, description_calls
+
+
+def extract_table_with_context_descriptions_from_file(file_obj, prescan=None):
+    try:
+        doc = parse_pdf_document(file_obj, TABLES_NO_OCR, prescan)
+        outputs, description_calls = prepare_table_with_context_descriptions(doc)
+
+        descriptions = describe_concurrently(generate_table_with_context_description, description_calls)
+        for output, description in zip(outputs, descriptions):
+            apply_description(output, description)
+
+        logger.info("Returning %s table descriptions (3 before + 3 after)", len(outputs))
         return outputs
 
     except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
+        logger.exception("Error processing PDF: %s", e)
         return [{"error": f"Failed to process PDF: {str(e)}"}]
 
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+
+def stream_table_with_context_descriptions_from_file(file_obj, prescan=None):
+    return stream_descriptions(
+        lambda: parse_pdf_document(file_obj, TABLES_NO_OCR, prescan),
+        prepare_table_with_context_descriptions,
+        generate_table_with_context_description
+    )
+
+
+def stream_table_with_context_descriptions_from_file_async(file_obj, prescan=None):
+    return stream_descriptions_async(
+        lambda: parse_pdf_document(file_obj, TABLES_NO_OCR, prescan),
+        prepare_table_with_context_descriptions,
+        generate_table_with_context_description
+    )
@@ -0,0 +1,168 @@
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.llm_batching import estimate_tokens
+from pdf_table_augmenter.management.commands.reusable_functions_for_table import get_cell_text
+
+NULL_MARKERS = ("", "-", "–", "—", "n/a", "na", "none", "null", "nan")
+NUMERIC_NOISE = r"[,\s%$€£]"
+
+
+def header_row_count(grid):
+    count = 0
+    for row in grid:
+        if row and any(isinstance(cell, dict) and cell.get("column_header") for cell in row):
+            count += 1
+        else:
+            break
+    return max(count, 1) if len(grid) > 1 else 0
+
+
+def _column_names(header_rows, width):
+    names = []
+    for position in range(width):
+        parts = [row[position] for row in header_rows if position < len(row) and row[position]]
+        name = " / ".join(dict.fromkeys(parts)) or f"column {position + 1}"
+        names.append(name)
+    return names
+
+
+def column_statistics(body_rows, names):
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.DataFrame(body_rows, columns=range(len(names))).fillna("")
+    stripped = frame.apply(lambda column: column.str.strip())
+    nulls = stripped.apply(lambda column: column.str.lower().isin(NULL_MARKERS))
+    numeric = stripped.replace(NUMERIC_NOISE, "", regex=True).apply(pd.to_numeric, errors="coerce")
+
+    present = (~nulls).sum()
+    numeric_share = numeric.notna().sum() / present.replace(0, np.nan)
+    null_ratio = nulls.mean()
+    distinct = stripped.where(~nulls).nunique()
+    minimum, maximum, mean = numeric.min(), numeric.max(), numeric.mean()
+
+    statistics = []
+    for position, name in enumerate(names):
+        entry = {
+            "column": name,
+            "dtype": "numeric" if numeric_share[position] >= settings.TABLE_NUMERIC_COLUMN_SHARE else "text",
+            "null_ratio": round(float(null_ratio[position]), 3),
+            "distinct": int(distinct[position]),
+        }
+        if entry["dtype"] == "numeric":
+            entry.update({
+                "min": float(minimum[position]),
+                "max": float(maximum[position]),
+                "mean": round(float(mean[position]), 4),
+            })
+        statistics.append(entry)
+    return statistics
+
+
+def sample_positions(row_count, sample_size):
+    import numpy as np
+
+    if sample_size >= row_count:
+        return list(range(row_count))
+    if sample_size <= 0:
+        return []
+
+    edge = max(1, sample_size // 3)
+    head = range(min(edge, sample_size))
+    tail = range(max(row_count - edge, 0), row_count) if sample_size > edge else range(0)
+    middle_size = sample_size - len(head) - len(tail)
+    middle = np.linspace(len(head), row_count - len(tail) - 1, num=middle_size + 2)[1:-1] if middle_size > 0 else []
+    return sorted(set(head) | set(tail) | {int(round(position)) for position in middle})
+
+
+def _format_statistics(statistics, row_count):
+    lines = [f"Column statistics (computed over all {row_count} rows):"]
+    for entry in statistics:
+        line = f"- {entry['column']}: {entry['dtype']}, nulls {entry['null_ratio']:.0%}, {entry['distinct']} distinct"
+        if entry["dtype"] == "numeric":
+            line += f", min {entry['min']:g}, max {entry['max']:g}, mean {entry['mean']:g}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _format_rows(header_rows, body_rows, positions):
+    lines = ["\t".join(row) for row in header_rows]
+    previous = -1
+    for position in positions:
+        if position - previous > 1:
+            lines.append(f"[... {position - previous - 1} rows omitted ...]")
+        lines.append("\t".join(body_rows[position]))
+        previous = position
+    if body_rows and len(body_rows) - 1 - previous > 0:
+        lines.append(f"[... {len(body_rows) - 1 - previous} rows omitted ...]")
+    return "\n".join(lines)
+
+
+def compact_table_preview(grid, token_budget=None):
+    token_budget = token_budget or settings.TABLE_PROMPT_TOKEN_BUDGET
+    rows = [[get_cell_text(cell) for cell in row] for row in grid]
+    full_preview = "\n".join("\t".join(row) for row in rows)
+    if estimate_tokens(full_preview) <= token_budget:
+        return full_preview, None
+
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    header_count = header_row_count(grid)
+    header_rows, body_rows = rows[:header_count], rows[header_count:]
+
+    statistics = column_statistics(body_rows, _column_names(header_rows, width))
+    statistics_text = _format_statistics(statistics, len(body_rows))
+
+    # Largest row sample that still fits next to the headers and statistics.
+    low, high = 0, len(body_rows)
+    while low < high:
+        middle = (low + high + 1) // 2
+        candidate = _format_rows(header_rows, body_rows, sample_positions(len(body_rows), middle))
+        if estimate_tokens(candidate + "\n\n" + statistics_text) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+
+    positions = sample_positions(len(body_rows), low)
+    preview = _format_rows(header_rows, body_rows, positions) + "\n\n" + statistics_text
+    truncation = {
+        "total_rows": len(body_rows),
+        "rows_in_prompt": len(positions),
+        "columns": width,
+        "estimated_tokens": estimate_tokens(full_preview),
+        "prompt_tokens": estimate_tokens(preview),
+        "token_budget": token_budget,
+    }
+    return preview, truncation
+
+
+def split_table_chunks(grid, chunk_tokens=None):
+    rows = [[get_cell_text(cell) for cell in row] for row in grid]
+    header_count = header_row_count(grid)
+    header_text = "\n".join("\t".join(row) for row in rows[:header_count])
+    body_lines = ["\t".join(row) for row in rows[header_count:]]
+
+    # Very large tables get bigger chunks rather than an unbounded number of calls. Every chunk but
+    # the last is filled to within one row of chunk_tokens, so the longest row is added on top of
+    # the even share to keep the count at TABLE_MAP_REDUCE_MAX_CHUNKS.
+    line_tokens = [estimate_tokens(line) for line in body_lines]
+    chunk_tokens = max(chunk_tokens or settings.TABLE_MAP_REDUCE_CHUNK_TOKENS,
+                       sum(line_tokens) // settings.TABLE_MAP_REDUCE_MAX_CHUNKS + max(line_tokens, default=0) + 1)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    first_row = 1
+    for number, (line, tokens) in enumerate(zip(body_lines, line_tokens), start=1):
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append({"first_row": first_row, "last_row": number - 1,
+                           "text": "\n".join([header_text] + current if header_text else current)})
+            current = []
+            current_tokens = 0
+            first_row = number
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append({"first_row": first_row, "last_row": len(body_lines),
+                       "text": "\n".join([header_text] + current if header_text else current)})
+    return chunks
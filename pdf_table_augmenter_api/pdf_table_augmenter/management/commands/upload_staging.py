@@ -0,0 +1,86 @@
+import hashlib
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from pdf_table_augmenter.management.commands.converter_registry import document_stream
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(file_obj):
+    if hasattr(file_obj, "chunks"):
+        yield from file_obj.chunks(CHUNK_SIZE)
+        return
+
+    file_obj.seek(0)
+    while True:
+        chunk = file_obj.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def upload_size(file_obj):
+    size = getattr(file_obj, "size", None)
+    if size is None:
+        size = os.fstat(file_obj.fileno()).st_size
+    return size
+
+
+def local_file_path(file_obj):
+    if hasattr(file_obj, "temporary_file_path"):
+        return file_obj.temporary_file_path()
+    if isinstance(file_obj, (io.BufferedReader, io.FileIO)) and os.path.isfile(file_obj.name):
+        return file_obj.name
+    return None
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def spooled_file(chunks):
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=settings.FILE_UPLOAD_TEMP_DIR) as tmp:
+        for chunk in chunks:
+            digest.update(chunk)
+            tmp.write(chunk)
+    try:
+        yield tmp.name, digest.hexdigest()
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+
+
+@contextmanager
+def staged_upload(file_obj):
+    # Yields (sha256, source) where source is a path docling can open in place
+    # or, for small uploads, an in-memory DocumentStream. Large uploads are
+    # never read into memory as a whole.
+    path = local_file_path(file_obj)
+    if path is not None:
+        yield file_digest(path), path
+        return
+
+    if upload_size(file_obj) <= settings.DOCUMENT_STREAM_MAX_BYTES:
+        buffer = io.BytesIO()
+        digest = hashlib.sha256()
+        for chunk in iter_chunks(file_obj):
+            digest.update(chunk)
+            buffer.write(chunk)
+        buffer.seek(0)
+        name = os.path.basename(getattr(file_obj, "name", None) or "document.pdf")
+        yield digest.hexdigest(), document_stream(name, buffer)
+        return
+
+    with spooled_file(iter_chunks(file_obj)) as (path, digest):
+        yield digest, path
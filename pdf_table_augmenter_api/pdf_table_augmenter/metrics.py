@@ -0,0 +1,171 @@
+# pdf_table_augmenter/metrics.py
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+_stages_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, constant_labels):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labels, key)) + constant_labels, value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self, constant_labels):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labels, key)) + constant_labels, round(value, 6)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def samples(self, constant_labels):
+        with self._lock:
+            values = sorted((key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items())
+        for key, (counts, total, observations) in values:
+            labels = list(zip(self.labels, key)) + constant_labels
+            for bound, count in zip(self.buckets, counts):
+                yield self.name + "_bucket", labels + [("le", str(float(bound)))], count
+            yield self.name + "_bucket", labels + [("le", "+Inf")], observations
+            yield self.name + "_sum", labels, round(total, 6)
+            yield self.name + "_count", labels, observations
+
+
+REQUEST_SECONDS = Histogram(
+    "augmenter_request_seconds", "HTTP request latency by endpoint.", ("endpoint", "method", "status")
+)
+STAGE_SECONDS = Histogram(
+    "augmenter_stage_seconds",
+    "Time spent in one processing stage (convert, index, reference_scan, llm, serialize).",
+    ("stage",),
+)
+LLM_CALL_SECONDS = Histogram(
+    "augmenter_llm_call_seconds", "Latency of single LLM API attempts.", ("generator", "model", "outcome")
+)
+LLM_TOKENS = Counter(
+    "augmenter_llm_tokens_total", "Tokens reported by the LLM API.", ("generator", "model", "kind")
+)
+DOCUMENT_ITEMS = Histogram(
+    "augmenter_document_items", "Items found per parsed document.", ("kind",), buckets=COUNT_BUCKETS
+)
+CONVERTER_LOAD_SECONDS = Gauge(
+    "augmenter_converter_load_seconds", "Time it took to build the docling converter of a profile.", ("profile",)
+)
+CONVERTER_HITS = Counter(
+    "augmenter_converter_hits_total", "Lookups served by an already loaded converter.", ("profile",)
+)
+CONVERTER_CONVERSIONS = Counter(
+    "augmenter_converter_conversions_total", "Documents (or page ranges) converted.", ("profile",)
+)
+CACHE_EVENTS = Counter(
+    "augmenter_cache_events_total",
+    "Document and LLM response cache lookups; LLM lookups are labelled with their generator.",
+    ("cache", "generator", "outcome"),
+)
+
+
+def render_metrics():
+    # Every worker process keeps its own registry; the worker label keeps the
+    # series of different workers apart when they are scraped through one port.
+    constant_labels = [("worker", str(os.getpid()))]
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples(constant_labels):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def start_request_stages():
+    stages = {}
+    _request_stages.set(stages)
+    return stages
+
+
+def record_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        with _stages_lock:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_items(kind, outputs):
+    DOCUMENT_ITEMS.observe(len(outputs), kind=kind)
@@ -0,0 +1,75 @@
+# pdf_table_augmenter/middleware.py
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from pdf_table_augmenter.log_context import REQUEST_ID_HEADER, new_request_id, set_request_id
+from pdf_table_augmenter.metrics import REQUEST_SECONDS, start_request_stages
+
+logger = logging.getLogger(__name__)
+
+
+class RequestObservabilityMiddleware:
+    # Tags everything logged while serving a request with its request id and
+    # records the request latency. The context is deliberately not reset on
+    # return: streamed bodies are produced after the middleware has returned,
+    # and their log lines and stage timings still belong to this request.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        request.request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+        set_request_id(request.request_id)
+        return time.perf_counter(), start_request_stages()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, stages = self.start(request)
+        return self.finish(request, self.get_response(request), started, stages)
+
+    async def __acall__(self, request):
+        started, stages = self.start(request)
+        return self.finish(request, await self.get_response(request), started, stages)
+
+    def finish(self, request, response, started, stages):
+        response[REQUEST_ID_HEADER] = request.request_id
+        if not response.streaming:
+            self.record(request, response, started, stages)
+            return response
+
+        content = response.streaming_content
+        if response.is_async:
+            async def recorded():
+                try:
+                    async for chunk in content:
+                        yield chunk
+                finally:
+                    self.record(request, response, started, stages)
+        else:
+            def recorded():
+                try:
+                    yield from content
+                finally:
+                    self.record(request, response, started, stages)
+        response.streaming_content = recorded()
+        return response
+
+    def record(self, request, response, started, stages):
+        duration = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        endpoint = match.url_name if match and match.url_name else "unmatched"
+        REQUEST_SECONDS.observe(duration, endpoint=endpoint, method=request.method, status=response.status_code)
+        logger.info("%s %s %s", request.method, request.path, response.status_code, extra={
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "duration_seconds": round(duration, 3),
+            "stage_seconds": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            "streaming": response.streaming,
+        })
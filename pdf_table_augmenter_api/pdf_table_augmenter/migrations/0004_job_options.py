@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdf_table_augmenter', '0003_job_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
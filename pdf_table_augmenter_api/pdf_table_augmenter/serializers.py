@@ -1 +1,24 @@
 # pdf_table_augmenter/serializers.py
+from rest_framework import serializers
+
+from pdf_table_augmenter.models import DocumentSession, ExtractionJob, SessionMessage
+
+
+class ExtractionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExtractionJob
+        fields = ["id", "kind", "status", "file_name", "options", "error", "created_at", "started_at", "finished_at"]
+
+
+class SessionMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SessionMessage
+        fields = ["role", "content", "created_at"]
+
+
+class DocumentSessionSerializer(serializers.ModelSerializer):
+    messages = SessionMessageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = DocumentSession
+        fields = ["id", "kind", "file_name", "results", "messages", "created_at", "updated_at"]
@@ -0,0 +1,25 @@
+# pdf_table_augmenter/startup.py
+import importlib
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Imported on first use by the request path. A preloading server imports them
+# (and builds the docling converters) once in the master process instead, so
+# forked workers share the loaded pages copy-on-write.
+HEAVY_MODULES = ("numpy", "pandas", "scipy.sparse", "pdfplumber", "openai", "httpx")
+
+
+def warm_up():
+    started = time.perf_counter()
+    if settings.WARMUP_IMPORTS:
+        for name in HEAVY_MODULES:
+            importlib.import_module(name)
+    if settings.DOCLING_WARMUP:
+        from pdf_table_augmenter.management.commands.converter_registry import warm_up_converters
+
+        warm_up_converters(settings.DOCLING_WARMUP_PROFILES)
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - started)
@@ -0,0 +1,78 @@
+# pdf_table_augmenter/streaming.py
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from pdf_table_augmenter.management.commands.llm_cache import bypass_llm_cache
+from pdf_table_augmenter.metrics import timed
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = NDJSON_MEDIA_TYPE
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode("utf-8") + b"\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = SSE_MEDIA_TYPE
+    format = "sse"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def requested_stream_format(request):
+    stream = request.GET.get("stream", "").lower()
+    if stream in ("ndjson", "sse"):
+        return stream
+
+    accept = request.META.get("HTTP_ACCEPT", "")
+    if SSE_MEDIA_TYPE in accept:
+        return "sse"
+    if NDJSON_MEDIA_TYPE in accept:
+        return "ndjson"
+    return None
+
+
+def _encode_event(event, stream_format):
+    if stream_format == "sse":
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+
+def _encode_events(events, stream_format, bypass_cache):
+    # The body is produced after the view has returned, so the cache bypass
+    # flag has to be re-applied around the iteration itself.
+    with bypass_llm_cache(bypass_cache):
+        for event in events:
+            yield _encode_event(event, stream_format)
+
+
+async def _encode_events_async(events, stream_format, bypass_cache):
+    with bypass_llm_cache(bypass_cache):
+        async for event in events:
+            yield _encode_event(event, stream_format)
+
+
+def streaming_response(events, stream_format, bypass_cache=False):
+    if hasattr(events, "__aiter__"):
+        content = _encode_events_async(events, stream_format, bypass_cache)
+    else:
+        content = _encode_events(events, stream_format, bypass_cache)
+    content_type = SSE_MEDIA_TYPE if stream_format == "sse" else NDJSON_MEDIA_TYPE
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,277 @@
+# pdf_table_augmenter/tests.py
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from pdf_table_augmenter.management.commands import augment_corpus
+from pdf_table_augmenter.management.commands.document_sharding import merge_shard_documents
+from pdf_table_augmenter.management.commands.llm_batching import estimate_tokens, parse_batch_response, \
+    plan_batches
+from pdf_table_augmenter.management.commands.llm_executor import describe_concurrently
+from pdf_table_augmenter.management.commands.reusable_functions_for_table import generate_table_only_description
+from pdf_table_augmenter.management.commands.table_compaction import compact_table_preview, sample_positions, \
+    split_table_chunks
+
+
+def shard(page, texts, tables=0):
+    # A docling export of one page range: body children point at its own texts and tables.
+    return {
+        "schema_name": "DoclingDocument",
+        "name": f"shard-{page}",
+        "body": {"self_ref": "#/body", "children": (
+            [{"$ref": f"#/texts/{i}"} for i in range(texts)] + [{"$ref": f"#/tables/{i}"} for i in range(tables)]
+        )},
+        "furniture": {"self_ref": "#/furniture", "children": []},
+        "texts": [
+            {"self_ref": f"#/texts/{i}", "parent": {"$ref": "#/body"}, "text": f"page {page} text {i}",
+             "prov": [{"page_no": page}]}
+            for i in range(texts)
+        ],
+        "tables": [
+            {"self_ref": f"#/tables/{i}", "parent": {"$ref": "#/body"}, "captions": [{"$ref": f"#/texts/{i}"}],
+             "prov": [{"page_no": page}]}
+            for i in range(tables)
+        ],
+        "pictures": [],
+        "groups": [],
+        "pages": {str(page): {"page_no": page}},
+    }
+
+
+class MergeShardDocumentsTests(SimpleTestCase):
+
+    def test_single_shard_is_returned_unchanged(self):
+        doc = shard(1, texts=2)
+        self.assertIs(merge_shard_documents([doc]), doc)
+
+    def test_refs_are_renumbered_across_shards(self):
+        merged = merge_shard_documents([shard(1, texts=2, tables=1), shard(2, texts=3, tables=2)])
+
+        self.assertEqual([text["self_ref"] for text in merged["texts"]], [f"#/texts/{i}" for i in range(5)])
+        self.assertEqual([table["self_ref"] for table in merged["tables"]], [f"#/tables/{i}" for i in range(3)])
+        self.assertEqual([child["$ref"] for child in merged["body"]["children"]], [
+            "#/texts/0", "#/texts/1", "#/tables/0",
+            "#/texts/2", "#/texts/3", "#/texts/4", "#/tables/1", "#/tables/2",
+        ])
+        # Refs nested inside items move with their collection; refs to the tree roots stay put.
+        self.assertEqual(merged["tables"][2]["captions"], [{"$ref": "#/texts/3"}])
+        self.assertEqual(merged["texts"][4]["parent"], {"$ref": "#/body"})
+        self.assertEqual(merged["texts"][4]["text"], "page 2 text 2")
+
+    def test_every_body_ref_resolves_to_an_item(self):
+        merged = merge_shard_documents([shard(page, texts=page, tables=page % 2) for page in range(1, 5)])
+        for child in merged["body"]["children"]:
+            _, collection, position = child["$ref"].split("/")
+            self.assertEqual(merged[collection][int(position)]["self_ref"], child["$ref"])
+
+    def test_pages_and_document_fields_are_merged(self):
+        merged = merge_shard_documents([shard(1, texts=1), shard(2, texts=1), shard(3, texts=0)])
+        self.assertEqual(sorted(merged["pages"]), ["1", "2", "3"])
+        self.assertEqual(merged["name"], "shard-1")
+        self.assertEqual(merged["body"]["self_ref"], "#/body")
+        self.assertEqual(merged["furniture"]["children"], [])
+
+
+@override_settings(LLM_BATCH_ENABLED=True, LLM_BATCH_MAX_ITEMS=3, LLM_BATCH_MAX_PROMPT_TOKENS=6000,
+                   LLM_BATCH_MAX_ITEM_TOKENS=1500)
+class BatchingTests(SimpleTestCase):
+
+    def table_calls(self, *previews):
+        return [{"table_data_preview": preview} for preview in previews]
+
+    def test_plan_batches_splits_on_item_count(self):
+        individual, batches = plan_batches(generate_table_only_description,
+                                           self.table_calls(*[f"a\tb\n{i}\t{i}" for i in range(7)]))
+        self.assertEqual([[position for position, _ in batch] for batch in batches], [[0, 1, 2], [3, 4, 5]])
+        # The leftover single item is not worth a batch.
+        self.assertEqual(individual, [6])
+
+    def test_plan_batches_leaves_empty_and_oversized_items_individual(self):
+        oversized = "\t".join(["x" * 50] * 200)
+        self.assertGreater(estimate_tokens(oversized), 1500)
+        individual, batches = plan_batches(generate_table_only_description,
+                                           self.table_calls("a\tb", "", oversized, "c\td", "e\tf"))
+        self.assertEqual(individual, [1, 2])
+        self.assertEqual([[position for position, _ in batch] for batch in batches], [[0, 3, 4]])
+
+    @override_settings(LLM_BATCH_MAX_PROMPT_TOKENS=700)
+    def test_plan_batches_respects_prompt_budget(self):
+        _, batches = plan_batches(generate_table_only_description,
+                                  self.table_calls(*["\t".join(["y" * 40] * 10)] * 6))
+        self.assertGreater(len(batches), 1)
+        for batch in batches:
+            self.assertLessEqual(sum(estimate_tokens(prompt) for _, prompt in batch), 700)
+
+    def test_parse_batch_response_drops_missing_and_invalid_items(self):
+        content = json.dumps({"descriptions": [
+            {"id": "item-1", "description": " first "},
+            {"id": "item-2", "description": ""},
+            {"id": "item-3", "description": None},
+            {"id": "item-9", "description": "unknown id"},
+            "not an object",
+        ]})
+        self.assertEqual(parse_batch_response(content, {"item-1", "item-2", "item-3", "item-4"}),
+                         {"item-1": "first"})
+
+    def test_parse_batch_response_tolerates_malformed_json(self):
+        item_ids = {"item-1"}
+        self.assertEqual(parse_batch_response("not json", item_ids), {})
+        self.assertEqual(parse_batch_response("[1, 2]", item_ids), {})
+        self.assertEqual(parse_batch_response('{"descriptions": "text"}', item_ids), {})
+
+    def test_items_missing_from_a_batch_are_described_individually(self):
+        def batch_completion(generator, **request):
+            # Answers only the first item and garbles the second.
+            return json.dumps({"descriptions": [{"id": "item-1", "description": "batched"},
+                                                 {"id": "item-2", "description": 42}]})
+
+        def single_completion(generator, model, messages, **params):
+            return "single: " + messages[0]["content"].split("\n")[3].strip()
+
+        with mock.patch("pdf_table_augmenter.management.commands.llm_batching.cached_chat_completion",
+                        side_effect=batch_completion) as batched, \
+                mock.patch("pdf_table_augmenter.management.commands.reusable_functions_for_table."
+                           "cached_chat_completion", side_effect=single_completion) as single:
+            results = describe_concurrently(generate_table_only_description,
+                                            self.table_calls("a\tb", "c\td", "e\tf"))
+
+        self.assertEqual(results, ["batched", "single: c\td", "single: e\tf"])
+        self.assertEqual(batched.call_count, 1)
+        self.assertEqual(single.call_count, 2)
+
+    def test_failed_batch_falls_back_to_single_calls(self):
+        with mock.patch("pdf_table_augmenter.management.commands.llm_batching.cached_chat_completion",
+                        side_effect=RuntimeError("provider down")), \
+                mock.patch("pdf_table_augmenter.management.commands.reusable_functions_for_table."
+                           "cached_chat_completion", return_value="single"):
+            results = describe_concurrently(generate_table_only_description, self.table_calls("a\tb", "c\td"))
+        self.assertEqual(results, ["single", "single"])
+
+
+def table_grid(rows, columns=4):
+    header = [{"text": f"Column {c}", "column_header": True} for c in range(columns)]
+    body = [[{"text": f"{r * columns + c}" if c else f"row {r}"} for c in range(columns)] for r in range(rows)]
+    return [header] + body
+
+
+class TableCompactionTests(SimpleTestCase):
+
+    def test_small_table_is_not_compacted(self):
+        preview, truncation = compact_table_preview(table_grid(5), token_budget=1000)
+        self.assertIsNone(truncation)
+        self.assertEqual(len(preview.splitlines()), 6)
+
+    def test_compacted_preview_fits_the_budget(self):
+        for rows, budget in ((200, 400), (1000, 800), (5000, 2500)):
+            preview, truncation = compact_table_preview(table_grid(rows), token_budget=budget)
+            self.assertEqual(truncation["total_rows"], rows)
+            self.assertEqual(truncation["token_budget"], budget)
+            self.assertEqual(truncation["prompt_tokens"], estimate_tokens(preview))
+            self.assertLessEqual(truncation["prompt_tokens"], budget)
+            self.assertGreater(truncation["estimated_tokens"], budget)
+            self.assertTrue(0 < truncation["rows_in_prompt"] < rows)
+            self.assertIn(f"computed over all {rows} rows", preview)
+
+    def test_compacted_preview_keeps_header_first_and_last_rows(self):
+        preview, truncation = compact_table_preview(table_grid(500), token_budget=600)
+        lines = preview.splitlines()
+        self.assertTrue(lines[0].startswith("Column 0"))
+        self.assertTrue(lines[1].startswith("row 0\t"))
+        self.assertIn("row 499\t", preview)
+        sampled = [line for line in lines if line.startswith("row ")]
+        self.assertEqual(len(sampled), truncation["rows_in_prompt"])
+
+    def test_sample_is_the_largest_that_fits(self):
+        budget = 700
+        _, truncation = compact_table_preview(table_grid(800), token_budget=budget)
+        _, bigger = compact_table_preview(table_grid(800), token_budget=budget + 40)
+        self.assertGreaterEqual(bigger["rows_in_prompt"], truncation["rows_in_prompt"])
+
+    def test_sample_positions(self):
+        self.assertEqual(sample_positions(5, 10), [0, 1, 2, 3, 4])
+        self.assertEqual(sample_positions(100, 0), [])
+        for size in (1, 2, 3, 7, 30):
+            positions = sample_positions(100, size)
+            self.assertEqual(len(positions), size)
+            self.assertEqual(positions, sorted(set(positions)))
+            self.assertEqual(positions[0], 0)
+            if size > 1:
+                self.assertEqual(positions[-1], 99)
+
+    @override_settings(TABLE_MAP_REDUCE_MAX_CHUNKS=24)
+    def test_chunks_cover_every_row_once_with_headers(self):
+        chunks = split_table_chunks(table_grid(300), chunk_tokens=200)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0]["first_row"], 1)
+        self.assertEqual(chunks[-1]["last_row"], 300)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(chunk["first_row"], previous["last_row"] + 1)
+        for chunk in chunks:
+            lines = chunk["text"].splitlines()
+            self.assertTrue(lines[0].startswith("Column 0"))
+            self.assertEqual(len(lines) - 1, chunk["last_row"] - chunk["first_row"] + 1)
+            self.assertEqual(lines[1], f"row {chunk['first_row'] - 1}\t" + "\t".join(
+                str((chunk["first_row"] - 1) * 4 + c) for c in range(1, 4)))
+            self.assertLessEqual(sum(estimate_tokens(line) for line in lines[1:]), 200)
+
+    @override_settings(TABLE_MAP_REDUCE_MAX_CHUNKS=5)
+    def test_chunk_count_is_capped(self):
+        for rows in (37, 500, 2000, 2001):
+            chunks = split_table_chunks(table_grid(rows), chunk_tokens=100)
+            self.assertLessEqual(len(chunks), 5)
+            self.assertEqual(chunks[-1]["last_row"], rows)
+
+
+def stub_extractor(fh):
+    # Runs in a spawned worker, so it has to be importable by name.
+    return [{"table_id": 1, "description": f"{len(fh.read())} bytes"}]
+
+
+class AugmentCorpusTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        os.makedirs(os.path.join(self.directory.name, "in"))
+        for name in ("a.pdf", "b.pdf"):
+            with open(os.path.join(self.directory.name, "in", name), "wb") as fh:
+                fh.write(b"%PDF-1.4 " + name.encode())
+        self.output = os.path.join(self.directory.name, "out.jsonl")
+
+    def run_command(self, *args):
+        with mock.patch.dict(augment_corpus.EXTRACTORS, {"tables": stub_extractor}), \
+                mock.patch.dict(os.environ, {"DOCLING_WARMUP": "False"}):
+            call_command("augment_corpus", os.path.join(self.directory.name, "in"), self.output, "--workers", "1",
+                         *args, stdout=StringIO(), stderr=StringIO())
+        with open(self.output) as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_files_are_processed_in_worker_processes(self):
+        records = self.run_command()
+        self.assertEqual(sorted(record["id"] for record in records), ["a.pdf", "b.pdf"])
+        for record in records:
+            self.assertEqual(record["status"], "succeeded")
+            self.assertEqual(record["items"], 1)
+            self.assertEqual(record["result"], [{"table_id": 1, "description": "14 bytes"}])
+
+        # A second run resumes from the checkpoint and has nothing left to do.
+        self.assertEqual(len(self.run_command()), 2)
+
+    def test_retried_files_keep_one_record(self):
+        with open(self.output, "w") as fh:
+            for name in ("a.pdf", "b.pdf"):
+                key = augment_corpus.file_key(os.path.join(self.directory.name, "in", name))
+                fh.write(json.dumps({"key": key, "status": "failed"}) + "\n")
+            fh.write('{"key": "torn')
+        with open(self.output + ".checkpoint", "w") as fh:
+            key = augment_corpus.file_key(os.path.join(self.directory.name, "in", "a.pdf"))
+            fh.write(json.dumps({"key": key, "status": "failed"}) + "\n")
+
+        records = self.run_command("--retry-failed")
+        self.assertEqual(sorted(record["id"] for record in records), ["a.pdf", "b.pdf"])
+        self.assertEqual({record["status"] for record in records}, {"succeeded"})
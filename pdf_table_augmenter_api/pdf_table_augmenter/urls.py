@@ -1,17 +1,53 @@
+from django.conf import settings
 from django.urls import path
 
+from pdf_table_augmenter.async_views import AsyncAskQuestionView, AsyncExtractAllDescriptionsView, \
+    AsyncExtractContextDescriptionForTablesView, AsyncExtractDescriptionForFormulasView, \
+    AsyncExtractDescriptionForImagesView, AsyncExtractDescriptionView, \
+    AsyncExtractTableDataOnlyDescriptionForTablesView
 from pdf_table_augmenter.views import ExtractDescriptionAPIView, AskQuestionAPIView, ExtractDescriptionForImagesAPIView, \
     ExtractDescriptionForFormulasAPIView, \
-    ExtractTableDataOnlyDescriptionForTablesAPIView, ExtractContextDescriptionForTablesAPIView
+    ExtractTableDataOnlyDescriptionForTablesAPIView, ExtractContextDescriptionForTablesAPIView, \
+    SubmitExtractionJobAPIView, ExtractionJobStatusAPIView, ExtractionJobResultAPIView, ExtractAllDescriptionsAPIView, \
+    SubmitAllDescriptionsJobAPIView, DocumentSessionListAPIView, DocumentSessionAPIView
+
+
+def request_view(sync_view, async_view):
+    # ASYNC_VIEWS_ENABLED=False keeps the thread-per-request DRF views, e.g. under a WSGI server.
+    return async_view.as_view() if settings.ASYNC_VIEWS_ENABLED else sync_view.as_view()
+
 
 urlpatterns = [
-    path("extract-description/tables", ExtractDescriptionAPIView.as_view(), name="extract_description_tables"),
-    path("extract-description/images", ExtractDescriptionForImagesAPIView.as_view(), name="extract_description_images"),
-    path("extract-description/formulas", ExtractDescriptionForFormulasAPIView.as_view(),
+    path("extract-description/tables", request_view(ExtractDescriptionAPIView, AsyncExtractDescriptionView),
+         name="extract_description_tables"),
+    path("extract-description/images",
+         request_view(ExtractDescriptionForImagesAPIView, AsyncExtractDescriptionForImagesView),
+         name="extract_description_images"),
+    path("extract-description/formulas",
+         request_view(ExtractDescriptionForFormulasAPIView, AsyncExtractDescriptionForFormulasView),
          name="extract_description_equations"),
-    path("ask-question", AskQuestionAPIView.as_view(), name="ask-question"),
-    path("extract-description/first-case/tables", ExtractTableDataOnlyDescriptionForTablesAPIView.as_view(),
+    path("ask-question", request_view(AskQuestionAPIView, AsyncAskQuestionView), name="ask-question"),
+    path("extract-description/first-case/tables",
+         request_view(ExtractTableDataOnlyDescriptionForTablesAPIView, AsyncExtractTableDataOnlyDescriptionForTablesView),
          name="table_data_only"),
-    path("extract-description/second-case/tables", ExtractContextDescriptionForTablesAPIView.as_view(),
+    path("extract-description/second-case/tables",
+         request_view(ExtractContextDescriptionForTablesAPIView, AsyncExtractContextDescriptionForTablesView),
          name="table_context"),
+    path("extract-description/all", request_view(ExtractAllDescriptionsAPIView, AsyncExtractAllDescriptionsView),
+         name="extract_description_all"),
+    path("extract-description/tables/jobs", SubmitExtractionJobAPIView.as_view(kind="tables"),
+         name="extract_description_tables_job"),
+    path("extract-description/images/jobs", SubmitExtractionJobAPIView.as_view(kind="images"),
+         name="extract_description_images_job"),
+    path("extract-description/formulas/jobs", SubmitExtractionJobAPIView.as_view(kind="formulas"),
+         name="extract_description_equations_job"),
+    path("extract-description/first-case/tables/jobs", SubmitExtractionJobAPIView.as_view(kind="first-case-tables"),
+         name="table_data_only_job"),
+    path("extract-description/second-case/tables/jobs",
+         SubmitExtractionJobAPIView.as_view(kind="second-case-tables"), name="table_context_job"),
+    path("extract-description/all/jobs", SubmitAllDescriptionsJobAPIView.as_view(), name="extract_description_all_job"),
+    path("jobs/<uuid:job_id>", ExtractionJobStatusAPIView.as_view(), name="extraction_job_status"),
+    path("jobs/<uuid:job_id>/result", ExtractionJobResultAPIView.as_view(), name="extraction_job_result"),
+    path("sessions", DocumentSessionListAPIView.as_view(), name="document_sessions"),
+    path("sessions/<uuid:session_id>", DocumentSessionAPIView.as_view(), name="document_session"),
 ]
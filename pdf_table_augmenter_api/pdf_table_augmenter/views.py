@@ -1,90 +1,349 @@
 # pdf_table_augmenter/views.py
+import uuid
 
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.settings import api_settings
 
 from pdf_table_augmenter.management.commands.chatbot import answer_question
+from pdf_table_augmenter.management.commands.combined_pdf_augmenter import SECTIONS, TABLE_MODES, \
+    extract_all_descriptions_from_file, stream_all_descriptions_from_file
+from pdf_table_augmenter.management.commands.document_sessions import ask_session, create_session, is_error_result
 from pdf_table_augmenter.management.commands.first_case_pdf_table_augmenter import \
-    extract_table_data_only_descriptions_from_file
-from pdf_table_augmenter.management.commands.pdf_formula_augmenter import extract_formula_descriptions_from_file
-from pdf_table_augmenter.management.commands.pdf_image_augmenter import extract_image_descriptions_from_file
-from pdf_table_augmenter.management.commands.pdf_table_augmenter import extract_table_descriptions_from_file
+    extract_table_data_only_descriptions_from_file, stream_table_data_only_descriptions_from_file
+from pdf_table_augmenter.management.commands.job_runner import check_webhook_url, submit_job
+from pdf_table_augmenter.management.commands.llm_cache import bypass_llm_cache
+from pdf_table_augmenter.management.commands.llm_gateway import LLMError
+from pdf_table_augmenter.management.commands.page_prescan import TABLES, PICTURES, FORMULAS
+from pdf_table_augmenter.management.commands.pdf_formula_augmenter import extract_formula_descriptions_from_file, \
+    stream_formula_descriptions_from_file
+from pdf_table_augmenter.management.commands.pdf_image_augmenter import extract_image_descriptions_from_file, \
+    stream_image_descriptions_from_file
+from pdf_table_augmenter.management.commands.pdf_table_augmenter import extract_table_descriptions_from_file, \
+    stream_table_descriptions_from_file
 from pdf_table_augmenter.management.commands.second_case_pdf_table_augmenter import \
-    extract_table_with_context_descriptions_from_file
+    extract_table_with_context_descriptions_from_file, stream_table_with_context_descriptions_from_file
+from pdf_table_augmenter.metrics import PROMETHEUS_CONTENT_TYPE, render_metrics
+from pdf_table_augmenter.models import DocumentSession, ExtractionJob
+from pdf_table_augmenter.serializers import DocumentSessionSerializer, ExtractionJobSerializer
+from pdf_table_augmenter.streaming import NDJSONRenderer, EventStreamRenderer, requested_stream_format, \
+    streaming_response
 
 
-class ExtractDescriptionAPIView(APIView):
-    parser_classes = [MultiPartParser]
+def query_flag(request, name, default=False):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
 
-    def post(self, request):
-        pdf_file = request.FILES.get("pdf")
-        if not pdf_file:
-            return Response({"error": "No file provided."}, status=400)
 
-        descriptions = extract_table_descriptions_from_file(pdf_file)
-        return Response(descriptions)
+def llm_cache_bypass_requested(request):
+    return query_flag(request, "bypass_llm_cache")
 
 
-class ExtractDescriptionForImagesAPIView(APIView):
-    parser_classes = [MultiPartParser]
+def adaptive_ocr_requested(request):
+    return request.GET.get("ocr", settings.IMAGE_OCR_MODE).lower() == "auto"
 
-    def post(self, request):
-        pdf_file = request.FILES.get("pdf")
-        if not pdf_file:
-            return Response({"error": "No file provided."}, status=400)
 
-        descriptions = extract_image_descriptions_from_file(pdf_file)
-        return Response(descriptions)
+def requested_sections(request):
+    value = request.GET.get("sections") or ",".join(SECTIONS)
+    return tuple(section.strip() for section in value.split(",") if section.strip())
+
+
+def request_too_large(request):
+    # Checked before request.FILES is touched, so oversized bodies are never spooled.
+    content_length = request.META.get("CONTENT_LENGTH") or ""
+    return content_length.isdigit() and int(content_length) > settings.PDF_UPLOAD_MAX_BYTES
+
+
+def upload_too_large_response():
+    return Response({"error": f"File exceeds the {settings.PDF_UPLOAD_MAX_BYTES} byte upload limit."}, status=413)
+
+
+def question_error_payload(e):
+    if isinstance(e, LLMError):
+        return {"error": f"Error answering question: {e.message}", "details": e.to_dict()}, e.status
+    return {"error": f"Error answering question: {str(e)}"}, 500
+
 
+def collect_stream_events(events):
+    metadata = {}
+    results = []
+    for event in events:
+        if event["type"] == "error":
+            return [{"error": event["error"]}]
+        if event["type"] == "metadata":
+            metadata = {key: value for key, value in event.items() if key != "type"}
+        elif event["type"] == "item":
+            results.append((event["position"], event.get("section"), event["item"]))
+        elif event["type"] == "summary":
+            metadata["elapsed_seconds"] = event["elapsed_seconds"]
 
-class ExtractDescriptionForFormulasAPIView(APIView):
+    results.sort(key=lambda result: result[0])
+    if any(section for _, section, _ in results):
+        sections = {}
+        for _, section, item in results:
+            sections.setdefault(section, []).append(item)
+        return {"metadata": metadata, "results": sections}
+    return {"metadata": metadata, "results": [item for _, _, item in results]}
+
+
+def session_envelope(descriptions):
+    if isinstance(descriptions, dict) and "results" in descriptions:
+        return descriptions
+    return {"results": descriptions}
+
+
+class DescriptionOptions:
+    prescan_kind = None
+
+    def options_error(self, request):
+        return None
+
+    def conversion_options(self, request):
+        prescan = query_flag(request, "prescan", settings.PAGE_PRESCAN_ENABLED)
+        return {"prescan": self.prescan_kind if prescan else None}
+
+
+class ImageDescriptionOptions(DescriptionOptions):
+
+    def conversion_options(self, request):
+        options = super().conversion_options(request)
+        options["adaptive_ocr"] = adaptive_ocr_requested(request)
+        return options
+
+
+class AllDescriptionsOptions(DescriptionOptions):
+
+    def options_error(self, request):
+        unknown_sections = set(requested_sections(request)) - set(SECTIONS)
+        if unknown_sections or not requested_sections(request):
+            return f"sections must be a comma-separated subset of {', '.join(SECTIONS)}."
+        if self.table_mode(request) not in TABLE_MODES:
+            return f"table_mode must be one of {', '.join(TABLE_MODES)}."
+        return None
+
+    def table_mode(self, request):
+        return request.GET.get("table_mode") or "full"
+
+    def conversion_options(self, request):
+        return {
+            "sections": requested_sections(request),
+            "table_mode": self.table_mode(request),
+            "prescan": query_flag(request, "prescan", settings.PAGE_PRESCAN_ENABLED),
+            "adaptive_ocr": adaptive_ocr_requested(request),
+        }
+
+
+class DescriptionExtractionAPIView(DescriptionOptions, APIView):
     parser_classes = [MultiPartParser]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer, EventStreamRenderer]
+    kind = None
+    extract = None
+    stream = None
 
     def post(self, request):
+        options_error = self.options_error(request)
+        if options_error:
+            return Response({"error": options_error}, status=400)
+        if request_too_large(request):
+            return upload_too_large_response()
         pdf_file = request.FILES.get("pdf")
         if not pdf_file:
             return Response({"error": "No file provided."}, status=400)
+        if pdf_file.size > settings.PDF_UPLOAD_MAX_BYTES:
+            return upload_too_large_response()
+
+        bypass_cache = llm_cache_bypass_requested(request)
+        options = self.conversion_options(request)
+        stream_format = requested_stream_format(request)
+        if stream_format:
+            return streaming_response(self.stream(pdf_file, **options), stream_format, bypass_cache)
 
-        descriptions = extract_formula_descriptions_from_file(pdf_file)
+        with bypass_llm_cache(bypass_cache):
+            if query_flag(request, "include_metadata"):
+                descriptions = collect_stream_events(self.stream(pdf_file, **options))
+            else:
+                descriptions = self.extract(pdf_file, **options)
+
+        if query_flag(request, "create_session"):
+            envelope = session_envelope(descriptions)
+            if not is_error_result(envelope["results"]):
+                session = create_session(self.kind, envelope["results"], pdf_file.name)
+                return Response({"session_id": str(session.id), **envelope})
         return Response(descriptions)
 
 
+class ExtractDescriptionAPIView(DescriptionExtractionAPIView):
+    kind = "tables"
+    extract = staticmethod(extract_table_descriptions_from_file)
+    stream = staticmethod(stream_table_descriptions_from_file)
+    prescan_kind = TABLES
+
+
+class ExtractDescriptionForImagesAPIView(ImageDescriptionOptions, DescriptionExtractionAPIView):
+    kind = "images"
+    extract = staticmethod(extract_image_descriptions_from_file)
+    stream = staticmethod(stream_image_descriptions_from_file)
+    prescan_kind = PICTURES
+
+
+class ExtractDescriptionForFormulasAPIView(DescriptionExtractionAPIView):
+    kind = "formulas"
+    extract = staticmethod(extract_formula_descriptions_from_file)
+    stream = staticmethod(stream_formula_descriptions_from_file)
+    prescan_kind = FORMULAS
+
+
 class AskQuestionAPIView(APIView):
 
     def post(self, request):
         question = request.data.get("question")
+        session_id = request.data.get("session_id") or request.GET.get("session_id")
+        if question and session_id:
+            return self.answer_in_session(request, session_id, question)
+
         table_description = request.data.get("table_description")
 
         if not question or not table_description:
             return Response({"error": "Missing question or table_data."}, status=400)
 
         try:
-            answer = answer_question(question, table_description)
+            with bypass_llm_cache(llm_cache_bypass_requested(request)):
+                answer = answer_question(question, table_description)
             return Response({"answer": answer}, status=200)
         except Exception as e:
-            return Response({"error": f"Error answering question: {str(e)}"}, status=500)
+            payload, status = question_error_payload(e)
+            return Response(payload, status=status)
+
+    def answer_in_session(self, request, session_id, question):
+        try:
+            session = DocumentSession.objects.get(id=uuid.UUID(str(session_id)))
+        except (ValueError, DocumentSession.DoesNotExist):
+            return Response({"error": "Unknown session_id."}, status=404)
 
+        try:
+            with bypass_llm_cache(llm_cache_bypass_requested(request)):
+                answer, citations = ask_session(session, question)
+            return Response({"answer": answer, "session_id": str(session.id), "citations": citations}, status=200)
+        except Exception as e:
+            payload, status = question_error_payload(e)
+            return Response(payload, status=status)
 
-class ExtractTableDataOnlyDescriptionForTablesAPIView(APIView):
+
+class ExtractTableDataOnlyDescriptionForTablesAPIView(DescriptionExtractionAPIView):
+    kind = "first-case-tables"
+    extract = staticmethod(extract_table_data_only_descriptions_from_file)
+    stream = staticmethod(stream_table_data_only_descriptions_from_file)
+    prescan_kind = TABLES
+
+
+class ExtractContextDescriptionForTablesAPIView(DescriptionExtractionAPIView):
+    kind = "second-case-tables"
+    extract = staticmethod(extract_table_with_context_descriptions_from_file)
+    stream = staticmethod(stream_table_with_context_descriptions_from_file)
+    prescan_kind = TABLES
+
+
+class SubmitExtractionJobAPIView(DescriptionOptions, APIView):
     parser_classes = [MultiPartParser]
+    kind = None
 
     def post(self, request):
+        options_error = self.options_error(request)
+        if options_error:
+            return Response({"error": options_error}, status=400)
+        if request_too_large(request):
+            return upload_too_large_response()
         pdf_file = request.FILES.get("pdf")
         if not pdf_file:
             return Response({"error": "No file provided."}, status=400)
+        if pdf_file.size > settings.PDF_UPLOAD_MAX_BYTES:
+            return upload_too_large_response()
 
-        descriptions = extract_table_data_only_descriptions_from_file(pdf_file)
-        return Response(descriptions)
+        webhook_url = request.data.get("webhook_url", "")
+        if webhook_url:
+            try:
+                check_webhook_url(webhook_url)
+            except ValueError as e:
+                return Response({"error": f"Invalid webhook_url: {e}"}, status=400)
 
+        job = submit_job(self.kind, pdf_file, webhook_url, self.conversion_options(request))
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": request.build_absolute_uri(reverse("extraction_job_status", args=[job.id])),
+            "result_url": request.build_absolute_uri(reverse("extraction_job_result", args=[job.id])),
+        }, status=202)
+
+
+class SubmitAllDescriptionsJobAPIView(AllDescriptionsOptions, SubmitExtractionJobAPIView):
+    kind = "all"
 
-class ExtractContextDescriptionForTablesAPIView(APIView):
-    parser_classes = [MultiPartParser]
+
+class ExtractionJobStatusAPIView(APIView):
+
+    def get(self, request, job_id):
+        job = get_object_or_404(ExtractionJob, id=job_id)
+        return Response(ExtractionJobSerializer(job).data)
+
+
+class ExtractionJobResultAPIView(APIView):
+
+    def get(self, request, job_id):
+        job = get_object_or_404(ExtractionJob, id=job_id)
+        if job.status == ExtractionJob.Status.SUCCEEDED:
+            return Response(job.result)
+        if job.status == ExtractionJob.Status.FAILED:
+            return Response({"error": f"Failed to process PDF: {job.error}"}, status=500)
+        return Response({"job_id": str(job.id), "status": job.status}, status=202)
+
+
+class ExtractAllDescriptionsAPIView(AllDescriptionsOptions, DescriptionExtractionAPIView):
+    kind = "all"
+    extract = staticmethod(extract_all_descriptions_from_file)
+    stream = staticmethod(stream_all_descriptions_from_file)
+
+
+class DocumentSessionListAPIView(APIView):
+    parser_classes = [JSONParser]
 
     def post(self, request):
-        pdf_file = request.FILES.get("pdf")
-        if not pdf_file:
-            return Response({"error": "No file provided."}, status=400)
+        job_id = request.data.get("job_id")
+        if job_id:
+            try:
+                job = ExtractionJob.objects.get(id=uuid.UUID(str(job_id)))
+            except (ValueError, ExtractionJob.DoesNotExist):
+                return Response({"error": "Unknown job_id."}, status=404)
+            if job.status != ExtractionJob.Status.SUCCEEDED:
+                return Response({"error": f"Job is {job.status}, not succeeded."}, status=409)
+            session = create_session(job.kind, job.result, job.file_name)
+        else:
+            results = request.data.get("results")
+            if not isinstance(results, (list, dict)) or not results or is_error_result(results):
+                return Response({"error": "Provide job_id or a non-empty results list."}, status=400)
+            session = create_session(request.data.get("kind") or "manual", results, request.data.get("file_name"))
 
-        descriptions = extract_table_with_context_descriptions_from_file(pdf_file)
-        return Response(descriptions)
+        return Response({"session_id": str(session.id)}, status=201)
+
+
+class DocumentSessionAPIView(APIView):
+
+    def get(self, request, session_id):
+        session = get_object_or_404(DocumentSession, id=session_id)
+        return Response(DocumentSessionSerializer(session).data)
+
+    def delete(self, request, session_id):
+        get_object_or_404(DocumentSession, id=session_id).delete()
+        return Response(status=204)
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
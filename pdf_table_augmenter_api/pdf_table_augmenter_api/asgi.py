@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pdf_table_augmenter_api.settings')
+# Settings turn the async views on by default only for processes started through this module.
+os.environ['ASGI_ENTRY_POINT'] = 'True'
 
 application = get_asgi_application()
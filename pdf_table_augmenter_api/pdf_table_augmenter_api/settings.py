@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pdf_table_augmenter.middleware.RequestObservabilityMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -60,7 +61,9 @@ MIDDLEWARE = [
 CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
+    'x-request-id',
 ]
+CORS_EXPOSE_HEADERS = ['x-request-id']
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -136,3 +139,197 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Docling converters
+# Profiles listed here are built and warmed by gunicorn.conf.py: once in the master with preload_app,
+# otherwise once per worker. runserver, other servers and manage.py build converters on first use.
+
+DOCLING_WARMUP = env.bool("DOCLING_WARMUP", default=True)
+DOCLING_WARMUP_PROFILES = env.list("DOCLING_WARMUP_PROFILES", default=["tables_no_ocr", "images_with_ocr", "images_no_ocr"])
+WARMUP_IMPORTS = env.bool("WARMUP_IMPORTS", default=True)
+
+# Parsed document cache
+# Docling output is cached per (PDF SHA-256, pipeline profile) in memory and as gzip files on disk.
+
+DOCUMENT_CACHE_ENABLED = env.bool("DOCUMENT_CACHE_ENABLED", default=True)
+DOCUMENT_CACHE_DIR = env("DOCUMENT_CACHE_DIR", default=str(BASE_DIR / "data" / "document_cache"))
+DOCUMENT_CACHE_MEMORY_BYTES = env.int("DOCUMENT_CACHE_MEMORY_BYTES", default=256 * 1024 * 1024)
+DOCUMENT_CACHE_DISK_BYTES = env.int("DOCUMENT_CACHE_DISK_BYTES", default=2 * 1024 * 1024 * 1024)
+
+# LLM response cache
+# Completions are memoized in a SQLite file shared by all workers on the host.
+# Pass ?bypass_llm_cache=true on a request (or set LLM_CACHE_BYPASS) to force fresh completions.
+# Expired and least recently used entries are pruned every LLM_CACHE_PRUNE_INTERVAL inserts per worker.
+
+LLM_CACHE_ENABLED = env.bool("LLM_CACHE_ENABLED", default=True)
+LLM_CACHE_BYPASS = env.bool("LLM_CACHE_BYPASS", default=False)
+LLM_CACHE_PATH = env("LLM_CACHE_PATH", default=str(BASE_DIR / "data" / "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = env.int("LLM_CACHE_TTL_SECONDS", default=30 * 24 * 60 * 60)
+LLM_CACHE_MAX_ENTRIES = env.int("LLM_CACHE_MAX_ENTRIES", default=100000)
+LLM_CACHE_PRUNE_INTERVAL = env.int("LLM_CACHE_PRUNE_INTERVAL", default=500)
+
+# LLM concurrency
+# Upper bound on simultaneous description requests issued for the items of one document.
+
+LLM_MAX_CONCURRENCY = env.int("LLM_MAX_CONCURRENCY", default=8)
+
+# Background extraction jobs
+# Uploads submitted to the */jobs endpoints are stored here until a worker thread picks them up.
+# A running job refreshes its heartbeat every JOB_HEARTBEAT_SECONDS. Every JOB_RECOVERY_INTERVAL_SECONDS each
+# server process re-submits PENDING jobs and resets RUNNING jobs whose heartbeat is older than JOB_STALE_SECONDS.
+# Webhooks may only target public addresses unless JOB_WEBHOOK_ALLOWED_HOSTS is set.
+
+JOB_WORKERS = env.int("JOB_WORKERS", default=2)
+JOB_UPLOAD_DIR = env("JOB_UPLOAD_DIR", default=str(BASE_DIR / "data" / "jobs"))
+JOB_WEBHOOK_TIMEOUT_SECONDS = env.int("JOB_WEBHOOK_TIMEOUT_SECONDS", default=10)
+JOB_WEBHOOK_ALLOWED_HOSTS = env.list("JOB_WEBHOOK_ALLOWED_HOSTS", default=[])
+JOB_HEARTBEAT_SECONDS = env.int("JOB_HEARTBEAT_SECONDS", default=30)
+JOB_STALE_SECONDS = env.int("JOB_STALE_SECONDS", default=5 * 60)
+JOB_RECOVERY_INTERVAL_SECONDS = env.int("JOB_RECOVERY_INTERVAL_SECONDS", default=5 * 60)
+
+# Page-sharded conversion
+# PDFs longer than DOCUMENT_SHARD_MIN_PAGES are split into DOCUMENT_SHARD_PAGES-page ranges that are
+# converted in a process pool and merged back into one document.
+
+DOCUMENT_SHARDING_ENABLED = env.bool("DOCUMENT_SHARDING_ENABLED", default=True)
+DOCUMENT_SHARD_MIN_PAGES = env.int("DOCUMENT_SHARD_MIN_PAGES", default=40)
+DOCUMENT_SHARD_PAGES = env.int("DOCUMENT_SHARD_PAGES", default=20)
+DOCUMENT_SHARD_WORKERS = env.int("DOCUMENT_SHARD_WORKERS", default=max(1, (os.cpu_count() or 2) // 2))
+DOCUMENT_SHARD_MAX_TASKS_PER_CHILD = env.int("DOCUMENT_SHARD_MAX_TASKS_PER_CHILD", default=10)
+
+# Page pre-scan
+# A pdfplumber pass over the text layer marks candidate pages; only those go through docling's layout,
+# table and OCR models. Can be toggled per request with ?prescan=true|false.
+
+PAGE_PRESCAN_ENABLED = env.bool("PAGE_PRESCAN_ENABLED", default=False)
+PRESCAN_TABLE_MIN_RULINGS = env.int("PRESCAN_TABLE_MIN_RULINGS", default=4)
+PRESCAN_PICTURE_MIN_CURVES = env.int("PRESCAN_PICTURE_MIN_CURVES", default=10)
+PRESCAN_FORMULA_MIN_MATH_RATIO = env.float("PRESCAN_FORMULA_MIN_MATH_RATIO", default=0.02)
+
+# Adaptive OCR
+# The image extractor OCRs every page by default. With IMAGE_OCR_MODE=auto (or ?ocr=auto) it OCRs only
+# pages without a usable text layer; ?ocr=always restores full OCR for one request. The reported time saved
+# is an estimate of ADAPTIVE_OCR_SECONDS_PER_PAGE per skipped page.
+
+IMAGE_OCR_MODE = env("IMAGE_OCR_MODE", default="always")
+ADAPTIVE_OCR_MIN_CHARS = env.int("ADAPTIVE_OCR_MIN_CHARS", default=50)
+ADAPTIVE_OCR_MIN_IMAGE_COVERAGE = env.float("ADAPTIVE_OCR_MIN_IMAGE_COVERAGE", default=0.5)
+ADAPTIVE_OCR_MAX_TEXT_COVERAGE = env.float("ADAPTIVE_OCR_MAX_TEXT_COVERAGE", default=0.02)
+ADAPTIVE_OCR_SECONDS_PER_PAGE = env.float("ADAPTIVE_OCR_SECONDS_PER_PAGE", default=1.5)
+
+# Uploads
+# Uploads up to FILE_UPLOAD_MAX_MEMORY_SIZE stay in memory and reach docling as a DocumentStream; larger
+# ones are spooled by Django to FILE_UPLOAD_TEMP_DIR and converted in place. Bigger than
+# PDF_UPLOAD_MAX_BYTES is rejected with 413.
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = env.int("FILE_UPLOAD_MAX_MEMORY_SIZE", default=10 * 1024 * 1024)
+FILE_UPLOAD_TEMP_DIR = env("FILE_UPLOAD_TEMP_DIR", default=None)
+DOCUMENT_STREAM_MAX_BYTES = env.int("DOCUMENT_STREAM_MAX_BYTES", default=FILE_UPLOAD_MAX_MEMORY_SIZE)
+PDF_UPLOAD_MAX_BYTES = env.int("PDF_UPLOAD_MAX_BYTES", default=300 * 1024 * 1024)
+
+# Batched LLM prompts
+# When enabled, small items are packed into one JSON-mode completion up to LLM_BATCH_MAX_PROMPT_TOKENS
+# (estimated at ~4 characters per token); items missing from a batch answer are described individually.
+
+LLM_BATCH_ENABLED = env.bool("LLM_BATCH_ENABLED", default=False)
+LLM_BATCH_MAX_ITEMS = env.int("LLM_BATCH_MAX_ITEMS", default=8)
+LLM_BATCH_MAX_PROMPT_TOKENS = env.int("LLM_BATCH_MAX_PROMPT_TOKENS", default=6000)
+LLM_BATCH_MAX_ITEM_TOKENS = env.int("LLM_BATCH_MAX_ITEM_TOKENS", default=1500)
+LLM_BATCH_OUTPUT_TOKENS_PER_ITEM = env.int("LLM_BATCH_OUTPUT_TOKENS_PER_ITEM", default=400)
+
+# Table prompt compaction
+# Table previews above TABLE_PROMPT_TOKEN_BUDGET are reduced to headers, head/tail/stratified sample rows
+# and per-column statistics before they are sent to the LLM.
+
+TABLE_PROMPT_TOKEN_BUDGET = env.int("TABLE_PROMPT_TOKEN_BUDGET", default=2000)
+TABLE_NUMERIC_COLUMN_SHARE = env.float("TABLE_NUMERIC_COLUMN_SHARE", default=0.8)
+
+# Map-reduce table descriptions
+# In the full table description, tables with at least TABLE_MAP_REDUCE_MIN_ROWS rows that do not fit the
+# prompt budget are summarized in header-carrying row chunks (at most TABLE_MAP_REDUCE_MAX_WORKERS at once
+# per process, across all tables and requests) and the chunk summaries are merged by a final call.
+
+TABLE_MAP_REDUCE_ENABLED = env.bool("TABLE_MAP_REDUCE_ENABLED", default=True)
+TABLE_MAP_REDUCE_MIN_ROWS = env.int("TABLE_MAP_REDUCE_MIN_ROWS", default=200)
+TABLE_MAP_REDUCE_CHUNK_TOKENS = env.int("TABLE_MAP_REDUCE_CHUNK_TOKENS", default=3000)
+TABLE_MAP_REDUCE_MAX_CHUNKS = env.int("TABLE_MAP_REDUCE_MAX_CHUNKS", default=24)
+TABLE_MAP_REDUCE_MAX_WORKERS = env.int("TABLE_MAP_REDUCE_MAX_WORKERS", default=4)
+
+# Document sessions
+# Extraction results stored as a session can be queried with /ask-question?session_id=...; the last
+# SESSION_HISTORY_MESSAGES messages of the conversation are replayed after the document context.
+
+SESSION_HISTORY_MESSAGES = env.int("SESSION_HISTORY_MESSAGES", default=12)
+
+# Question retrieval
+# Sessions whose context exceeds SESSION_RETRIEVAL_MIN_TOKENS (and table_description payloads above
+# RETRIEVAL_TOKEN_BUDGET) are answered from the top RETRIEVAL_TOP_K items of a local BM25 index that fit
+# in RETRIEVAL_TOKEN_BUDGET.
+
+SESSION_RETRIEVAL_MIN_TOKENS = env.int("SESSION_RETRIEVAL_MIN_TOKENS", default=4000)
+RETRIEVAL_TOP_K = env.int("RETRIEVAL_TOP_K", default=8)
+RETRIEVAL_TOKEN_BUDGET = env.int("RETRIEVAL_TOKEN_BUDGET", default=3000)
+RETRIEVAL_INDEX_CACHE_SIZE = env.int("RETRIEVAL_INDEX_CACHE_SIZE", default=64)
+
+
+# LLM gateway
+# Every completion goes through one pooled client with its own retries, per-call timeout and circuit breaker.
+# The requests/tokens-per-minute buckets live in a SQLite file so all workers on the host share one budget.
+
+OPENAI_BASE_URL = env("OPENAI_BASE_URL", default=None)
+LLM_TIMEOUT_SECONDS = env.float("LLM_TIMEOUT_SECONDS", default=60.0)
+LLM_MAX_CONNECTIONS = env.int("LLM_MAX_CONNECTIONS", default=32)
+LLM_MAX_RETRIES = env.int("LLM_MAX_RETRIES", default=4)
+LLM_RETRY_BASE_SECONDS = env.float("LLM_RETRY_BASE_SECONDS", default=1.0)
+LLM_RETRY_MAX_SECONDS = env.float("LLM_RETRY_MAX_SECONDS", default=30.0)
+LLM_RATE_LIMIT_ENABLED = env.bool("LLM_RATE_LIMIT_ENABLED", default=True)
+LLM_RATE_LIMIT_PATH = env("LLM_RATE_LIMIT_PATH", default=str(BASE_DIR / "data" / "llm_rate_limit.sqlite3"))
+LLM_REQUESTS_PER_MINUTE = env.int("LLM_REQUESTS_PER_MINUTE", default=500)
+LLM_TOKENS_PER_MINUTE = env.int("LLM_TOKENS_PER_MINUTE", default=300000)
+LLM_RATE_LIMIT_MAX_WAIT_SECONDS = env.float("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", default=120.0)
+LLM_CIRCUIT_FAILURE_THRESHOLD = env.int("LLM_CIRCUIT_FAILURE_THRESHOLD", default=5)
+LLM_CIRCUIT_RESET_SECONDS = env.float("LLM_CIRCUIT_RESET_SECONDS", default=30.0)
+
+# Async request handling
+# Under an ASGI server (uvicorn pdf_table_augmenter_api.asgi:application) extraction and ask endpoints are
+# served by async views: LLM calls are awaited on the event loop and docling conversion runs on
+# ASYNC_CONVERSION_WORKERS dedicated threads. WSGI servers and runserver keep the sync views, unless
+# ASYNC_VIEWS_ENABLED says otherwise; asgi.py marks the process with ASGI_ENTRY_POINT.
+
+ASYNC_VIEWS_ENABLED = env.bool("ASYNC_VIEWS_ENABLED", default=env.bool("ASGI_ENTRY_POINT", default=False))
+ASYNC_CONVERSION_WORKERS = env.int("ASYNC_CONVERSION_WORKERS", default=2)
+
+# Observability
+# Every request gets an id (taken from X-Request-ID when the client sends one, echoed in the response)
+# that tags its log lines. Logs go to stderr as one JSON object per line (LOG_FORMAT=text for humans).
+# Prometheus metrics (request, stage and LLM latency histograms, token and cache counters) are served
+# at /metrics when METRICS_ENABLED.
+
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=True)
+LOG_LEVEL = env("LOG_LEVEL", default="INFO")
+LOG_FORMAT = env("LOG_FORMAT", default="json")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {"()": "pdf_table_augmenter.log_context.RequestIdFilter"},
+    },
+    "formatters": {
+        "json": {"()": "pdf_table_augmenter.log_context.JsonFormatter"},
+        "text": {"format": "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "filters": ["request_id"], "formatter": LOG_FORMAT},
+    },
+    "loggers": {
+        "pdf_table_augmenter": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+    },
+}
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "pdf_table_augmenter.streaming.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}